@@ -77,12 +77,18 @@ data_catalog
 #
 # Each data catalog will have a facet that can be used to split the catalog into unique datasets
 # (See `adapter.slug_column`).
+#
+# The dataset-specific facets that only have a few distinct values are stored as
+# [categorical](https://pandas.pydata.org/docs/user_guide/categorical.html) columns to reduce memory usage.
+# A filtered data catalog keeps all the categories of the original data catalog,
+# so pass `observed=True` when grouping by these columns.
+# Otherwise, pandas also creates an empty group for each value that was filtered out.
 
 # %%
 adapter.slug_column
 
 # %%
-for unique_id, dataset_files in data_catalog.groupby(adapter.slug_column):
+for unique_id, dataset_files in data_catalog.groupby(adapter.slug_column, observed=True):
     print(unique_id)
     display(dataset_files)
     print()
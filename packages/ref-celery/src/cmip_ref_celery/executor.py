@@ -3,6 +3,8 @@ from typing import Any
 
 import celery.exceptions
 import celery.result
+import pyarrow as pa
+from attrs import evolve
 from loguru import logger
 from tqdm import tqdm
 
@@ -74,6 +76,12 @@ class CeleryExecutor(Executor):
 
         name = generate_task_name(provider, metric)
 
+        # The datasets are sent using the Arrow IPC format rather than pickling each value
+        try:
+            definition = evolve(definition, metric_dataset=definition.metric_dataset.to_arrow())
+        except pa.ArrowException:
+            logger.debug(f"Unable to convert the datasets for {definition.key} to Arrow, sending as pandas")
+
         async_result = app.send_task(
             name,
             args=[
@@ -1,3 +1,4 @@
+import pyarrow as pa
 import pytest
 from cmip_ref_celery.executor import CeleryExecutor
 from cmip_ref_celery.worker_tasks import handle_result
@@ -30,6 +31,24 @@ def test_run_metric(provider, mock_metric, metric_definition, mocker, include_ex
 
     assert executor._results == [mock_app.send_task.return_value]
 
+    # The datasets are sent as Arrow tables
+    (sent_definition,) = mock_app.send_task.call_args.kwargs["args"]
+    assert all(collection.is_arrow_backed for _, collection in sent_definition.metric_dataset.items())
+
+
+def test_run_metric_not_arrow(provider, mock_metric, metric_definition, mocker):
+    executor = CeleryExecutor()
+    mock_app = mocker.patch("cmip_ref_celery.executor.app")
+    mocker.patch(
+        "cmip_ref_core.datasets.DatasetCollection.to_arrow", side_effect=pa.ArrowInvalid("Mixed types")
+    )
+
+    executor.run_metric(provider, mock_metric, metric_definition, None)
+
+    mock_app.send_task.assert_called_once_with(
+        "mock_provider.mock", args=[metric_definition], link=None, queue="mock_provider"
+    )
+
 
 def test_join_empty():
     executor = CeleryExecutor()
@@ -0,0 +1,44 @@
+"""
+Vectorised handling of the timestamps in a data catalog
+
+The start and end times of the files in a data catalog are stored as `datetime64[us]` values,
+which can represent the full range of years used by CMIP experiments
+(e.g. `past1000` or the extensions of the SSP experiments to 2300).
+This isn't possible using the default nanosecond precision of pandas.
+
+The timestamps contain the date and time as written in the files.
+The calendar of a dataset isn't recorded in the data catalog,
+so the timestamps are compared as dates in the proleptic Gregorian calendar.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pandas as pd
+
+DATETIME_DTYPE = "datetime64[us]"
+"""
+The dtype of the timestamps in a data catalog
+"""
+
+
+def as_datetime64(values: pd.Series[Any]) -> pd.Series[Any]:
+    """
+    Convert timestamps to `datetime64[us]` values
+
+    Parameters
+    ----------
+    values
+        Timestamps as `datetime64` values of any precision,
+        or `datetime.datetime`/`pandas.Timestamp` objects.
+        Missing values may be None or NaT.
+
+    Returns
+    -------
+    :
+        The timestamps with a `datetime64[us]` dtype
+    """
+    if values.dtype == DATETIME_DTYPE:
+        return values
+    return pd.Series(values.to_numpy(), index=values.index, dtype=DATETIME_DTYPE, name=values.name)
@@ -1,8 +1,10 @@
+from __future__ import annotations
+
+import functools
+import inspect
 import sys
-import warnings
-from collections import defaultdict
-from collections.abc import Mapping
-from typing import Protocol, runtime_checkable
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any, Protocol, runtime_checkable
 
 if sys.version_info < (3, 11):
     from typing_extensions import Self
@@ -14,7 +16,8 @@ import pandas as pd
 from attrs import frozen
 from loguru import logger
 
-from cmip_ref_core.datasets import SourceDatasetType
+from cmip_ref_core.calendars import as_datetime64
+from cmip_ref_core.datasets import FacetFilterCache, SourceDatasetType
 from cmip_ref_core.exceptions import ConstraintNotSatisfied
 
 
@@ -24,6 +27,20 @@ class GroupValidator(Protocol):
     A constraint that must be satisfied when executing a given metric run.
 
     All constraints must be satisfied for a given group to be run.
+
+    Validators may also declare the columns of the data catalog that they use via a `required_columns`
+    attribute (see [get_required_columns][cmip_ref_core.constraints.get_required_columns]).
+
+    Validators may optionally provide a `validate_groups(data_catalog, group_by)` method
+    which validates every group of a data catalog at once and returns a boolean Series
+    indexed by the group keys.
+    The result must be the same as calling `validate` on each group of `data_catalog.groupby(group_by)`.
+    The solver uses this method when available to avoid validating each group separately
+    (see [supports_batch_validation][cmip_ref_core.constraints.supports_batch_validation]).
+
+    Validators may optionally provide an `explain(group)` method which describes why a group
+    is invalid, e.g. which facets are missing
+    (see [explain_rejection][cmip_ref_core.constraints.explain_rejection]).
     """
 
     def validate(self, group: pd.DataFrame) -> bool:
@@ -55,6 +72,31 @@ class GroupOperation(Protocol):
 
         Operations should not mutate the input group, but instead return a new group.
         Mutating the input group may result in unexpected behaviour.
+
+    Operations that look up datasets in the data catalog may also accept an optional
+    `filter_cache` keyword argument.
+    If so, the [FacetFilterCache][cmip_ref_core.datasets.FacetFilterCache] of the data catalog
+    is provided to speed up the lookups.
+
+    Operations may also declare the columns of the data catalog that they use via a `required_columns`
+    attribute (see [get_required_columns][cmip_ref_core.constraints.get_required_columns]).
+
+    Operations may optionally provide an `apply_groups(groups, data_catalog, filter_cache=None)` method
+    which applies the operation to a sequence of groups at once
+    and returns the updated groups in the same order, or None for the groups where the operation failed.
+    The result must be the same as calling `apply` on each group.
+    The solver uses this method when available to avoid applying the operation to each group separately
+    (see [supports_batch_application][cmip_ref_core.constraints.supports_batch_application]).
+
+    Operations may optionally provide a `preserves(validator)` method
+    which returns True if the operation never changes the result of the validator,
+    i.e. the validator gives the same result before and after the operation is applied.
+    This allows the solver to run the validator before the operation
+    (see [order_constraints][cmip_ref_core.constraints.order_constraints]).
+
+    Operations are assumed to add datasets from the data catalog to the group,
+    unless they declare otherwise via an `adds_datasets` attribute
+    (see [adds_datasets][cmip_ref_core.constraints.adds_datasets]).
     """
 
     def apply(self, group: pd.DataFrame, data_catalog: pd.DataFrame) -> pd.DataFrame:
@@ -98,10 +140,246 @@ but may also include validators that check if the group satisfies a certain cond
 """
 
 
+def get_required_columns(constraint: GroupConstraint) -> tuple[str, ...] | None:
+    """
+    Get the columns of the data catalog that a constraint uses
+
+    Parameters
+    ----------
+    constraint
+        Constraint to inspect
+
+    Returns
+    -------
+    :
+        The columns declared by the constraint's `required_columns` attribute,
+        or None if the constraint doesn't declare which columns it uses
+        and may therefore use any column.
+    """
+    required_columns: tuple[str, ...] | None = getattr(constraint, "required_columns", None)
+    return required_columns
+
+
+def adds_datasets(constraint: GroupConstraint) -> bool:
+    """
+    Check if a constraint may add datasets from the data catalog to a group
+
+    A group that is extended by such a constraint may change when any dataset in the data catalog changes,
+    not only when one of the datasets selected by the filters of the requirement changes.
+
+    Parameters
+    ----------
+    constraint
+        Constraint to inspect
+
+    Returns
+    -------
+    :
+        False if the constraint is a validator or an operation which declares that it doesn't add datasets
+        using an `adds_datasets` attribute, otherwise True
+    """
+    if not isinstance(constraint, GroupOperation):
+        return False
+    return bool(getattr(constraint, "adds_datasets", True))
+
+
+def supports_batch_validation(constraint: GroupConstraint) -> bool:
+    """
+    Check if a constraint can validate all the groups of a data catalog at once
+
+    Only validators which don't also modify the group are validated in batches.
+
+    Parameters
+    ----------
+    constraint
+        Constraint to inspect
+
+    Returns
+    -------
+    :
+        True if the constraint provides a `validate_groups` method
+    """
+    return (
+        isinstance(constraint, GroupValidator)
+        and not isinstance(constraint, GroupOperation)
+        and callable(getattr(constraint, "validate_groups", None))
+    )
+
+
+def supports_batch_application(constraint: GroupConstraint) -> bool:
+    """
+    Check if an operation can be applied to many groups at once
+
+    Only operations which don't also validate the group are applied in batches.
+
+    Parameters
+    ----------
+    constraint
+        Constraint to inspect
+
+    Returns
+    -------
+    :
+        True if the constraint provides an `apply_groups` method
+    """
+    return (
+        isinstance(constraint, GroupOperation)
+        and not isinstance(constraint, GroupValidator)
+        and callable(getattr(constraint, "apply_groups", None))
+    )
+
+
+def _is_pure_validator(constraint: GroupConstraint) -> bool:
+    return isinstance(constraint, GroupValidator) and not isinstance(constraint, GroupOperation)
+
+
+def _can_precede(validator: GroupConstraint, constraint: GroupConstraint) -> bool:
+    """
+    Check if a validator can be moved ahead of the constraint preceding it
+    """
+    if _is_pure_validator(constraint):
+        # Validators don't modify the groups, so only the cost of each validator matters
+        return supports_batch_validation(validator) and not supports_batch_validation(constraint)
+    preserves = getattr(constraint, "preserves", None)
+    return callable(preserves) and bool(preserves(validator))
+
+
+def order_constraints(constraints: Iterable[GroupConstraint]) -> tuple[GroupConstraint, ...]:
+    """
+    Order constraints so that groups are rejected as cheaply as possible
+
+    A group must satisfy every validator, and validators don't modify the group,
+    so the order of consecutive validators doesn't change which groups are accepted.
+    Validators that can validate all the groups at once
+    (see [supports_batch_validation][cmip_ref_core.constraints.supports_batch_validation])
+    are moved ahead of the validators that check each group separately.
+
+    A validator is only moved ahead of an operation if the operation provides a `preserves` method
+    that confirms the operation doesn't change the result of the validator.
+    The order of the operations is never changed.
+
+    Parameters
+    ----------
+    constraints
+        Constraints in the order they are declared
+
+    Returns
+    -------
+    :
+        The constraints in the order they should be applied
+    """
+    ordered: list[GroupConstraint] = []
+    for constraint in constraints:
+        position = len(ordered)
+        if _is_pure_validator(constraint):
+            while position > 0 and _can_precede(constraint, ordered[position - 1]):
+                position -= 1
+        ordered.insert(position, constraint)
+    return tuple(ordered)
+
+
+def _group_keys(data_catalog: pd.DataFrame, group_by: Sequence[str]) -> pd.Index[Any]:
+    """
+    Get the keys of the groups in `data_catalog.groupby(group_by)`
+    """
+    return data_catalog.groupby(list(group_by), observed=True).size().index
+
+
+@functools.cache
+def _accepts_filter_cache(operation_type: type[Any], method: str = "apply") -> bool:
+    return "filter_cache" in inspect.signature(getattr(operation_type, method)).parameters
+
+
+def explain_rejection(validator: GroupConstraint, group: pd.DataFrame) -> str:
+    """
+    Describe why a group of datasets doesn't satisfy a validator
+
+    Validators may provide an `explain(group)` method which describes why the group is invalid.
+    Otherwise, only the validator is named.
+
+    Parameters
+    ----------
+    validator
+        The validator that the group doesn't satisfy
+    group
+        The invalid group of datasets
+
+    Returns
+    -------
+    :
+        Description of why the group is invalid
+    """
+    explain = getattr(validator, "explain", None)
+    if explain is None:
+        return f"{validator!r} not satisfied"
+    return str(explain(group))
+
+
+def check_constraint(
+    dataframe: pd.DataFrame,
+    constraint: GroupConstraint,
+    data_catalog: pd.DataFrame,
+    filter_cache: FacetFilterCache | None = None,
+    *,
+    explain: bool = False,
+) -> pd.DataFrame | ConstraintNotSatisfied:
+    """
+    Apply a constraint to a group of datasets and report why the group was rejected
+
+    This is the same as [apply_constraint][cmip_ref_core.constraints.apply_constraint],
+    except the reason is returned if the constraint was not satisfied.
+
+    Parameters
+    ----------
+    dataframe:
+        The group of datasets to apply the constraint to.
+    constraint
+        The constraint to apply.
+    data_catalog
+        The data catalog of all datasets.
+    filter_cache
+        The filter cache of the data catalog.
+
+        This is passed to operations that accept a `filter_cache` argument.
+    explain
+        If True, describe why a group is invalid using
+        [explain_rejection][cmip_ref_core.constraints.explain_rejection].
+        Otherwise, only the constraint is named, which avoids the cost of the description.
+
+    Returns
+    -------
+    :
+        The updated group of datasets,
+        or the exception describing why the constraint was not satisfied
+    """
+    try:
+        if not isinstance(constraint, GroupOperation):
+            updated_group = dataframe
+        elif filter_cache is not None and _accepts_filter_cache(type(constraint)):
+            updated_group = constraint.apply(dataframe, data_catalog, filter_cache=filter_cache)  # type: ignore[call-arg]
+        else:
+            updated_group = constraint.apply(dataframe, data_catalog)
+
+        valid = constraint.validate(updated_group) if isinstance(constraint, GroupValidator) else True
+    except ConstraintNotSatisfied as exc:
+        # The messages are only formatted if debug logging is enabled
+        logger.debug("Constraint {} not satisfied: {}", constraint, exc)
+        return exc
+
+    if not valid:
+        logger.debug("Constraint {} not satisfied for a group of {} files", constraint, len(updated_group))
+        if explain:
+            return ConstraintNotSatisfied(explain_rejection(constraint, updated_group))
+        return ConstraintNotSatisfied(f"{constraint!r} not satisfied")
+
+    return updated_group
+
+
 def apply_constraint(
     dataframe: pd.DataFrame,
     constraint: GroupConstraint,
     data_catalog: pd.DataFrame,
+    filter_cache: FacetFilterCache | None = None,
 ) -> pd.DataFrame | None:
     """
     Apply a constraint to a group of datasets
@@ -114,26 +392,66 @@ def apply_constraint(
         The constraint to apply.
     data_catalog
         The data catalog of all datasets.
+    filter_cache
+        The filter cache of the data catalog.
+
+        This is passed to operations that accept a `filter_cache` argument.
 
     Returns
     -------
     :
         The updated group of datasets or None if the constraint was not satisfied
     """
-    try:
-        updated_group = (
-            constraint.apply(dataframe, data_catalog) if isinstance(constraint, GroupOperation) else dataframe
-        )
+    result = check_constraint(dataframe, constraint, data_catalog, filter_cache)
+    return None if isinstance(result, ConstraintNotSatisfied) else result
 
-        valid = constraint.validate(updated_group) if isinstance(constraint, GroupValidator) else True
-        if not valid:
-            logger.debug(f"Constraint {constraint} not satisfied for {dataframe}")
-            raise ConstraintNotSatisfied(f"Constraint {constraint} not satisfied for {dataframe}")
-    except ConstraintNotSatisfied:
-        logger.debug(f"Constraint {constraint} not satisfied for {dataframe}")
-        return None
 
-    return updated_group
+def apply_operation_to_groups(
+    groups: Sequence[pd.DataFrame],
+    operation: GroupOperation,
+    data_catalog: pd.DataFrame,
+    filter_cache: FacetFilterCache | None = None,
+) -> list[pd.DataFrame | ConstraintNotSatisfied]:
+    """
+    Apply an operation to many groups of datasets at once
+
+    The operation must provide an `apply_groups` method
+    (see [supports_batch_application][cmip_ref_core.constraints.supports_batch_application]).
+
+    Parameters
+    ----------
+    groups
+        The groups of datasets to apply the operation to.
+    operation
+        The operation to apply.
+    data_catalog
+        The data catalog of all datasets.
+    filter_cache
+        The filter cache of the data catalog.
+
+        This is passed to operations that accept a `filter_cache` argument.
+
+    Returns
+    -------
+    :
+        The updated groups of datasets in the same order as `groups`,
+        or the exception describing why the operation was not successful for a group
+    """
+    apply_groups = operation.apply_groups  # type: ignore[attr-defined]
+    try:
+        if filter_cache is not None and _accepts_filter_cache(type(operation), "apply_groups"):
+            updated_groups: list[pd.DataFrame | None] = apply_groups(
+                groups, data_catalog, filter_cache=filter_cache
+            )
+        else:
+            updated_groups = apply_groups(groups, data_catalog)
+    except ConstraintNotSatisfied:
+        # Find the groups which can't be updated and why
+        return [check_constraint(group, operation, data_catalog, filter_cache) for group in groups]
+    return [
+        ConstraintNotSatisfied(f"{operation!r} not satisfied") if group is None else group
+        for group in updated_groups
+    ]
 
 
 @frozen
@@ -145,15 +463,50 @@ class RequireFacets:
     dimension: str
     required_facets: tuple[str, ...]
 
+    @property
+    def required_columns(self) -> tuple[str, ...]:
+        """
+        Columns of the data catalog used by the constraint
+        """
+        return (self.dimension,)
+
     def validate(self, group: pd.DataFrame) -> bool:
         """
         Check that the required facets are present in the group
         """
         if self.dimension not in group:
-            logger.warning(f"Dimension {self.dimension} not present in group {group}")
+            logger.warning(f"Dimension {self.dimension} not present in group")
             return False
         return all(value in group[self.dimension].values for value in self.required_facets)
 
+    def explain(self, group: pd.DataFrame) -> str:
+        """
+        Describe which of the required facets are missing from the group
+        """
+        if self.dimension not in group:
+            return f"Dimension {self.dimension} not present in group"
+        missing = [value for value in self.required_facets if value not in group[self.dimension].values]
+        return f"Missing {self.dimension}: {', '.join(missing)}"
+
+    def validate_groups(self, data_catalog: pd.DataFrame, group_by: Sequence[str]) -> pd.Series[bool]:
+        """
+        Check that the required facets are present in each group of the data catalog
+        """
+        keys = _group_keys(data_catalog, group_by)
+        if self.dimension not in data_catalog:
+            logger.warning(f"Dimension {self.dimension} not present in data catalog")
+            return pd.Series(False, index=keys)
+
+        required_facets = set(self.required_facets)
+        present = data_catalog[data_catalog[self.dimension].isin(required_facets)]
+        n_present = present.groupby(list(group_by), observed=True)[self.dimension].nunique()
+        return n_present.reindex(keys, fill_value=0) >= len(required_facets)
+
+
+_GROUP = "__group__"
+_CANDIDATE = "__candidate__"
+_DATASET = "__dataset__"
+
 
 @frozen
 class AddSupplementaryDataset:
@@ -176,40 +529,178 @@ class AddSupplementaryDataset:
     Select only the best matching datasets based on similarity with these facets.
     """
 
+    @property
+    def required_columns(self) -> tuple[str, ...]:
+        """
+        Columns of the data catalog used by the constraint
+        """
+        return (*self.supplementary_facets, *self.matching_facets, *self.optional_matching_facets)
+
     def apply(
         self,
         group: pd.DataFrame,
         data_catalog: pd.DataFrame,
+        filter_cache: FacetFilterCache | None = None,
     ) -> pd.DataFrame:
         """
         Add a supplementary dataset to the group.
+
+        If provided, the index in `filter_cache` is used to find the candidate supplementary datasets
+        rather than scanning the data catalog.
+        """
+        return self.apply_groups([group], data_catalog, filter_cache)[0]
+
+    def preserves(self, validator: GroupConstraint) -> bool:
+        """
+        Check if adding the supplementary datasets never changes the result of a validator
+
+        The added datasets only have the values in `supplementary_facets`,
+        so a [RequireFacets][cmip_ref_core.constraints.RequireFacets] constraint on one of these facets
+        isn't affected unless it requires one of the supplementary values.
+        """
+        if not isinstance(validator, RequireFacets) or validator.dimension not in self.supplementary_facets:
+            return False
+        values = self.supplementary_facets[validator.dimension]
+        supplementary_values = {values} if isinstance(values, str) else set(values)
+        return supplementary_values.isdisjoint(validator.required_facets)
+
+    def apply_groups(
+        self,
+        groups: Sequence[pd.DataFrame],
+        data_catalog: pd.DataFrame,
+        filter_cache: FacetFilterCache | None = None,
+    ) -> list[pd.DataFrame]:
         """
-        supplementary_facets: defaultdict[str, tuple[str, ...]] = defaultdict(tuple)
-        for facet, values in self.supplementary_facets.items():
-            supplementary_facets[facet] = values if isinstance(values, tuple) else (values,)
-
-        for facet in self.matching_facets:
-            values = tuple(group[facet].unique())
-            supplementary_facets[facet] += values
-
-        supplementary_group = data_catalog
-        for facet, values in supplementary_facets.items():
-            mask = supplementary_group[facet].isin(values)
-            supplementary_group = supplementary_group[mask]
-
-        if not supplementary_group.empty and self.optional_matching_facets:
-            facets = list(self.matching_facets + self.optional_matching_facets)
-            datasets = group[facets].drop_duplicates()
-            indices = set()
-            for i in range(len(datasets)):
-                scores = (supplementary_group[facets] == datasets.iloc[i]).sum(axis=1)
-                matches = supplementary_group[scores == scores.max()]
-                # Select the latest version if there are multiple matches
-                matches = matches[matches["version"] == matches["version"].max()]
-                indices.add(matches.index[0])
-            supplementary_group = supplementary_group.loc[list(indices)].drop_duplicates()
-
-        return pd.concat([group, supplementary_group])
+        Add a supplementary dataset to each of the groups.
+
+        The candidates are the supplementary datasets whose `matching_facets` have one of the values
+        in the group.
+        If there are `optional_matching_facets`, only the candidate with the most facets in common
+        (and then the latest version) is added for each distinct dataset in the group.
+
+        The candidates are selected from the data catalog once for all the groups,
+        and the candidates of every group are found and scored using vectorised merges.
+        """
+        if filter_cache is not None and filter_cache.data_catalog is not data_catalog:
+            raise ValueError("The filter cache was created for a different data catalog")
+
+        supplementary_facets = {
+            facet: values if isinstance(values, tuple) else (values,)
+            for facet, values in self.supplementary_facets.items()
+        }
+        # The values of the matching facets are checked against each group separately
+        candidate_facets = {
+            facet: values
+            for facet, values in supplementary_facets.items()
+            if facet not in self.matching_facets
+        }
+        if filter_cache is not None:
+            candidates = data_catalog.iloc[filter_cache.select(candidate_facets)]
+        else:
+            mask = np.ones(len(data_catalog), dtype=bool)
+            for facet, values in candidate_facets.items():
+                mask &= data_catalog[facet].isin(values).to_numpy()
+            candidates = data_catalog[mask]
+
+        if candidates.empty or not groups:
+            return list(groups)
+
+        facets = list(dict.fromkeys(self.matching_facets + self.optional_matching_facets))
+        datasets = pd.concat([group[facets] for group in groups], ignore_index=True)
+        datasets[_GROUP] = np.repeat(np.arange(len(groups)), [len(group) for group in groups])
+
+        pairs = self._match_candidates(datasets, len(groups), candidates, supplementary_facets)
+        if self.optional_matching_facets:
+            pairs = self._select_best_matches(datasets.drop_duplicates(), candidates, pairs)
+
+        # The updated groups are slices of a single DataFrame,
+        # which contains the rows of each group followed by the rows of its supplementary datasets
+        group_codes = np.r_[datasets[_GROUP].to_numpy(), pairs[_GROUP].to_numpy()]
+        is_supplementary = np.r_[np.zeros(len(datasets), dtype=bool), np.ones(len(pairs), dtype=bool)]
+        positions = np.r_[np.arange(len(datasets)), len(datasets) + pairs[_CANDIDATE].to_numpy()]
+        updated = pd.concat([*groups, candidates]).take(
+            positions[np.lexsort((is_supplementary, group_codes))]
+        )
+
+        group_sizes = np.asarray([len(group) for group in groups])
+        supplementary_sizes = np.bincount(pairs[_GROUP].to_numpy(), minlength=len(groups))
+        offsets = np.r_[0, np.cumsum(group_sizes + supplementary_sizes)]
+        return [
+            updated.iloc[offsets[i] : offsets[i + 1]] if supplementary_sizes[i] else group
+            for i, group in enumerate(groups)
+        ]
+
+    def _match_candidates(
+        self,
+        datasets: pd.DataFrame,
+        n_groups: int,
+        candidates: pd.DataFrame,
+        supplementary_facets: Mapping[str, tuple[str, ...]],
+    ) -> pd.DataFrame:
+        """
+        Find the candidates of each group
+
+        A candidate matches a group if each of its matching facets has one of the values in the group
+        or one of the values in `supplementary_facets`.
+
+        Returns the group and the position of each matching candidate, sorted by group and position.
+        """
+        pairs = pd.DataFrame({_CANDIDATE: np.arange(len(candidates))})
+        for i, facet in enumerate(self.matching_facets):
+            allowed = datasets[[_GROUP, facet]]
+            extra_values = supplementary_facets.get(facet, ())
+            if extra_values:
+                extra = pd.DataFrame({_GROUP: np.repeat(np.arange(n_groups), len(extra_values))})
+                extra[facet] = np.tile(np.asarray(extra_values, dtype=object), n_groups)
+                allowed = pd.concat([allowed, extra])
+
+            pairs[facet] = candidates[facet].to_numpy()[pairs[_CANDIDATE].to_numpy()]
+            on = [facet] if i == 0 else [_GROUP, facet]
+            pairs = pairs.merge(allowed.drop_duplicates(), on=on)[[_GROUP, _CANDIDATE]]
+
+        if not self.matching_facets:
+            pairs = pd.DataFrame({_GROUP: np.arange(n_groups)}).merge(pairs, how="cross")
+        return pairs.sort_values([_GROUP, _CANDIDATE], ignore_index=True)
+
+    def _select_best_matches(
+        self, datasets: pd.DataFrame, candidates: pd.DataFrame, pairs: pd.DataFrame
+    ) -> pd.DataFrame:
+        """
+        Select the best matching candidate for each distinct dataset in each group
+
+        Returns the group and the position of each row of the selected candidates,
+        sorted by group and position.
+        Duplicate rows within a group are removed.
+        """
+        facets = list(self.matching_facets + self.optional_matching_facets)
+        datasets = datasets.reset_index(drop=True)
+        scored = pairs.merge(datasets[[_GROUP]].reset_index(names=_DATASET), on=_GROUP)
+
+        dataset_positions = scored[_DATASET].to_numpy()
+        candidate_positions = scored[_CANDIDATE].to_numpy()
+        score = np.zeros(len(scored), dtype=np.intp)
+        for facet in facets:
+            dataset_values = datasets[facet].to_numpy()[dataset_positions]
+            score += dataset_values == candidates[facet].to_numpy()[candidate_positions]
+        scored["score"] = score
+        scored = scored[score == scored.groupby(_DATASET)["score"].transform("max").to_numpy()]
+
+        # Select the latest version if there are multiple matches
+        scored = scored.assign(version=candidates["version"].to_numpy()[scored[_CANDIDATE].to_numpy()])
+        scored = scored[scored["version"] == scored.groupby(_DATASET)["version"].transform("max")]
+        best = scored.sort_values([_DATASET, _CANDIDATE]).drop_duplicates(_DATASET)
+
+        # All the rows of the selected datasets are added, as long as they are candidates of the group
+        labels = candidates.index.to_numpy()
+        selected = pd.DataFrame(
+            {_GROUP: best[_GROUP].to_numpy(), "label": labels[best[_CANDIDATE].to_numpy()]}
+        )
+        pairs = pairs.assign(label=labels[pairs[_CANDIDATE].to_numpy()])
+        pairs = pairs.merge(selected.drop_duplicates(), on=[_GROUP, "label"])[[_GROUP, _CANDIDATE]]
+        pairs = pairs.sort_values([_GROUP, _CANDIDATE], ignore_index=True)
+
+        rows = candidates.iloc[pairs[_CANDIDATE].to_numpy()].assign(**{_GROUP: pairs[_GROUP].to_numpy()})
+        return pairs[~rows.duplicated().to_numpy()]
 
     @classmethod
     def from_defaults(
@@ -257,6 +748,11 @@ class AddSupplementaryDataset:
         return cls(supplementary_facets, **kwargs[source_type])
 
 
+# Maximum allowed time difference between the end of one file and the start of the next file.
+# This is the maximum number of days in a month, plus an hour to allow for potential rounding errors.
+_MAX_TIMERANGE_GAP = np.timedelta64(31 * 24 + 1, "h")
+
+
 @frozen
 class RequireContiguousTimerange:
     """
@@ -269,55 +765,96 @@ class RequireContiguousTimerange:
     to fulfill the constraint.
     """
 
+    @property
+    def required_columns(self) -> tuple[str, ...]:
+        """
+        Columns of the data catalog used by the constraint
+        """
+        return (*self.group_by, "start_time", "end_time", "path")
+
     def validate(self, group: pd.DataFrame) -> bool:
         """
         Check that all subgroups of the group have a contiguous timerange.
         """
-        # Maximum allowed time difference between the end of one file and the
-        # start of the next file.
-        max_timedelta = pd.Timedelta(
-            days=31,  # Maximum number of days in a month.
-            hours=1,  # Allow for potential rounding errors.
-        )
-        group = group.dropna(subset=["start_time", "end_time"])
-        if len(group) < 2:  # noqa: PLR2004
-            return True
-
-        for _, subgroup in group.groupby(list(self.group_by)):
-            if len(subgroup) < 2:  # noqa: PLR2004
-                continue
-            sorted_group = subgroup.sort_values("start_time", kind="stable")
-            start_series = sorted_group["start_time"]
-            end_series = sorted_group["end_time"]
-            # Sometimes the elements of start_series.values are of type datetime64[ns]
-            # and sometimes its elements are of type datetime.datetime.
-            # Convert both arrays to datetime.datetime objects to make sure they
-            # can be subtracted.
-            with warnings.catch_warnings():
-                # We have already mitigated the future change in behaviour of DatetimeProperties.to_pydatetime
-                warnings.simplefilter("ignore", FutureWarning)
-
-                if hasattr(start_series, "dt"):
-                    start_array = np.array(start_series.dt.to_pydatetime())
-                else:
-                    start_array = start_series.values  # type: ignore[assignment]
-                if hasattr(end_series, "dt"):
-                    end_array = np.array(end_series.dt.to_pydatetime())
-                else:
-                    end_array = end_series.values  # type: ignore[assignment]
-            diff = start_array[1:] - end_array[:-1]
-            gap_indices = diff > max_timedelta
-            if gap_indices.any():
-                paths = sorted_group["path"]
-                for gap_idx in np.flatnonzero(gap_indices):
-                    logger.debug(
-                        f"Constraint {self.__class__.__name__} not satisfied "
-                        f"because gap larger than {max_timedelta} found between "
-                        f"{paths.iloc[gap_idx]} and {paths.iloc[gap_idx + 1]}"
-                    )
-                return False
+        has_gap = self._find_gaps(group, list(self.group_by))
+        if has_gap.any():
+            self._log_gaps(group, has_gap)
+            return False
         return True
 
+    def explain(self, group: pd.DataFrame) -> str:
+        """
+        Describe where the gaps in the timerange of the group are
+        """
+        has_gap = self._find_gaps(group, list(self.group_by))
+        gaps = [
+            f"{start_time} ({path})"
+            for start_time, path in zip(
+                group["start_time"][has_gap].tolist(), group["path"][has_gap].tolist()
+            )
+        ]
+        return f"Gap of more than a month before {', '.join(gaps)}"
+
+    def validate_groups(self, data_catalog: pd.DataFrame, group_by: Sequence[str]) -> pd.Series[bool]:
+        """
+        Check that the subgroups of each group of the data catalog have a contiguous timerange
+        """
+        keys = _group_keys(data_catalog, group_by)
+        has_gap = self._find_gaps(data_catalog, list(dict.fromkeys([*group_by, *self.group_by])))
+
+        valid = np.ones(len(keys), dtype=bool)
+        if has_gap.any():
+            self._log_gaps(data_catalog, has_gap)
+            codes = (
+                data_catalog.groupby(list(group_by), observed=True)
+                .ngroup()
+                .fillna(-1)
+                .to_numpy(dtype=np.intp)
+            )
+            valid[codes[has_gap & (codes >= 0)]] = False
+        return pd.Series(valid, index=keys)
+
+    def _find_gaps(self, data_catalog: pd.DataFrame, subgroup_by: list[str]) -> np.ndarray[Any, Any]:
+        """
+        Find the files which start more than a month after the end of the previous file in their subgroup
+
+        The files in each subgroup are ordered by their start time.
+        Files without a start or end time are ignored.
+
+        Returns a boolean mask with an element for each row in `data_catalog`
+        """
+        has_gap = np.zeros(len(data_catalog), dtype=bool)
+        start_time = as_datetime64(data_catalog["start_time"])
+        end_time = as_datetime64(data_catalog["end_time"])
+        codes = (
+            data_catalog.groupby(subgroup_by, sort=False, observed=True)
+            .ngroup()
+            .fillna(-1)
+            .to_numpy(dtype=np.intp)
+        )
+        (positions,) = np.nonzero(start_time.notna().to_numpy() & end_time.notna().to_numpy() & (codes >= 0))
+        if len(positions) < 2:  # noqa: PLR2004
+            return has_gap
+
+        start = start_time.to_numpy()[positions]
+        end = end_time.to_numpy()[positions]
+
+        # Order the files by subgroup and then by start time
+        order = np.lexsort((start, codes[positions]))
+        sorted_codes = codes[positions][order]
+        gaps = start[order][1:] - end[order][:-1]
+        is_gap = (sorted_codes[1:] == sorted_codes[:-1]) & (gaps > _MAX_TIMERANGE_GAP)
+        has_gap[positions[order][1:][is_gap]] = True
+        return has_gap
+
+    def _log_gaps(self, data_catalog: pd.DataFrame, has_gap: np.ndarray[Any, Any]) -> None:
+        for path in data_catalog["path"].to_numpy()[has_gap]:
+            logger.debug(
+                "Constraint {} not satisfied because there is a gap of more than a month before {}",
+                self.__class__.__name__,
+                path,
+            )
+
 
 @frozen
 class RequireOverlappingTimerange:
@@ -331,6 +868,13 @@ class RequireOverlappingTimerange:
     the groups to fulfill the constraint.
     """
 
+    @property
+    def required_columns(self) -> tuple[str, ...]:
+        """
+        Columns of the data catalog used by the constraint
+        """
+        return (*self.group_by, "start_time", "end_time")
+
     def validate(self, group: pd.DataFrame) -> bool:
         """
         Check that all subgroups of the group have an overlapping timerange.
@@ -339,21 +883,201 @@ class RequireOverlappingTimerange:
         if len(group) < 2:  # noqa: PLR2004
             return True
 
-        starts = group.groupby(list(self.group_by))["start_time"].min()
-        ends = group.groupby(list(self.group_by))["end_time"].max()
+        starts = group.groupby(list(self.group_by), observed=True)["start_time"].min()
+        ends = group.groupby(list(self.group_by), observed=True)["end_time"].max()
         return starts.max() < ends.min()  # type: ignore[no-any-return]
 
+    def explain(self, group: pd.DataFrame) -> str:
+        """
+        Describe the subgroups whose timeranges don't overlap
+        """
+        group = group.dropna(subset=["start_time", "end_time"])
+        starts = group.groupby(list(self.group_by), observed=True)["start_time"].min()
+        ends = group.groupby(list(self.group_by), observed=True)["end_time"].max()
+        return (
+            f"No overlap between the timeranges of each {', '.join(self.group_by)}: "
+            f"{starts.idxmax()} starts at {starts.max()} after {ends.idxmin()} ends at {ends.min()}"
+        )
+
+    def validate_groups(self, data_catalog: pd.DataFrame, group_by: Sequence[str]) -> pd.Series[bool]:
+        """
+        Check that the subgroups of each group of the data catalog have an overlapping timerange
+        """
+        keys = _group_keys(data_catalog, group_by)
+        data_catalog = data_catalog.dropna(subset=["start_time", "end_time"])
+
+        # The timerange of each subgroup
+        subgroup_by = list(dict.fromkeys([*group_by, *self.group_by]))
+        timeranges = data_catalog.groupby(subgroup_by, observed=True).agg(
+            start_time=("start_time", "min"), end_time=("end_time", "max")
+        )
+        by_group = timeranges.groupby(level=list(group_by), observed=True)
+        valid = by_group["start_time"].max() < by_group["end_time"].min()
+
+        # Groups with less than two datasets with a timerange are always valid
+        n_rows = data_catalog.groupby(list(group_by), observed=True).size()
+        valid = valid.reindex(n_rows.index, fill_value=False) | (n_rows < 2)  # noqa: PLR2004
+        return valid.reindex(keys, fill_value=True)
+
+
+@frozen
+class SelectTimerange:
+    """
+    Select only the files of a group which overlap a time window
+
+    This reduces the amount of data that is passed to metrics that only analyse part of a dataset,
+    e.g. the part of a long `piControl` simulation that overlaps with an `abrupt-4xCO2` simulation.
+    """
+
+    start: str | None = None
+    """
+    Start of the time window as an ISO 8601 date, e.g. `"1850-01-01"`
+    """
+
+    end: str | None = None
+    """
+    End of the time window as an ISO 8601 date
+    """
+
+    group_by: tuple[str, ...] | None = None
+    """
+    If provided, the time window is limited to the timerange where all the subgroups overlap,
+    i.e. the overlap that is checked by
+    [RequireOverlappingTimerange][cmip_ref_core.constraints.RequireOverlappingTimerange].
+    """
+
+    @property
+    def required_columns(self) -> tuple[str, ...]:
+        """
+        Columns of the data catalog used by the constraint
+        """
+        return (*(self.group_by or ()), "start_time", "end_time")
+
+    @property
+    def adds_datasets(self) -> bool:
+        """
+        Files are only removed from the group
+        """
+        return False
+
+    def apply(self, group: pd.DataFrame, data_catalog: pd.DataFrame) -> pd.DataFrame:
+        """
+        Remove the files which are entirely outside the time window
+
+        Files without a start or end time (e.g. cell measures) are always kept.
+
+        Raises
+        ------
+        ConstraintNotSatisfied
+            The time window is empty or none of the files with a timerange overlap it
+        """
+        start_time = as_datetime64(group["start_time"]).to_numpy()
+        end_time = as_datetime64(group["end_time"]).to_numpy()
+        has_timerange = ~np.isnat(start_time) & ~np.isnat(end_time)
+        if not has_timerange.any():
+            return group
+
+        window_start = np.datetime64(self.start, "us") if self.start is not None else None
+        window_end = np.datetime64(self.end, "us") if self.end is not None else None
+        if self.group_by is not None:
+            timeranges = pd.DataFrame(
+                {
+                    **{facet: group[facet].to_numpy()[has_timerange] for facet in self.group_by},
+                    "start_time": start_time[has_timerange],
+                    "end_time": end_time[has_timerange],
+                }
+            ).groupby(list(self.group_by), observed=True)
+            if timeranges.ngroups:
+                overlap_start = timeranges["start_time"].min().max().to_datetime64()
+                overlap_end = timeranges["end_time"].max().min().to_datetime64()
+                window_start = overlap_start if window_start is None else max(window_start, overlap_start)
+                window_end = overlap_end if window_end is None else min(window_end, overlap_end)
+
+        if window_start is not None and window_end is not None and window_start > window_end:
+            raise ConstraintNotSatisfied(f"Time window {window_start}/{window_end} is empty")
+
+        keep: np.ndarray[Any, np.dtype[np.bool_]] = has_timerange.copy()
+        if window_start is not None:
+            keep &= end_time >= window_start
+        if window_end is not None:
+            keep &= start_time <= window_end
+        if not keep.any():
+            raise ConstraintNotSatisfied(f"No files overlap the time window {window_start}/{window_end}")
+
+        keep |= ~has_timerange
+        if keep.all():
+            return group
+        return group[keep]
+
+
+_DATASET_KEY = ("source_id", "experiment_id", "variant_label")
+_PARENT_KEY = ("parent_source_id", "parent_experiment_id", "parent_variant_label")
+
 
 @frozen
 class SelectParentExperiment:
     """
     Include a dataset's parent experiment in the selection
+
+    The parent of a dataset is identified using its `parent_source_id`, `parent_experiment_id`
+    and `parent_variant_label` facets,
+    e.g. the `piControl` simulation that an `abrupt-4xCO2` simulation was branched from.
     """
 
-    def apply(self, group: pd.DataFrame, data_catalog: pd.DataFrame) -> pd.DataFrame:
+    matching_facets: tuple[str, ...] = ("variable_id", "table_id", "grid_label")
+    """
+    Facets that must match between a dataset and its parent
+    """
+
+    @property
+    def required_columns(self) -> tuple[str, ...]:
+        """
+        Columns of the data catalog used by the constraint
+        """
+        return (*_DATASET_KEY, *_PARENT_KEY, *self.matching_facets, "version")
+
+    def apply(
+        self,
+        group: pd.DataFrame,
+        data_catalog: pd.DataFrame,
+        filter_cache: FacetFilterCache | None = None,
+    ) -> pd.DataFrame:
         """
         Include a dataset's parent experiment in the selection
 
-        Not yet implemented
+        The datasets of the parent experiment which have the same `matching_facets`
+        as a dataset in the group are added to the group.
+        Only the latest version of each parent dataset is added.
+        The group is unchanged if the parents aren't in the data catalog.
+
+        The parents are looked up in a hash index of the data catalog
+        over `(source_id, experiment_id, variant_label)`.
+        If provided, the index is stored in `filter_cache` so it is only built once per data catalog.
         """
-        raise NotImplementedError("This is not implemented yet")  # pragma: no cover
+        if filter_cache is None:
+            filter_cache = FacetFilterCache(data_catalog)
+        elif filter_cache.data_catalog is not data_catalog:
+            raise ValueError("The filter cache was created for a different data catalog")
+
+        index = filter_cache.key_index(_DATASET_KEY)
+        parent_keys = group[list(_PARENT_KEY)].dropna().drop_duplicates()
+        postings = [index[key] for key in parent_keys.itertuples(index=False, name=None) if key in index]
+        if not postings:
+            return group
+        candidates = data_catalog.iloc[np.unique(np.concatenate(postings))]
+
+        # Only the parents of the same variables as the datasets in the group are included
+        columns = [*_PARENT_KEY, *self.matching_facets]
+        child_keys = pd.MultiIndex.from_frame(group[columns].drop_duplicates())
+        candidate_keys = pd.MultiIndex.from_frame(candidates[[*_DATASET_KEY, *self.matching_facets]])
+        parents: pd.DataFrame = candidates[candidate_keys.isin(child_keys)]
+
+        # Select the latest version if there are multiple versions of a parent
+        version = pd.Series(parents["version"].to_numpy(), index=parents.index)
+        latest = version.groupby(
+            [parents[facet].to_numpy() for facet in (*_DATASET_KEY, *self.matching_facets)], dropna=False
+        ).transform("max")
+        is_parent = (version == latest).to_numpy() & ~parents.index.isin(group.index)
+        if not is_parent.any():
+            return group
+        return pd.concat([group, parents.iloc[np.flatnonzero(is_parent)]])
@@ -1,11 +1,22 @@
+from __future__ import annotations
+
 import enum
+import fnmatch
+import functools
 import hashlib
-from collections.abc import Iterable
-from typing import Any
+import re
+from collections.abc import Iterable, Mapping
+from typing import TYPE_CHECKING, Any
 
+import numpy as np
 import pandas as pd
 from attrs import field, frozen
 
+from cmip_ref_core.calendars import as_datetime64
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
 
 class SourceDatasetType(enum.Enum):
     """
@@ -17,35 +28,86 @@ class SourceDatasetType(enum.Enum):
     obs4MIPs = "obs4mips"
 
 
-def _clean_facets(raw_values: dict[str, str | tuple[str, ...] | list[str]]) -> dict[str, tuple[str, ...]]:
+FacetValue = str | re.Pattern[str]
+"""
+A value of a facet to filter on
+
+Either a literal value, a glob pattern (e.g. `"hist-*"`) or a compiled regular expression.
+"""
+
+
+def _clean_facets(
+    raw_values: dict[str, FacetValue | tuple[FacetValue, ...] | list[FacetValue]],
+) -> dict[str, tuple[FacetValue, ...]]:
     """
-    Clean the value of a facet filter to a tuple of strings
+    Clean the value of a facet filter to a tuple of values
     """
     result = {}
 
     for key, value in raw_values.items():
         if isinstance(value, list):
             result[key] = tuple(value)
-        elif isinstance(value, str):
+        elif isinstance(value, str | re.Pattern):
             result[key] = (value,)
         elif isinstance(value, tuple):
             result[key] = value
     return result
 
 
-@frozen
+_GLOB_CHARACTERS = frozenset("*?[")
+
+
+def is_pattern(value: FacetValue) -> bool:
+    """
+    Check if a facet value is a pattern rather than a literal value
+
+    Strings containing any of the glob special characters (`*`, `?` or `[`) are treated as glob patterns.
+    These characters aren't used in the facets of CMIP datasets.
+
+    Parameters
+    ----------
+    value
+        Value to check
+
+    Returns
+    -------
+    :
+        True if the value is a glob pattern or a compiled regular expression
+    """
+    if isinstance(value, re.Pattern):
+        return True
+    return isinstance(value, str) and not _GLOB_CHARACTERS.isdisjoint(value)
+
+
+@functools.cache
+def _compile_pattern(pattern: FacetValue) -> re.Pattern[str]:
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    return re.compile(fnmatch.translate(pattern))
+
+
+def _sort_key(value: FacetValue) -> tuple[bool, str]:
+    if isinstance(value, re.Pattern):
+        return True, value.pattern
+    return False, value
+
+
+@frozen(hash=False)
 class FacetFilter:
     """
     A filter to apply to a data catalog of datasets.
     """
 
-    facets: dict[str, tuple[str, ...]] = field(converter=_clean_facets)
+    facets: dict[str, tuple[FacetValue, ...]] = field(converter=_clean_facets)
     """
     Filters to apply to the data catalog.
 
     The keys are the metadata fields to filter on, and the values are the values to filter on.
     The result will only contain datasets where for all fields,
     the value of the field is one of the given values.
+
+    A value may also be a glob pattern (e.g. `"hist-*"`) or a compiled regular expression
+    which must match the whole value of the field.
     """
     keep: bool = True
     """
@@ -54,19 +116,386 @@ class FacetFilter:
     If true (default), datasets that match the filter will be kept else they will be removed.
     """
 
+    def __hash__(self) -> int:
+        # The facets are stored in a dict which isn't hashable
+        facets = ((facet, tuple(sorted(values, key=_sort_key))) for facet, values in self.facets.items())
+        return hash((tuple(sorted(facets)), self.keep))
+
+
+def _lookup_codes(uniques: pd.Index[Any], values: tuple[str, ...]) -> np.ndarray[Any, np.dtype[np.intp]]:
+    """
+    Get the position of each value in `uniques`, or -1 if the value isn't present
+    """
+    return pd.Categorical(values, categories=uniques).codes.astype(np.intp)
+
+
+class FacetFilterCache:
+    """
+    An inverted index and memoized filter masks for a single data catalog
+
+    For each facet that is filtered on, an index of the row positions for each unique value
+    of the facet is built the first time the facet is used.
+    Selecting the rows for a set of values then only touches the matching rows,
+    rather than comparing every row in the data catalog.
+
+    Many metrics share the same filters (e.g. the frequency or experiment),
+    so the mask for a given facet or filter only needs to be calculated once.
+
+    The index also provides the number of rows for each value of a facet.
+    These statistics are used to estimate the selectivity of the filters,
+    so that the most selective filters are applied first
+    and the remaining filters can be skipped once no rows are left.
+    The index and masks are only valid for the data catalog that the cache was created for,
+    so a new cache should be used if the data catalog changes.
+    """
+
+    def __init__(self, data_catalog: pd.DataFrame):
+        self.data_catalog = data_catalog
+        # Mapping of facet to the unique values, the row positions ordered by value
+        # and the offsets of the rows for each value
+        self._index: dict[
+            str, tuple[pd.Index[Any], np.ndarray[Any, np.dtype[np.intp]], np.ndarray[Any, Any]]
+        ] = {}
+        self._facet_masks: dict[tuple[str, tuple[str, ...]], np.ndarray[Any, np.dtype[np.bool_]]] = {}
+        self._expanded: dict[tuple[str, tuple[FacetValue, ...]], tuple[str, ...]] = {}
+        self._filter_masks: dict[FacetFilter, np.ndarray[Any, np.dtype[np.bool_]]] = {}
+        self._key_indices: dict[
+            tuple[str, ...], dict[tuple[Any, ...], np.ndarray[Any, np.dtype[np.intp]]]
+        ] = {}
+
+    def _get_index(
+        self, facet: str
+    ) -> tuple[pd.Index[Any], np.ndarray[Any, np.dtype[np.intp]], np.ndarray[Any, Any]]:
+        if facet not in self._index:
+            if facet not in self.data_catalog.columns:
+                raise KeyError(
+                    f"Facet {facet!r} not in data catalog columns: {self.data_catalog.columns.to_list()}"
+                )
+            values = self.data_catalog[facet]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # The categories are already a dictionary of the values
+                codes = values.cat.codes.to_numpy(dtype=np.intp)
+                uniques = pd.Index(values.cat.categories)
+            else:
+                codes, uniques = pd.factorize(values)
+            # Sorting the row positions by value makes the rows for each value contiguous.
+            # Missing values have a code of -1 so are sorted first.
+            order = np.argsort(codes, kind="stable")
+            counts = np.bincount(codes + 1, minlength=len(uniques) + 1)
+            self._index[facet] = (uniques, order, np.cumsum(counts))
+        return self._index[facet]
+
+    def expand(self, facet: str, values: Iterable[FacetValue]) -> tuple[str, ...]:
+        """
+        Expand any patterns into the values of a facet that they match
+
+        The patterns are only matched against the unique values of the facet,
+        rather than every row in the data catalog,
+        so filtering using a pattern costs the same as filtering using the values that it matches.
+
+        Parameters
+        ----------
+        facet
+            Name of the facet
+        values
+            Literal values and patterns to expand
+
+        Raises
+        ------
+        KeyError
+            The facet isn't a column in the data catalog
+
+        Returns
+        -------
+        :
+            Sorted unique literal values
+        """
+        requested = tuple(values)
+        patterns: list[FacetValue] = []
+        literals: set[str] = set()
+        for value in requested:
+            if isinstance(value, re.Pattern) or is_pattern(value):
+                patterns.append(value)
+            else:
+                literals.add(value)
+        if not patterns:
+            return tuple(sorted(literals))
+
+        key = (facet, requested)
+        if key not in self._expanded:
+            uniques = self._get_index(facet)[0]
+            matched = {
+                unique
+                for unique in uniques
+                if isinstance(unique, str)
+                and any(_compile_pattern(pattern).fullmatch(unique) for pattern in patterns)
+            }
+            self._expanded[key] = tuple(sorted(literals | matched))
+        return self._expanded[key]
+
+    def positions(self, facet: str, values: Iterable[FacetValue]) -> np.ndarray[Any, np.dtype[np.intp]]:
+        """
+        Get the positions of the rows where a facet has one of the given values
+
+        Parameters
+        ----------
+        facet
+            Name of the facet
+        values
+            Values or patterns to match
+
+        Raises
+        ------
+        KeyError
+            The facet isn't a column in the data catalog
+
+        Returns
+        -------
+        :
+            Sorted row positions in the data catalog
+        """
+        uniques, order, offsets = self._get_index(facet)
+        codes = _lookup_codes(uniques, self.expand(facet, values))
+        postings = [order[offsets[code] : offsets[code + 1]] for code in codes if code >= 0]
+        if not postings:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(postings))
+
+    def count(self, facet: str, values: Iterable[FacetValue]) -> int:
+        """
+        Get the number of rows where a facet has one of the given values
+
+        This only uses the statistics of the index, so no rows are compared.
+
+        Parameters
+        ----------
+        facet
+            Name of the facet
+        values
+            Values or patterns to match
+
+        Raises
+        ------
+        KeyError
+            The facet isn't a column in the data catalog
+
+        Returns
+        -------
+        :
+            Number of matching rows
+        """
+        uniques, _, offsets = self._get_index(facet)
+        codes = _lookup_codes(uniques, self.expand(facet, values))
+        matched = codes[codes >= 0]
+        return int((offsets[matched + 1] - offsets[matched]).sum())
+
+    def estimate_size(self, facet_filter: FacetFilter) -> int:
+        """
+        Estimate the number of rows which are retained by a facet filter
+
+        Parameters
+        ----------
+        facet_filter
+            Filter to estimate
+
+        Returns
+        -------
+        :
+            An upper bound of the number of rows retained by the filter
+        """
+        if facet_filter in self._filter_masks:
+            return int(self._filter_masks[facet_filter].sum())
+
+        counts = [self.count(facet, values) for facet, values in facet_filter.facets.items()]
+        if not counts:
+            return len(self.data_catalog)
+        if facet_filter.keep:
+            # The rows must match every facet
+            return min(counts)
+        # The rows must not match any of the facets
+        return len(self.data_catalog) - max(counts)
+
+    def select(self, facets: Mapping[str, Iterable[FacetValue]]) -> np.ndarray[Any, np.dtype[np.intp]]:
+        """
+        Get the positions of the rows that match all of the facets
+
+        The result isn't cached,
+        so this can be used for one-off lookups without increasing the size of the cache.
+
+        Parameters
+        ----------
+        facets
+            Values or patterns to match for each facet
+
+        Returns
+        -------
+        :
+            Sorted row positions in the data catalog
+        """
+        # Starting with the most selective facet keeps the intersections small
+        ordered = sorted(facets.items(), key=lambda item: self.count(*item))
+        selected: np.ndarray[Any, np.dtype[np.intp]] = np.arange(len(self.data_catalog))
+        for facet, values in ordered:
+            selected = np.intersect1d(selected, self.positions(facet, values), assume_unique=True)
+            if len(selected) == 0:
+                break
+        return selected
+
+    def key_index(self, facets: tuple[str, ...]) -> dict[tuple[Any, ...], np.ndarray[Any, np.dtype[np.intp]]]:
+        """
+        Get a hash index of the rows for each combination of values of several facets
+
+        The index is built the first time it is requested for a set of facets,
+        after which the rows matching a combination of values can be looked up in constant time.
+
+        Parameters
+        ----------
+        facets
+            Names of the facets
+
+        Raises
+        ------
+        KeyError
+            A facet isn't a column in the data catalog
+
+        Returns
+        -------
+        :
+            Mapping of each combination of facet values to the sorted row positions in the data catalog.
+
+            Rows with a missing value for any of the facets aren't included.
+        """
+        if facets not in self._key_indices:
+            missing = [facet for facet in facets if facet not in self.data_catalog.columns]
+            if missing:
+                raise KeyError(
+                    f"Facets {missing} not in data catalog columns: {self.data_catalog.columns.to_list()}"
+                )
+            grouped = self.data_catalog.groupby(list(facets), sort=False, dropna=True, observed=True)
+            self._key_indices[facets] = {
+                key if isinstance(key, tuple) else (key,): np.asarray(positions, dtype=np.intp)
+                for key, positions in grouped.indices.items()
+            }
+        return self._key_indices[facets]
+
+    def facet_mask(self, facet: str, values: tuple[FacetValue, ...]) -> np.ndarray[Any, np.dtype[np.bool_]]:
+        """
+        Get the mask of the rows where a facet has one of the given values
+
+        Parameters
+        ----------
+        facet
+            Name of the facet
+        values
+            Values or patterns to match
+
+        Raises
+        ------
+        KeyError
+            The facet isn't a column in the data catalog
+
+        Returns
+        -------
+        :
+            Read-only boolean mask with an element for each row in the data catalog
+        """
+        key = (facet, self.expand(facet, values))
+        if key not in self._facet_masks:
+            mask = np.zeros(len(self.data_catalog), dtype=bool)
+            mask[self.positions(facet, key[1])] = True
+            mask.flags.writeable = False
+            self._facet_masks[key] = mask
+        return self._facet_masks[key]
+
+    def filter_mask(self, facet_filter: FacetFilter) -> np.ndarray[Any, np.dtype[np.bool_]]:
+        """
+        Get the mask of the rows which are retained by a facet filter
+
+        Parameters
+        ----------
+        facet_filter
+            Filter to apply
+
+        Returns
+        -------
+        :
+            Read-only boolean mask with an element for each row in the data catalog
+        """
+        if facet_filter not in self._filter_masks:
+            mask = np.ones(len(self.data_catalog), dtype=bool)
+            # The facets with the fewest matches are the most selective when the matches are kept
+            ordered = sorted(
+                facet_filter.facets.items(),
+                key=lambda item: self.count(*item),
+                reverse=not facet_filter.keep,
+            )
+            for facet, values in ordered:
+                facet_mask = self.facet_mask(facet, values)
+                # Each facet is negated individually when the matches are removed
+                mask &= facet_mask if facet_filter.keep else ~facet_mask
+                if not mask.any():
+                    break
+            mask.flags.writeable = False
+            self._filter_masks[facet_filter] = mask
+        return self._filter_masks[facet_filter]
+
+    def mask(self, filters: Iterable[FacetFilter]) -> np.ndarray[Any, np.dtype[np.bool_]]:
+        """
+        Get the mask of the rows which are retained by all of the filters
+
+        The filters are applied in order of their estimated selectivity
+        and any remaining filters are skipped once no rows are left.
+
+        Parameters
+        ----------
+        filters
+            Filters to apply
+
+        Returns
+        -------
+        :
+            Boolean mask with an element for each row in the data catalog
+        """
+        mask = np.ones(len(self.data_catalog), dtype=bool)
+        for facet_filter in sorted(filters, key=self.estimate_size):
+            mask &= self.filter_mask(facet_filter)
+            if not mask.any():
+                break
+        return mask
+
+
+FINGERPRINT_COLUMNS = ("path", "start_time", "end_time")
+"""
+File-level columns which are included in the fingerprint of a dataset collection, if present
+"""
+
 
 @frozen
 class DatasetCollection:
     """
     Group of datasets required for a given metric execution for a specific source dataset type.
+
+    The datasets may be provided as a pandas DataFrame or as a `pyarrow.Table`.
+    A pandas view of an Arrow-backed collection is created the first time it is used.
+    Arrow-backed collections are pickled using the Arrow IPC format,
+    which is much cheaper than pickling each value of the object columns of a DataFrame
+    when the collection is sent to another process (e.g. a Celery worker).
+    DataFrame-backed collections use the standard pandas pickle,
+    so `pyarrow` is only needed when a collection is converted using `to_arrow`.
+
+    The datasets shouldn't be modified after the collection is created,
+    as the fingerprint of the collection is only calculated once.
     """
 
-    datasets: pd.DataFrame
+    _data: pd.DataFrame | pa.Table = field(alias="datasets")
     slug_column: str
     """
     Column in datasets that contains the unique identifier for the dataset
     """
 
+    _view: pd.DataFrame | None = field(init=False, default=None, repr=False)
+    _fingerprint: str | None = field(init=False, default=None, repr=False)
+
     def __getattr__(self, item: str) -> Any:
         return getattr(self.datasets, item)
 
@@ -74,11 +503,128 @@ class DatasetCollection:
         return self.datasets[item]
 
     def __hash__(self) -> int:
-        # This hashes each item individually and sums them so order doesn't matter
-        return int(pd.util.hash_pandas_object(self.datasets[self.slug_column]).sum())
+        return int(self.fingerprint[:16], 16)
 
     def __eq__(self, other: object) -> bool:
-        return self.__hash__() == other.__hash__()
+        if not isinstance(other, DatasetCollection):
+            return NotImplemented
+        return self.fingerprint == other.fingerprint
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        if isinstance(self._data, pd.DataFrame):
+            return DatasetCollection, (self._data, self.slug_column)
+        return _read_arrow_collection, (_write_ipc(self._data), self.slug_column)
+
+    @property
+    def datasets(self) -> pd.DataFrame:
+        """
+        Datasets in the collection
+
+        For Arrow-backed collections, the DataFrame is created the first time it is requested.
+        """
+        if isinstance(self._data, pd.DataFrame):
+            return self._data
+        if self._view is None:
+            object.__setattr__(self, "_view", self._data.to_pandas())
+        return self._view  # type: ignore[return-value]
+
+    @property
+    def is_arrow_backed(self) -> bool:
+        """
+        Whether the datasets are stored as a `pyarrow.Table`
+        """
+        return not isinstance(self._data, pd.DataFrame)
+
+    def to_arrow(self) -> DatasetCollection:
+        """
+        Convert the collection to an Arrow-backed collection
+
+        The index of the datasets is preserved.
+        `pyarrow` is an optional dependency of `cmip_ref_core`.
+        If it isn't installed, the collection is returned unchanged and is pickled as a DataFrame.
+
+        Raises
+        ------
+        pyarrow.ArrowException
+            The datasets can't be converted to an Arrow table,
+            e.g. a column contains values of different types
+
+        Returns
+        -------
+        :
+            An Arrow-backed collection with the same datasets.
+
+            The collection is returned unchanged if it is already Arrow-backed.
+        """
+        if not isinstance(self._data, pd.DataFrame):
+            return self
+
+        try:
+            import pyarrow as pa
+        except ImportError:
+            return self
+
+        collection = DatasetCollection(
+            pa.Table.from_pandas(self._data, preserve_index=True), self.slug_column
+        )
+        # The existing DataFrame is reused in this process rather than creating a new view
+        object.__setattr__(collection, "_view", self._data)
+        object.__setattr__(collection, "_fingerprint", self._fingerprint)
+        return collection
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Digest of the datasets in the collection
+
+        The digest covers the slug of each dataset and the file-level metadata in `FINGERPRINT_COLUMNS`,
+        so it changes if a file is added, removed or updated.
+        The order of the rows doesn't affect the digest.
+
+        The fingerprint is calculated the first time it is requested and then cached.
+
+        Returns
+        -------
+        :
+            SHA1 hash of the datasets
+        """
+        if self._fingerprint is None:
+            object.__setattr__(self, "_fingerprint", self._calculate_fingerprint())
+        return self._fingerprint  # type: ignore[return-value]
+
+    def _calculate_fingerprint(self) -> str:
+        columns = [self.slug_column, *(c for c in FINGERPRINT_COLUMNS if c in self.datasets.columns)]
+        values = self.datasets[columns]
+        for column in ("start_time", "end_time"):
+            if column in values:
+                # The same timestamps may be loaded with a different precision
+                values = values.assign(**{column: as_datetime64(values[column])})
+
+        # Sorting the hashes of the rows makes the digest independent of their order
+        row_hashes = np.sort(pd.util.hash_pandas_object(values, index=False).to_numpy())
+        digest = hashlib.sha1("\0".join(columns).encode())  # noqa: S324
+        digest.update(row_hashes.tobytes())
+        return digest.hexdigest()
+
+
+def _write_ipc(table: pa.Table) -> bytes:
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _read_arrow_collection(data: bytes, slug_column: str) -> DatasetCollection:
+    """
+    Rebuild an Arrow-backed collection from the Arrow IPC stream created when it was pickled
+    """
+    import pyarrow as pa
+
+    # The table references the buffer rather than copying it
+    table = pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+    return DatasetCollection(table, slug_column)
 
 
 class MetricDataset:
@@ -90,6 +636,7 @@ class MetricDataset:
 
     def __init__(self, collection: dict[SourceDatasetType | str, DatasetCollection]):
         self._collection = {SourceDatasetType(k): v for k, v in collection.items()}
+        self._hash: str | None = None
 
     def __getitem__(self, key: SourceDatasetType | str) -> DatasetCollection:
         if isinstance(key, str):
@@ -99,29 +646,54 @@ class MetricDataset:
     def __hash__(self) -> int:
         return hash(self.hash)
 
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, MetricDataset):
+            return NotImplemented
+        return self.hash == other.hash
+
     def items(self) -> Iterable[tuple[SourceDatasetType, DatasetCollection]]:
         """
         Iterate over the datasets in the collection
         """
         return self._collection.items()
 
+    def to_arrow(self) -> MetricDataset:
+        """
+        Convert each of the collections to an Arrow-backed collection
+
+        See [DatasetCollection.to_arrow][cmip_ref_core.datasets.DatasetCollection.to_arrow].
+
+        Returns
+        -------
+        :
+            A metric dataset containing the Arrow-backed collections
+        """
+        metric_dataset = MetricDataset(
+            {source_type: collection.to_arrow() for source_type, collection in self._collection.items()}
+        )
+        metric_dataset._hash = self._hash
+        return metric_dataset
+
     @property
     def hash(self) -> str:
         """
         Unique identifier for the collection
 
-        A SHA1 hash is calculated of the combination of the hashes of the individual collections.
+        A SHA1 hash is calculated of the fingerprints of the individual collections
+        and their source dataset types.
         The value isn't reversible but can be used to uniquely identify the aggregate of the
         collections.
 
+        The hash is calculated the first time it is requested and then cached.
+
         Returns
         -------
         :
             SHA1 hash of the collections
         """
-        # The dataset collection hashes are reproducible,
-        # so we can use them to hash the metric dataset.
-        # This isn't explicitly true for all Python hashes
-        hash_sum = sum(hash(item) for item in self._collection.values())
-        hash_bytes = hash_sum.to_bytes(16, "little", signed=True)
-        return hashlib.sha1(hash_bytes).hexdigest()  # noqa: S324
+        if self._hash is None:
+            digest = hashlib.sha1()  # noqa: S324
+            for source_type, collection in sorted(self._collection.items(), key=lambda item: item[0].value):
+                digest.update(f"{source_type.value}:{collection.fingerprint};".encode())
+            self._hash = digest.hexdigest()
+        return self._hash
@@ -8,8 +8,8 @@ from typing import TYPE_CHECKING, Any, Protocol, runtime_checkable
 import pandas as pd
 from attrs import field, frozen
 
-from cmip_ref_core.constraints import GroupConstraint
-from cmip_ref_core.datasets import FacetFilter, MetricDataset, SourceDatasetType
+from cmip_ref_core.constraints import GroupConstraint, get_required_columns
+from cmip_ref_core.datasets import FacetFilter, FacetFilterCache, MetricDataset, SourceDatasetType
 from cmip_ref_core.pycmec.metric import CMECMetric
 from cmip_ref_core.pycmec.output import CMECOutput
 
@@ -248,7 +248,20 @@ class DataRequirement:
     This is effectively an AND operation.
     """
 
-    def apply_filters(self, data_catalog: pd.DataFrame) -> pd.DataFrame:
+    join_facets: tuple[str, ...] = field(factory=tuple)
+    """
+    Facets that must match between the groups of this requirement and the other requirements of a metric
+
+    When a metric has multiple requirements (e.g. a CMIP6 model and an obs4MIPs reference dataset),
+    every combination of the groups from each requirement is a candidate execution by default.
+    Groups are only combined if the values of the facets that are declared in `join_facets`
+    by both requirements are the same, for example to match the `variable_id` of a model and
+    the reference data.
+    """
+
+    def apply_filters(
+        self, data_catalog: pd.DataFrame, filter_cache: FacetFilterCache | None = None
+    ) -> pd.DataFrame:
         """
         Apply filters to a DataFrame-based data catalog.
 
@@ -257,27 +270,51 @@ class DataRequirement:
         data_catalog
             DataFrame to filter.
             Each column contains a facet
+        filter_cache
+            Cache of the filter masks for `data_catalog`
+
+            This allows the masks to be reused when multiple requirements share the same filters.
+            If None, the masks are calculated from scratch.
+
+        Raises
+        ------
+        ValueError
+            The filter cache was created for a different data catalog
 
         Returns
         -------
         :
             Filtered data catalog
         """
-        for facet_filter in self.filters:
-            for facet, value in facet_filter.facets.items():
-                clean_value = value if isinstance(value, tuple) else (value,)
+        if filter_cache is None:
+            filter_cache = FacetFilterCache(data_catalog)
+        elif filter_cache.data_catalog is not data_catalog:
+            raise ValueError("The filter cache was created for a different data catalog")
 
-                if facet not in data_catalog.columns:
-                    raise KeyError(
-                        f"Facet {facet!r} not in data catalog columns: {data_catalog.columns.to_list()}"
-                    )
+        return data_catalog[filter_cache.mask(self.filters)]
 
-                mask = data_catalog[facet].isin(clean_value)
-                if not facet_filter.keep:
-                    mask = ~mask
+    def required_columns(self) -> frozenset[str] | None:
+        """
+        Get the columns of the data catalog that are used to solve for this requirement
+
+        These are the facets used by the filters, `group_by`, `join_facets` and the constraints.
+        Only these columns need to be loaded to determine the groups of datasets for the requirement.
 
-                data_catalog = data_catalog[mask]
-        return data_catalog
+        Returns
+        -------
+        :
+            The columns used by the requirement,
+            or None if a constraint doesn't declare its columns and all columns are required.
+        """
+        columns = set(self.group_by or ()) | set(self.join_facets)
+        for facet_filter in self.filters:
+            columns.update(facet_filter.facets)
+        for constraint in self.constraints:
+            constraint_columns = get_required_columns(constraint)
+            if constraint_columns is None:
+                return None
+            columns.update(constraint_columns)
+        return frozenset(columns)
 
 
 @runtime_checkable
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+import pandas as pd
+
+from cmip_ref_core.calendars import DATETIME_DTYPE, as_datetime64
+
+
+def test_as_datetime64():
+    values = pd.Series(
+        [datetime(2300, 1, 16), None, pd.NaT, pd.Timestamp("1850-01-16 12:00")], index=[3, 4, 5, 6]
+    )
+
+    result = as_datetime64(values)
+
+    assert result.dtype == DATETIME_DTYPE
+    assert result.index.tolist() == [3, 4, 5, 6]
+    assert result.isna().tolist() == [False, True, True, False]
+    assert str(result.iloc[0]) == "2300-01-16 00:00:00"
+    assert as_datetime64(result) is result
+
+
+def test_as_datetime64_nanoseconds():
+    values = pd.Series(pd.to_datetime(["2000-01-16", None]))
+
+    result = as_datetime64(values)
+
+    assert result.dtype == DATETIME_DTYPE
+    assert result.iloc[0] == values.iloc[0]
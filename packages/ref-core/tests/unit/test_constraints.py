@@ -1,5 +1,6 @@
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -11,9 +12,18 @@ from cmip_ref_core.constraints import (
     RequireFacets,
     RequireOverlappingTimerange,
     SelectParentExperiment,
+    SelectTimerange,
+    adds_datasets,
     apply_constraint,
+    apply_operation_to_groups,
+    check_constraint,
+    explain_rejection,
+    get_required_columns,
+    order_constraints,
+    supports_batch_application,
+    supports_batch_validation,
 )
-from cmip_ref_core.datasets import SourceDatasetType
+from cmip_ref_core.datasets import FacetFilterCache, SourceDatasetType
 from cmip_ref_core.exceptions import ConstraintNotSatisfied
 
 
@@ -38,6 +48,17 @@ class TestRequireFacets:
     def test_validate(self, data, expected):
         assert self.constraint.validate(data) == expected
 
+    @pytest.mark.parametrize(
+        "data, expected",
+        [
+            (pd.DataFrame({"invalid": ["tas", "pr"]}), "Dimension variable_id not present in group"),
+            (pd.DataFrame({"variable_id": ["tas"]}), "Missing variable_id: pr"),
+            (pd.DataFrame({"variable_id": ["areacella"]}), "Missing variable_id: tas, pr"),
+        ],
+    )
+    def test_explain(self, data, expected):
+        assert self.constraint.explain(data) == expected
+
 
 class TestAddSupplementaryDataset:
     constraint = AddSupplementaryDataset.from_defaults("areacella", SourceDatasetType.CMIP6)
@@ -122,12 +143,137 @@ class TestAddSupplementaryDataset:
             ),
         ],
     )
-    def test_apply(self, data_catalog, expected_rows):
+    @pytest.mark.parametrize("use_cache", [False, True])
+    def test_apply(self, data_catalog, expected_rows, use_cache):
         group = data_catalog[data_catalog["variable_id"] == "tas"]
-        result = self.constraint.apply(group=group, data_catalog=data_catalog)
+        filter_cache = FacetFilterCache(data_catalog) if use_cache else None
+        result = self.constraint.apply(group=group, data_catalog=data_catalog, filter_cache=filter_cache)
         expected = data_catalog.loc[expected_rows]
         assert (result == expected).all().all()
 
+    def test_apply_cache_different_catalog(self):
+        data_catalog = pd.DataFrame({"variable_id": ["tas"], "source_id": ["A"], "grid_label": ["gn"]})
+
+        with pytest.raises(ValueError, match="The filter cache was created for a different data catalog"):
+            self.constraint.apply(data_catalog, data_catalog, filter_cache=FacetFilterCache(pd.DataFrame()))
+
+    @pytest.mark.parametrize("use_cache", [False, True])
+    def test_apply_groups(self, use_cache):
+        data_catalog = pd.DataFrame(
+            {
+                "variable_id": ["tas", "areacella", "tas", "areacella", "tas", "areacella", "areacella"],
+                "source_id": ["A", "A", "A", "A", "B", "B", "C"],
+                "grid_label": ["gn"] * 7,
+                "table_id": ["Amon", "fx", "Amon", "fx", "Amon", "fx", "fx"],
+                "experiment_id": [
+                    "historical",
+                    "historical",
+                    "ssp585",
+                    "ssp585",
+                    "historical",
+                    "ssp585",
+                    "hist",
+                ],
+                "member_id": ["r1i1p1f1"] * 7,
+                "version": ["v1", "v1", "v1", "v1", "v1", "v2", "v1"],
+            },
+            index=[1, 2, 3, 4, 5, 6, 7],
+        )
+        groups = [
+            data_catalog.loc[[1, 3]],
+            data_catalog.loc[[5]],
+            data_catalog.loc[[1]],
+            # Groups without any supplementary datasets are returned unchanged
+            data_catalog.loc[[1]].assign(source_id="D"),
+        ]
+        filter_cache = FacetFilterCache(data_catalog) if use_cache else None
+
+        result = self.constraint.apply_groups(groups, data_catalog, filter_cache)
+
+        assert [group.index.tolist() for group in result] == [[1, 3, 2, 4], [5, 6], [1, 2], [1]]
+        assert result[3] is groups[3]
+        for group, updated in zip(groups, result):
+            pd.testing.assert_frame_equal(updated, self.constraint.apply(group, data_catalog, filter_cache))
+
+    def test_apply_groups_multiple_rows(self):
+        # All the rows of the selected supplementary dataset are added, but duplicate rows are removed
+        data_catalog = pd.DataFrame(
+            {
+                "variable_id": ["tas", "areacella", "areacella", "areacella"],
+                "source_id": ["A"] * 4,
+                "grid_label": ["gn"] * 4,
+                "table_id": ["Amon", "fx", "fx", "fx"],
+                "experiment_id": ["historical"] * 4,
+                "member_id": ["r1i1p1f1"] * 4,
+                "version": ["v1"] * 4,
+                "path": ["tas.nc", "a.nc", "b.nc", "b.nc"],
+            },
+            index=[1, 2, 2, 2],
+        )
+
+        (result,) = self.constraint.apply_groups([data_catalog.iloc[[0]]], data_catalog)
+
+        assert result["path"].tolist() == ["tas.nc", "a.nc", "b.nc"]
+
+    def test_apply_groups_without_optional_facets(self):
+        constraint = AddSupplementaryDataset(
+            supplementary_facets={"variable_id": "areacella"},
+            matching_facets=("source_id",),
+            optional_matching_facets=(),
+        )
+        data_catalog = pd.DataFrame(
+            {
+                "variable_id": ["tas", "areacella", "areacella", "tas", "areacella"],
+                "source_id": ["A", "A", "A", "B", "C"],
+            }
+        )
+
+        result = constraint.apply_groups([data_catalog.loc[[0]], data_catalog.loc[[3]]], data_catalog)
+
+        assert [group.index.tolist() for group in result] == [[0, 1, 2], [3]]
+
+    def test_supports_batch_application(self):
+        assert supports_batch_application(self.constraint)
+
+    @pytest.mark.parametrize(
+        "validator, expected",
+        [
+            (RequireFacets("variable_id", ("tas", "pr")), True),
+            (RequireFacets("variable_id", ("tas", "areacella")), False),
+            (RequireFacets("experiment_id", ("historical",)), False),
+            (RequireContiguousTimerange(group_by=("instance_id",)), False),
+        ],
+    )
+    def test_preserves(self, validator, expected):
+        assert self.constraint.preserves(validator) == expected
+
+
+def test_supports_batch_application():
+    assert not supports_batch_application(RequireFacets("variable_id", ("tas",)))
+    assert not supports_batch_application(SelectParentExperiment())
+
+
+def test_apply_operation_to_groups(data_catalog):
+    class ExampleOperation:
+        def apply(self, group: pd.DataFrame, data_catalog: pd.DataFrame) -> pd.DataFrame:
+            if (group["source_id"] == "CAS").any():
+                raise ConstraintNotSatisfied("CAS is not supported")
+            return group
+
+        def apply_groups(self, groups, data_catalog):
+            return [self.apply(group, data_catalog) for group in groups]
+
+    groups = [data_catalog.iloc[[0]], data_catalog.iloc[[4]], data_catalog.iloc[[3]]]
+
+    # The groups are applied separately if the batch fails
+    result = apply_operation_to_groups(groups, ExampleOperation(), data_catalog)
+
+    assert result[0] is groups[0]
+    # The reason that the group was rejected is kept
+    assert isinstance(result[1], ConstraintNotSatisfied)
+    assert str(result[1]) == "CAS is not supported"
+    assert result[2] is groups[2]
+
 
 class TestContiguousTimerange:
     constraint = RequireContiguousTimerange(group_by=["variable_id"])
@@ -240,6 +386,34 @@ class TestContiguousTimerange:
     def test_validate(self, data, expected):
         assert self.constraint.validate(data) == expected
 
+    def test_validate_out_of_bounds(self):
+        # Timestamps outside the range of nanosecond precision timestamps
+        data = pd.DataFrame(
+            {
+                "variable_id": ["tas", "tas", "tas"],
+                "start_time": [datetime(2201, 1, 16), datetime(2101, 1, 16), datetime(2301, 1, 16)],
+                "end_time": [datetime(2300, 12, 16), datetime(2200, 12, 16), datetime(2400, 12, 16)],
+                "path": ["tas_2201-2300.nc", "tas_2101-2200.nc", "tas_2301-2400.nc"],
+            }
+        )
+
+        assert self.constraint.validate(data)
+        assert not self.constraint.validate(data.drop(index=0))
+
+    def test_explain(self):
+        data = pd.DataFrame(
+            {
+                "variable_id": ["tas", "tas", "tas"],
+                "start_time": [datetime(2000, 1, 16), datetime(2002, 1, 16), datetime(2001, 1, 16)],
+                "end_time": [datetime(2000, 12, 16), datetime(2002, 12, 16), datetime(2001, 12, 16)],
+                "path": ["tas_2000.nc", "tas_2002.nc", "tas_2001.nc"],
+            }
+        )
+
+        assert self.constraint.explain(data.drop(index=2)) == (
+            "Gap of more than a month before 2002-01-16 00:00:00 (tas_2002.nc)"
+        )
+
 
 class TestOverlappingTimerange:
     constraint = RequireOverlappingTimerange(group_by=["variable_id"])
@@ -314,14 +488,273 @@ class TestOverlappingTimerange:
     def test_validate(self, data, expected):
         assert self.constraint.validate(data) == expected
 
+    def test_explain(self):
+        data = pd.DataFrame(
+            {
+                "variable_id": ["tas", "pr"],
+                "start_time": [datetime(2000, 1, 16), datetime(2002, 1, 16)],
+                "end_time": [datetime(2001, 12, 16), datetime(2002, 12, 16)],
+            }
+        )
 
-class TestSelectParentExperiment:
-    def test_is_group_constraint(self):
-        constraint = SelectParentExperiment()
+        assert self.constraint.explain(data) == (
+            "No overlap between the timeranges of each variable_id: "
+            "pr starts at 2002-01-16 00:00:00 after tas ends at 2001-12-16 00:00:00"
+        )
+
+
+class TestSelectTimerange:
+    @pytest.fixture
+    def group(self):
+        return pd.DataFrame(
+            {
+                "instance_id": ["abrupt", "control", "control", "control", "areacella"],
+                "start_time": [
+                    datetime(1850, 1, 16, 12),
+                    datetime(1800, 1, 16, 12),
+                    datetime(1850, 1, 16, 12),
+                    datetime(1900, 1, 16, 12),
+                    None,
+                ],
+                "end_time": [
+                    datetime(1899, 12, 16, 12),
+                    datetime(1849, 12, 16, 12),
+                    datetime(1899, 12, 16, 12),
+                    datetime(1949, 12, 16, 12),
+                    None,
+                ],
+            },
+            index=[1, 2, 3, 4, 5],
+        )
+
+    def test_is_group_operation(self):
+        constraint = SelectTimerange()
 
         assert isinstance(constraint, GroupOperation)
         assert not isinstance(constraint, GroupValidator)
 
+    @pytest.mark.parametrize(
+        "constraint, expected",
+        [
+            (SelectTimerange(), [1, 2, 3, 4, 5]),
+            (SelectTimerange(start="1900-01-01"), [4, 5]),
+            (SelectTimerange(end="1849-12-31"), [2, 5]),
+            (SelectTimerange(start="1860-01-01", end="1870-01-01"), [1, 3, 5]),
+            # Files that partially overlap the window are kept
+            (SelectTimerange(start="1899-12-01", end="1900-02-01"), [1, 3, 4, 5]),
+            (SelectTimerange(group_by=("instance_id",)), [1, 3, 5]),
+            (SelectTimerange(start="1880-01-01", group_by=("instance_id",)), [1, 3, 5]),
+        ],
+    )
+    def test_apply(self, group, constraint, expected):
+        assert constraint.apply(group, group).index.tolist() == expected
+
+    def test_apply_unchanged(self, group):
+        constraint = SelectTimerange(start="1800-01-01", end="1950-01-01")
+
+        assert constraint.apply(group, group) is group
+
+    @pytest.mark.parametrize(
+        "constraint",
+        [
+            SelectTimerange(start="2000-01-01"),
+            SelectTimerange(start="1870-01-01", end="1860-01-01"),
+            SelectTimerange(end="1840-01-01", group_by=("instance_id",)),
+        ],
+    )
+    def test_apply_no_overlap(self, group, constraint):
+        with pytest.raises(ConstraintNotSatisfied):
+            constraint.apply(group, group)
+
+    def test_apply_no_timerange(self, group):
+        group = group.loc[[5]]
+
+        assert SelectTimerange(start="2000-01-01").apply(group, group) is group
+
+
+@pytest.fixture
+def grouped_catalog():
+    rng = np.random.default_rng(0)
+    n_rows = 500
+    start_year = rng.integers(1990, 2010, n_rows)
+    catalog = pd.DataFrame(
+        {
+            "source_id": rng.choice(["A", "B", "C", "D", "E", None], n_rows),
+            "member_id": rng.choice(["r1", "r2", "r3"], n_rows),
+            "variable_id": rng.choice(["tas", "pr", "rsut", None], n_rows),
+            "start_time": pd.to_datetime({"year": start_year, "month": 1, "day": 1}),
+            "end_time": pd.to_datetime(
+                {"year": start_year + rng.integers(0, 5, n_rows), "month": 12, "day": 31}
+            ),
+            "path": [f"file_{i}.nc" for i in range(n_rows)],
+        }
+    )
+    # Some datasets have no timerange
+    catalog.loc[rng.random(n_rows) < 0.1, "start_time"] = pd.NaT
+    return catalog
+
+
+@pytest.mark.parametrize(
+    "constraint",
+    [
+        RequireFacets(dimension="variable_id", required_facets=("tas", "pr")),
+        RequireFacets(dimension="variable_id", required_facets=("tas", "missing")),
+        RequireFacets(dimension="variable_id", required_facets=()),
+        RequireFacets(dimension="missing", required_facets=("tas",)),
+        RequireOverlappingTimerange(group_by=("variable_id",)),
+        RequireOverlappingTimerange(group_by=("source_id",)),
+        RequireContiguousTimerange(group_by=("variable_id",)),
+        RequireContiguousTimerange(group_by=("source_id", "variable_id")),
+    ],
+)
+@pytest.mark.parametrize("group_by", [("source_id", "member_id"), ("member_id",)])
+def test_validate_groups(grouped_catalog, constraint, group_by):
+    assert supports_batch_validation(constraint)
+
+    result = constraint.validate_groups(grouped_catalog, group_by)
+
+    expected = pd.Series(
+        {name: constraint.validate(group) for name, group in grouped_catalog.groupby(list(group_by))}
+    )
+    assert result.dtype == bool
+    assert result.index.equals(grouped_catalog.groupby(list(group_by)).size().index)
+    assert result.tolist() == expected.tolist()
+
+
+def test_validate_groups_overlapping_timerange():
+    catalog = pd.DataFrame(
+        {
+            "instance_id": ["a", "a", "b", "b", "c", "c", "d"],
+            "variable_id": ["tas", "pr", "tas", "pr", "tas", "pr", "tas"],
+            "start_time": [
+                datetime(2000, 1, 1),
+                datetime(2001, 1, 1),
+                datetime(2000, 1, 1),
+                datetime(2003, 1, 1),
+                datetime(2000, 1, 1),
+                None,
+                datetime(2000, 1, 1),
+            ],
+            "end_time": [
+                datetime(2002, 1, 1),
+                datetime(2005, 1, 1),
+                datetime(2002, 1, 1),
+                datetime(2005, 1, 1),
+                datetime(2002, 1, 1),
+                None,
+                datetime(2002, 1, 1),
+            ],
+        }
+    )
+    constraint = RequireOverlappingTimerange(group_by=("variable_id",))
+
+    result = constraint.validate_groups(catalog, ["instance_id"])
+
+    assert result.to_dict() == {"a": True, "b": False, "c": True, "d": True}
+
+
+def test_supports_batch_validation():
+    assert not supports_batch_validation(
+        AddSupplementaryDataset.from_defaults("areacella", SourceDatasetType.CMIP6)
+    )
+    assert not supports_batch_validation(SelectParentExperiment())
+
+
+class _PerGroupValidator:
+    def validate(self, group: pd.DataFrame) -> bool:
+        return True
+
+
+def test_order_constraints():
+    per_group = _PerGroupValidator()
+    supplementary = AddSupplementaryDataset.from_defaults("areacella", SourceDatasetType.CMIP6)
+    parent = SelectParentExperiment()
+    require_variables = RequireFacets("variable_id", ("tas",))
+    require_areacella = RequireFacets("variable_id", ("areacella",))
+    overlapping = RequireOverlappingTimerange(group_by=("instance_id",))
+
+    ordered = order_constraints(
+        [per_group, supplementary, require_variables, require_areacella, parent, overlapping]
+    )
+
+    # The batch validators are applied before the per-group validators.
+    # Validators are only moved ahead of the operations that don't change their result.
+    assert ordered == (require_variables, per_group, supplementary, require_areacella, parent, overlapping)
+    assert order_constraints([]) == ()
+
+
+class TestSelectParentExperiment:
+    constraint = SelectParentExperiment()
+
+    @pytest.fixture
+    def data_catalog(self):
+        return pd.DataFrame(
+            {
+                "source_id": ["A", "A", "A", "A", "A", "B"],
+                "experiment_id": [
+                    "abrupt-4xCO2",
+                    "abrupt-4xCO2",
+                    "piControl",
+                    "piControl",
+                    "piControl",
+                    "piControl",
+                ],
+                "variant_label": ["r1i1p1f1", "r1i1p1f1", "r1i1p1f1", "r1i1p1f1", "r2i1p1f1", "r1i1p1f1"],
+                "parent_source_id": ["A", "A", "A", "A", "A", "B"],
+                "parent_experiment_id": ["piControl", "piControl", None, None, None, None],
+                "parent_variant_label": ["r1i1p1f1", "r1i1p1f1", None, None, None, None],
+                "variable_id": ["tas", "rlut", "tas", "pr", "tas", "tas"],
+                "table_id": "Amon",
+                "grid_label": "gn",
+                "version": "v20200101",
+            },
+            index=[1, 2, 3, 4, 5, 6],
+        )
+
+    def test_is_group_constraint(self):
+        assert isinstance(self.constraint, GroupOperation)
+        assert not isinstance(self.constraint, GroupValidator)
+
+    @pytest.mark.parametrize("use_cache", [True, False])
+    def test_apply(self, data_catalog, use_cache):
+        filter_cache = FacetFilterCache(data_catalog) if use_cache else None
+
+        result = self.constraint.apply(data_catalog.loc[[1]], data_catalog, filter_cache=filter_cache)
+
+        # Only the parent of the same variable is added
+        assert result.index.tolist() == [1, 3]
+
+    def test_apply_multiple_variables(self, data_catalog):
+        result = self.constraint.apply(data_catalog.loc[[1, 2]], data_catalog)
+
+        # There is no parent for rlut
+        assert result.index.tolist() == [1, 2, 3]
+
+    def test_apply_no_parent(self, data_catalog):
+        group = data_catalog.loc[[6]]
+
+        assert self.constraint.apply(group, data_catalog) is group
+
+    def test_apply_parent_in_group(self, data_catalog):
+        result = self.constraint.apply(data_catalog.loc[[1, 3]], data_catalog)
+
+        assert result.index.tolist() == [1, 3]
+
+    def test_apply_latest_version(self, data_catalog):
+        newer = data_catalog.loc[[3]].assign(version="v20210101").set_axis([7])
+        older = data_catalog.loc[[3]].assign(version="v20190101").set_axis([8])
+        data_catalog = pd.concat([data_catalog, newer, older])
+
+        result = self.constraint.apply(data_catalog.loc[[1]], data_catalog)
+
+        assert result.index.tolist() == [1, 7]
+
+    def test_apply_invalid_cache(self, data_catalog):
+        with pytest.raises(ValueError, match="different data catalog"):
+            self.constraint.apply(
+                data_catalog.loc[[1]], data_catalog, filter_cache=FacetFilterCache(data_catalog.copy())
+            )
+
 
 @pytest.fixture
 def data_catalog():
@@ -357,6 +790,27 @@ def test_apply_constraint_operation(data_catalog):
     )
 
 
+def test_apply_constraint_filter_cache(data_catalog):
+    filter_cache = FacetFilterCache(data_catalog)
+
+    class CachedOperation(GroupOperation):
+        def apply(
+            self, group: pd.DataFrame, data_catalog: pd.DataFrame, filter_cache: FacetFilterCache
+        ) -> pd.DataFrame:
+            return data_catalog.take(filter_cache.positions("variable", ["rsut"]))
+
+    class UncachedOperation(GroupOperation):
+        def apply(self, group: pd.DataFrame, data_catalog: pd.DataFrame) -> pd.DataFrame:
+            return group
+
+    result = apply_constraint(data_catalog, CachedOperation(), data_catalog, filter_cache)
+    assert result.index.tolist() == [2]
+
+    # Operations that don't accept a cache are still supported
+    result = apply_constraint(data_catalog, UncachedOperation(), data_catalog, filter_cache)
+    pd.testing.assert_frame_equal(result, data_catalog)
+
+
 def test_apply_constraint_operation_mutable(data_catalog):
     class MutableOperation(GroupOperation):
         def apply(self, group: pd.DataFrame, data_catalog: pd.DataFrame) -> pd.DataFrame:
@@ -392,6 +846,56 @@ def test_apply_constraint_operation_raises():
     )
 
 
+def test_check_constraint_operation_raises():
+    class RaisesOperation(GroupOperation):
+        def apply(self, group: pd.DataFrame, data_catalog: pd.DataFrame) -> pd.DataFrame:
+            raise ConstraintNotSatisfied("Test exception")
+
+    result = check_constraint(pd.DataFrame(), RaisesOperation(), pd.DataFrame())
+
+    assert isinstance(result, ConstraintNotSatisfied)
+    assert str(result) == "Test exception"
+
+
+@pytest.mark.parametrize(
+    "explain, expected",
+    [
+        (True, "Missing variable: missing"),
+        (False, "RequireFacets(dimension='variable', required_facets=('missing', 'pr')) not satisfied"),
+    ],
+)
+def test_check_constraint_validate_invalid(data_catalog, explain, expected):
+    result = check_constraint(
+        data_catalog,
+        RequireFacets(dimension="variable", required_facets=("missing", "pr")),
+        pd.DataFrame(),
+        explain=explain,
+    )
+
+    assert isinstance(result, ConstraintNotSatisfied)
+    assert str(result) == expected
+
+
+def test_check_constraint_validate(data_catalog):
+    constraint = RequireFacets(dimension="variable", required_facets=("tas", "pr"))
+
+    assert check_constraint(data_catalog, constraint, pd.DataFrame()) is data_catalog
+
+
+def test_explain_rejection():
+    class Validator:
+        def validate(self, group: pd.DataFrame) -> bool:
+            return False
+
+        def __repr__(self) -> str:
+            return "Validator()"
+
+    group = pd.DataFrame({"variable_id": ["tas"]})
+
+    assert explain_rejection(Validator(), group) == "Validator() not satisfied"
+    assert explain_rejection(RequireFacets("variable_id", ("tas", "pr")), group) == "Missing variable_id: pr"
+
+
 def test_apply_constraint_empty():
     assert (
         apply_constraint(
@@ -421,3 +925,61 @@ def test_apply_constraint_validate_invalid(data_catalog):
         )
         is None
     )
+
+
+@pytest.mark.parametrize(
+    "constraint,expected",
+    [
+        (RequireFacets("variable_id", ("tas", "pr")), ("variable_id",)),
+        (
+            AddSupplementaryDataset.from_defaults("areacella", SourceDatasetType.CMIP6),
+            ("variable_id", "source_id", "grid_label", "table_id", "experiment_id", "member_id", "version"),
+        ),
+        (
+            RequireContiguousTimerange(group_by=("instance_id",)),
+            ("instance_id", "start_time", "end_time", "path"),
+        ),
+        (RequireOverlappingTimerange(group_by=("instance_id",)), ("instance_id", "start_time", "end_time")),
+        (SelectTimerange(start="1850-01-01"), ("start_time", "end_time")),
+        (SelectTimerange(group_by=("instance_id",)), ("instance_id", "start_time", "end_time")),
+        (
+            SelectParentExperiment(),
+            (
+                "source_id",
+                "experiment_id",
+                "variant_label",
+                "parent_source_id",
+                "parent_experiment_id",
+                "parent_variant_label",
+                "variable_id",
+                "table_id",
+                "grid_label",
+                "version",
+            ),
+        ),
+        (_PerGroupValidator(), None),
+    ],
+)
+def test_get_required_columns(constraint, expected):
+    assert get_required_columns(constraint) == expected
+
+
+class _Operation:
+    def apply(self, group, data_catalog):
+        return group
+
+
+@pytest.mark.parametrize(
+    "constraint, expected",
+    [
+        (RequireFacets("variable_id", ("tas",)), False),
+        (RequireContiguousTimerange(group_by=("instance_id",)), False),
+        (SelectTimerange(start="1850-01-01"), False),
+        (AddSupplementaryDataset.from_defaults("areacella", SourceDatasetType.CMIP6), True),
+        (SelectParentExperiment(), True),
+        # Operations are assumed to add datasets unless they declare otherwise
+        (_Operation(), True),
+    ],
+)
+def test_adds_datasets(constraint, expected):
+    assert adds_datasets(constraint) == expected
@@ -1,6 +1,20 @@
+import pickle
+import re
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
 import pytest
 
-from cmip_ref_core.datasets import DatasetCollection, MetricDataset, SourceDatasetType
+from cmip_ref_core.datasets import (
+    DatasetCollection,
+    FacetFilter,
+    FacetFilterCache,
+    MetricDataset,
+    SourceDatasetType,
+    is_pattern,
+)
 
 
 @pytest.fixture
@@ -24,6 +38,19 @@ def metric_dataset(dataset_collection) -> MetricDataset:
     return MetricDataset({SourceDatasetType.CMIP6: dataset_collection})
 
 
+@pytest.fixture
+def file_catalog() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "instance_id": ["CMIP6.A.tas", "CMIP6.A.tas", "CMIP6.A.areacella"],
+            "path": ["/data/tas_185001-189912.nc", "/data/tas_190001-194912.nc", "/data/areacella.nc"],
+            "start_time": [datetime(1850, 1, 16, 12), datetime(1900, 1, 16, 12), None],
+            "end_time": [datetime(1899, 12, 16, 12), datetime(1949, 12, 16, 12), None],
+            "variable_id": ["tas", "tas", "areacella"],
+        }
+    )
+
+
 class TestMetricDataset:
     def test_get_item(self, metric_dataset):
         assert metric_dataset["cmip6"] == metric_dataset._collection[SourceDatasetType.CMIP6]
@@ -33,7 +60,7 @@ class TestMetricDataset:
         with pytest.raises(KeyError):
             metric_dataset["cmip7"]
 
-    def test_python_hash(self, metric_dataset, cmip6_data_catalog, data_regression):
+    def test_python_hash(self, metric_dataset, cmip6_data_catalog):
         dataset_hash = hash(metric_dataset)
 
         # The python hash is different to the hash of the dataset
@@ -51,8 +78,18 @@ class TestMetricDataset:
             )
         )
 
-        # This will change if the data catalog changes
-        # Specifically if more tas datasets are provided
+    def test_hash(self, file_catalog, data_regression):
+        collection = DatasetCollection(file_catalog, "instance_id")
+        metric_dataset = MetricDataset({SourceDatasetType.CMIP6: collection})
+
+        assert metric_dataset.hash is metric_dataset.hash
+        assert metric_dataset.hash != MetricDataset({SourceDatasetType.obs4MIPs: collection}).hash
+        assert (
+            MetricDataset({"cmip6": collection, "obs4mips": collection}).hash
+            == MetricDataset({"obs4mips": collection, "cmip6": collection}).hash
+        )
+
+        # This will change if the algorithm used to calculate the hash changes
         data_regression.check(metric_dataset.hash, basename="metric_dataset_hash")
 
 
@@ -65,16 +102,127 @@ class TestDatasetCollection:
         expected = dataset_collection.datasets.instance_id
         assert dataset_collection.instance_id.equals(expected)
 
-    def test_hash(self, dataset_collection, cmip6_data_catalog, data_regression):
+    def test_hash(self, dataset_collection, cmip6_data_catalog):
         tas_datasets = cmip6_data_catalog[cmip6_data_catalog.variable_id == "tas"]
         dataset_hash = hash(DatasetCollection(tas_datasets, "instance_id"))
         assert isinstance(dataset_hash, int)
 
         assert dataset_hash != hash(DatasetCollection(tas_datasets.iloc[[0, 1]], "instance_id"))
 
-        # This hash will change if the data catalog changes
-        # Specifically if more tas datasets are provided
-        data_regression.check(dataset_hash, basename="dataset_collection_hash")
+    def test_fingerprint(self, file_catalog, data_regression):
+        collection = DatasetCollection(file_catalog, "instance_id")
+
+        assert collection.fingerprint is collection.fingerprint
+        # Python reduces the value returned by __hash__ modulo 2**61 - 1
+        assert hash(collection) == hash(int(collection.fingerprint[:16], 16))
+
+        # This will change if the algorithm used to calculate the fingerprint changes
+        data_regression.check(collection.fingerprint, basename="dataset_collection_fingerprint")
+
+    def test_fingerprint_order(self, file_catalog):
+        collection = DatasetCollection(file_catalog, "instance_id")
+        reordered = DatasetCollection(file_catalog.iloc[::-1], "instance_id")
+
+        assert reordered.fingerprint == collection.fingerprint
+        assert reordered == collection
+        assert len({collection, reordered}) == 1
+
+    @pytest.mark.parametrize(
+        "column, value",
+        [
+            ("path", "/data/tas_190001-194912_v2.nc"),
+            ("end_time", datetime(1950, 12, 16, 12)),
+            ("instance_id", "CMIP6.B.tas"),
+        ],
+    )
+    def test_fingerprint_file_changed(self, file_catalog, column, value):
+        collection = DatasetCollection(file_catalog, "instance_id")
+        changed = file_catalog.copy()
+        changed.loc[1, column] = value
+
+        assert DatasetCollection(changed, "instance_id").fingerprint != collection.fingerprint
+        assert DatasetCollection(changed, "instance_id") != collection
+
+    def test_fingerprint_ignored_columns(self, file_catalog):
+        collection = DatasetCollection(file_catalog, "instance_id")
+
+        # Only the slug and file-level columns are included
+        changed = file_catalog.assign(variable_id="pr")
+        assert DatasetCollection(changed, "instance_id").fingerprint == collection.fingerprint
+
+        # The precision of the timestamps doesn't matter
+        changed = file_catalog.astype({"start_time": "datetime64[s]", "end_time": "datetime64[ns]"})
+        assert DatasetCollection(changed, "instance_id").fingerprint == collection.fingerprint
+
+    def test_fingerprint_duplicates(self, file_catalog):
+        collection = DatasetCollection(file_catalog, "instance_id")
+
+        assert DatasetCollection(file_catalog.iloc[[0, 0, 1, 2]], "instance_id") != collection
+
+    def test_eq_other_type(self, file_catalog):
+        assert DatasetCollection(file_catalog, "instance_id") != "CMIP6.A.tas"
+
+
+class TestArrowDatasetCollection:
+    @pytest.fixture
+    def collection(self, file_catalog):
+        pytest.importorskip("pyarrow")
+
+        return DatasetCollection(file_catalog.set_index(pd.Index([3, 5, 8])), "instance_id").to_arrow()
+
+    def test_to_arrow(self, collection, file_catalog):
+        assert collection.is_arrow_backed
+        assert collection.to_arrow() is collection
+        assert not DatasetCollection(file_catalog, "instance_id").is_arrow_backed
+
+    def test_datasets(self, collection):
+        expected = collection.datasets
+
+        # The pandas view is created lazily
+        view = DatasetCollection(collection._data, "instance_id").datasets
+        pd.testing.assert_frame_equal(view, expected, check_dtype=False)
+        assert view.index.tolist() == [3, 5, 8]
+        assert collection.instance_id.tolist() == expected.instance_id.tolist()
+
+    def test_pickle(self, collection):
+        unpickled = pickle.loads(pickle.dumps(collection))  # noqa: S301
+
+        assert unpickled.is_arrow_backed
+        assert unpickled._data.equals(collection._data)
+        assert unpickled == collection
+        assert unpickled.datasets.index.tolist() == [3, 5, 8]
+
+    def test_pickle_pandas(self, file_catalog):
+        collection = DatasetCollection(file_catalog, "instance_id")
+
+        unpickled = pickle.loads(pickle.dumps(collection))  # noqa: S301
+
+        assert not unpickled.is_arrow_backed
+        pd.testing.assert_frame_equal(unpickled.datasets, file_catalog)
+
+    def test_without_pyarrow(self, file_catalog, monkeypatch):
+        # Importing a module that is None in sys.modules raises an ImportError
+        monkeypatch.setitem(sys.modules, "pyarrow", None)
+        collection = DatasetCollection(file_catalog, "instance_id")
+
+        assert collection.to_arrow() is collection
+        metric_dataset = MetricDataset({SourceDatasetType.CMIP6: collection}).to_arrow()
+        assert not metric_dataset[SourceDatasetType.CMIP6].is_arrow_backed
+
+        unpickled = pickle.loads(pickle.dumps(collection))  # noqa: S301
+        pd.testing.assert_frame_equal(unpickled.datasets, file_catalog)
+
+    def test_metric_dataset(self, file_catalog):
+        pytest.importorskip("pyarrow")
+        metric_dataset = MetricDataset(
+            {SourceDatasetType.CMIP6: DatasetCollection(file_catalog, "instance_id")}
+        )
+
+        converted = metric_dataset.to_arrow()
+
+        assert converted[SourceDatasetType.CMIP6].is_arrow_backed
+        assert converted.hash == metric_dataset.hash
+        assert converted == metric_dataset
 
 
 class TestDatasetCollectionObs4MIPs:
@@ -86,13 +234,210 @@ class TestDatasetCollectionObs4MIPs:
         expected = dataset_collection_obs4mips.datasets.instance_id
         assert dataset_collection_obs4mips.instance_id.equals(expected)
 
-    def test_hash(self, dataset_collection_obs4mips, obs4mips_data_catalog, data_regression):
+    def test_hash(self, dataset_collection_obs4mips, obs4mips_data_catalog):
         ta_datasets = obs4mips_data_catalog[obs4mips_data_catalog.variable_id == "ta"]
         dataset_hash = hash(DatasetCollection(ta_datasets, "instance_id"))
         assert isinstance(dataset_hash, int)
 
         assert dataset_hash != hash(DatasetCollection(ta_datasets.iloc[[0, 0]], "instance_id"))
 
-        # This hash will change if the data catalog changes
-        # Specifically if more tas datasets are provided
-        data_regression.check(dataset_hash, basename="dataset_collection_obs4mips_hash")
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("hist-*", True),
+        ("r?i1p1f1", True),
+        ("[ab]", True),
+        (re.compile("hist-.*"), True),
+        ("historical", False),
+        ("1pctCO2", False),
+    ],
+)
+def test_is_pattern(value, expected):
+    assert is_pattern(value) is expected
+
+
+class TestFacetFilter:
+    def test_pattern_hash(self):
+        facet_filter = FacetFilter({"experiment_id": ("hist-*", re.compile("ssp.*"), "historical")})
+
+        assert hash(facet_filter) == hash(
+            FacetFilter({"experiment_id": (re.compile("ssp.*"), "historical", "hist-*")})
+        )
+
+    def test_hash(self):
+        facet_filter = FacetFilter({"a": "1", "b": ["2", "3"]})
+        assert hash(facet_filter) == hash(FacetFilter({"b": ("2", "3"), "a": "1"}))
+        assert hash(FacetFilter({"a": "1"})) != hash(FacetFilter({"a": "1"}, keep=False))
+
+        assert len({FacetFilter({"a": "1"}), FacetFilter({"a": ("1",)})}) == 1
+
+
+class TestFacetFilterCache:
+    @pytest.fixture
+    def data_catalog(self):
+        return pd.DataFrame(
+            {
+                "variable_id": ["tas", "pr", "tas", "areacella"],
+                "frequency": ["mon", "mon", "day", "fx"],
+            }
+        )
+
+    def test_facet_mask(self, data_catalog):
+        filter_cache = FacetFilterCache(data_catalog)
+
+        mask = filter_cache.facet_mask("frequency", ("mon", "fx"))
+        np.testing.assert_array_equal(mask, [True, True, False, True])
+
+        # The order of the values doesn't matter
+        assert filter_cache.facet_mask("frequency", ("fx", "mon")) is mask
+        assert not mask.flags.writeable
+
+    def test_positions(self, data_catalog):
+        filter_cache = FacetFilterCache(data_catalog)
+
+        np.testing.assert_array_equal(filter_cache.positions("variable_id", ["tas", "missing"]), [0, 2])
+        np.testing.assert_array_equal(filter_cache.positions("variable_id", ["areacella", "pr"]), [1, 3])
+        assert len(filter_cache.positions("variable_id", ["missing"])) == 0
+
+    def test_positions_missing_values(self):
+        filter_cache = FacetFilterCache(pd.DataFrame({"member_id": [None, "r1i1p1f1", None, "r2i1p1f1"]}))
+
+        np.testing.assert_array_equal(filter_cache.positions("member_id", ["r1i1p1f1", "r2i1p1f1"]), [1, 3])
+
+    def test_categorical(self, data_catalog):
+        categorical_catalog = data_catalog.astype("category")
+        categorical_catalog["variable_id"] = categorical_catalog["variable_id"].cat.add_categories(["ts"])
+        filter_cache = FacetFilterCache(categorical_catalog)
+        facet_filter = FacetFilter({"variable_id": ("tas", "ts"), "frequency": "mon"})
+
+        np.testing.assert_array_equal(
+            filter_cache.filter_mask(facet_filter), FacetFilterCache(data_catalog).filter_mask(facet_filter)
+        )
+        np.testing.assert_array_equal(filter_cache.positions("variable_id", ["ts", "areacella"]), [3])
+        assert filter_cache.count("variable_id", ["ts"]) == 0
+
+    def test_categorical_missing_values(self):
+        filter_cache = FacetFilterCache(
+            pd.DataFrame({"member_id": pd.Categorical([None, "r1i1p1f1", None, "r2i1p1f1"])})
+        )
+
+        np.testing.assert_array_equal(filter_cache.positions("member_id", ["r2i1p1f1", "r1i1p1f1"]), [1, 3])
+
+    def test_expand(self):
+        filter_cache = FacetFilterCache(
+            pd.DataFrame({"experiment_id": ["hist-GHG", "historical", "1pctCO2-bgc", "1pctCO2", None]})
+        )
+
+        assert filter_cache.expand("experiment_id", ("1pctCO2-*", "hist-*")) == ("1pctCO2-bgc", "hist-GHG")
+        assert filter_cache.expand("experiment_id", ("hist*", "amip")) == ("amip", "hist-GHG", "historical")
+        assert filter_cache.expand("experiment_id", (re.compile("1pct.*"),)) == ("1pctCO2", "1pctCO2-bgc")
+        # Regular expressions must match the whole value
+        assert filter_cache.expand("experiment_id", (re.compile("hist"),)) == ()
+        assert filter_cache.expand("experiment_id", ("ssp126", "amip")) == ("amip", "ssp126")
+
+    def test_expand_missing(self, data_catalog):
+        with pytest.raises(KeyError, match="Facet 'missing' not in data catalog columns"):
+            FacetFilterCache(data_catalog).expand("missing", ("t*",))
+
+    def test_filter_mask_pattern(self):
+        data_catalog = pd.DataFrame(
+            {
+                "variable_id": ["tas", "tas", "rsut", "tas"],
+                "experiment_id": ["hist-GHG", "historical", "1pctCO2-bgc", "1pctCO2"],
+            }
+        )
+        filter_cache = FacetFilterCache(data_catalog.astype("category"))
+
+        facet_filter = FacetFilter({"experiment_id": ("1pctCO2-*", "hist-*")}, keep=False)
+        np.testing.assert_array_equal(filter_cache.filter_mask(facet_filter), [False, True, False, True])
+        assert filter_cache.facet_mask("experiment_id", ("hist-*", "1pctCO2-*")) is filter_cache.facet_mask(
+            "experiment_id", ("1pctCO2-bgc", "hist-GHG")
+        )
+        assert filter_cache.estimate_size(FacetFilter({"variable_id": "t?s"})) == 3
+
+    def test_select(self, data_catalog):
+        filter_cache = FacetFilterCache(data_catalog)
+
+        selected = filter_cache.select({"variable_id": ["tas"], "frequency": ["mon"]})
+        np.testing.assert_array_equal(selected, [0])
+        np.testing.assert_array_equal(filter_cache.select({}), [0, 1, 2, 3])
+        # Selections aren't cached
+        assert not filter_cache._facet_masks
+
+    def test_facet_mask_missing(self, data_catalog):
+        with pytest.raises(KeyError, match="Facet 'missing' not in data catalog columns"):
+            FacetFilterCache(data_catalog).facet_mask("missing", ("tas",))
+
+    def test_filter_mask_dont_keep(self, data_catalog):
+        filter_cache = FacetFilterCache(data_catalog)
+        facet_filter = FacetFilter({"variable_id": "tas", "frequency": "mon"}, keep=False)
+
+        # Each facet is removed independently
+        np.testing.assert_array_equal(filter_cache.filter_mask(facet_filter), [False, False, False, True])
+        assert filter_cache.filter_mask(facet_filter) is filter_cache.filter_mask(
+            FacetFilter({"frequency": "mon", "variable_id": "tas"}, keep=False)
+        )
+
+    def test_mask(self, data_catalog):
+        filter_cache = FacetFilterCache(data_catalog)
+
+        mask = filter_cache.mask([FacetFilter({"variable_id": "tas"}), FacetFilter({"frequency": "mon"})])
+        np.testing.assert_array_equal(mask, [True, False, False, False])
+        np.testing.assert_array_equal(filter_cache.mask([]), [True, True, True, True])
+
+    def test_mask_skips_filters(self, data_catalog):
+        filter_cache = FacetFilterCache(data_catalog)
+
+        mask = filter_cache.mask([FacetFilter({"frequency": "mon"}), FacetFilter({"variable_id": "missing"})])
+
+        assert not mask.any()
+        # The most selective filter is applied first and leaves no rows to filter
+        assert list(filter_cache._filter_masks) == [FacetFilter({"variable_id": "missing"})]
+
+    def test_count(self, data_catalog):
+        filter_cache = FacetFilterCache(data_catalog)
+
+        assert filter_cache.count("variable_id", ["tas", "pr", "missing"]) == 3
+        assert filter_cache.count("variable_id", ["missing"]) == 0
+
+    @pytest.mark.parametrize(
+        "facet_filter, expected",
+        [
+            (FacetFilter({"variable_id": "tas"}), 2),
+            (FacetFilter({"variable_id": "tas", "frequency": "day"}), 1),
+            (FacetFilter({"variable_id": "tas", "frequency": "mon"}, keep=False), 2),
+            (FacetFilter({}), 4),
+        ],
+    )
+    def test_estimate_size(self, data_catalog, facet_filter, expected):
+        filter_cache = FacetFilterCache(data_catalog)
+
+        estimate = filter_cache.estimate_size(facet_filter)
+
+        assert estimate == expected
+        # The estimate is an upper bound
+        assert estimate >= filter_cache.filter_mask(facet_filter).sum()
+        assert filter_cache.estimate_size(facet_filter) == filter_cache.filter_mask(facet_filter).sum()
+
+    def test_key_index(self, data_catalog):
+        filter_cache = FacetFilterCache(data_catalog)
+
+        index = filter_cache.key_index(("variable_id", "frequency"))
+
+        np.testing.assert_array_equal(index[("tas", "mon")], [0])
+        np.testing.assert_array_equal(index[("tas", "day")], [2])
+        assert ("pr", "day") not in index
+        assert filter_cache.key_index(("variable_id", "frequency")) is index
+        np.testing.assert_array_equal(filter_cache.key_index(("variable_id",))[("tas",)], [0, 2])
+
+    def test_key_index_missing_values(self):
+        filter_cache = FacetFilterCache(
+            pd.DataFrame({"source_id": ["A", "A"], "member_id": [None, "r1i1p1f1"]})
+        )
+
+        assert list(filter_cache.key_index(("source_id", "member_id"))) == [("A", "r1i1p1f1")]
+
+    def test_key_index_missing_facet(self, data_catalog):
+        with pytest.raises(KeyError, match=r"Facets \['missing'\] not in data catalog columns"):
+            FacetFilterCache(data_catalog).key_index(("variable_id", "missing"))
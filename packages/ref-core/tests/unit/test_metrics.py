@@ -5,7 +5,8 @@ import pandas as pd
 import pytest
 from attr import evolve
 
-from cmip_ref_core.datasets import FacetFilter, SourceDatasetType
+from cmip_ref_core.constraints import RequireFacets
+from cmip_ref_core.datasets import FacetFilter, FacetFilterCache, SourceDatasetType
 from cmip_ref_core.metrics import (
     CommandLineMetric,
     DataRequirement,
@@ -346,3 +347,76 @@ def test_apply_filters_missing(apply_data_catalog):
         match=re.escape("Facet 'missing' not in data catalog columns: ['variable', 'source_id']"),
     ):
         requirement.apply_filters(apply_data_catalog)
+
+
+def test_apply_filters_cache(apply_data_catalog):
+    filter_cache = FacetFilterCache(apply_data_catalog)
+    requirement = DataRequirement(
+        source_type=SourceDatasetType.CMIP6,
+        filters=(
+            FacetFilter({"variable": "tas"}),
+            FacetFilter({"source_id": "ACCESS"}, keep=False),
+        ),
+        group_by=None,
+    )
+
+    pd.testing.assert_frame_equal(
+        requirement.apply_filters(apply_data_catalog, filter_cache),
+        requirement.apply_filters(apply_data_catalog),
+    )
+
+    # A requirement that shares a filter reuses the cached mask
+    other_requirement = evolve(requirement, filters=(FacetFilter({"variable": "tas"}),))
+    other_requirement.apply_filters(apply_data_catalog, filter_cache)
+    assert len(filter_cache._filter_masks) == 2
+    assert len(filter_cache._facet_masks) == 2
+
+
+def test_apply_filters_cache_different_catalog(apply_data_catalog):
+    requirement = DataRequirement(
+        source_type=SourceDatasetType.CMIP6,
+        filters=(FacetFilter({"variable": "tas"}),),
+        group_by=None,
+    )
+
+    with pytest.raises(ValueError, match="The filter cache was created for a different data catalog"):
+        requirement.apply_filters(apply_data_catalog, FacetFilterCache(apply_data_catalog.copy()))
+
+
+def test_required_columns():
+    requirement = DataRequirement(
+        source_type=SourceDatasetType.CMIP6,
+        filters=(FacetFilter({"variable_id": "tas", "frequency": "mon"}), FacetFilter({"realm": "ocean"})),
+        group_by=("source_id",),
+        constraints=(RequireFacets("experiment_id", ("historical",)),),
+        join_facets=("grid_label",),
+    )
+
+    assert requirement.required_columns() == {
+        "variable_id",
+        "frequency",
+        "realm",
+        "source_id",
+        "experiment_id",
+        "grid_label",
+    }
+
+
+class _UndeclaredOperation:
+    """
+    An operation that doesn't declare the columns that it uses
+    """
+
+    def apply(self, group: pd.DataFrame, data_catalog: pd.DataFrame) -> pd.DataFrame:
+        return group
+
+
+def test_required_columns_undeclared():
+    requirement = DataRequirement(
+        source_type=SourceDatasetType.CMIP6,
+        filters=(),
+        group_by=None,
+        constraints=(_UndeclaredOperation(),),
+    )
+
+    assert requirement.required_columns() is None
@@ -8,6 +8,7 @@ from cmip_ref_core.constraints import (
     RequireContiguousTimerange,
     RequireFacets,
     RequireOverlappingTimerange,
+    SelectTimerange,
 )
 from cmip_ref_core.datasets import FacetFilter, SourceDatasetType
 from cmip_ref_core.metrics import DataRequirement
@@ -45,6 +46,7 @@ class TransientClimateResponse(ESMValToolMetric):
                 RequireFacets("experiment_id", experiments),
                 RequireContiguousTimerange(group_by=("instance_id",)),
                 RequireOverlappingTimerange(group_by=("instance_id",)),
+                SelectTimerange(group_by=("instance_id",)),
                 AddSupplementaryDataset.from_defaults("areacella", SourceDatasetType.CMIP6),
             ),
         ),
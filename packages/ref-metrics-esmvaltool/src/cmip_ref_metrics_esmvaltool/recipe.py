@@ -102,7 +102,7 @@ def dataframe_to_recipe(files: pd.DataFrame) -> dict[str, Any]:
     """
     variables: dict[str, Any] = {}
     # TODO: refine to make it possible to combine historical and scenario runs.
-    for _, group in files.groupby("instance_id"):
+    for _, group in files.groupby("instance_id", observed=True):
         facets = as_facets(group)
         short_name = facets.pop("short_name")
         if short_name not in variables:
@@ -12,7 +12,9 @@ from cmip_ref.config import Config
 from cmip_ref.database import Database
 from cmip_ref.datasets.cmip6 import CMIP6DatasetAdapter
 from cmip_ref.datasets.obs4mips import Obs4MIPsDatasetAdapter
+from cmip_ref.models.dataset import CMIP6Dataset, CMIP6File
 from cmip_ref.provider_registry import _register_provider
+from cmip_ref.testing import generate_cmip6_catalog
 
 # Ignore the alembic folder
 collect_ignore = ["src/cmip_ref/migrations"]
@@ -70,3 +72,33 @@ def db_seeded(db_seeded_template, config) -> Database:
     _clone_db(config.db.database_url, db_seeded_template)
 
     return Database.from_config(config, run_migrations=True)
+
+
+@pytest.fixture
+def db_synthetic(db) -> Database:
+    """
+    Database seeded with a small synthetic CMIP6 data catalog
+
+    The datasets are added directly as they don't exist on disk.
+    """
+    adapter = CMIP6DatasetAdapter()
+    data_catalog = generate_cmip6_catalog(200)
+    dataset_columns = [column for column in adapter.dataset_specific_metadata if column != "instance_id"]
+
+    with db.session.begin():
+        for instance_id, data_catalog_dataset in data_catalog.groupby(adapter.slug_column, sort=False):
+            metadata = data_catalog_dataset[dataset_columns].iloc[0].to_dict()
+            dataset = CMIP6Dataset(slug=instance_id, instance_id=instance_id, **metadata)
+            db.session.add(dataset)
+            db.session.flush()
+
+            for file in data_catalog_dataset.astype({"start_time": object, "end_time": object}).itertuples():
+                db.session.add(
+                    CMIP6File(
+                        dataset_id=dataset.id,
+                        path=file.path,
+                        start_time=None if pd.isna(file.start_time) else file.start_time,
+                        end_time=None if pd.isna(file.end_time) else file.end_time,
+                    )
+                )
+    return db
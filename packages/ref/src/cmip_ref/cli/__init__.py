@@ -91,6 +91,7 @@ def build_app() -> typer.Typer:
     app = typer.Typer(name="cmip_ref", no_args_is_help=True)
 
     app.command(name="solve")(solve.solve)
+    app.command(name="execute")(solve.execute)
     app.add_typer(config.app, name="config")
     app.add_typer(datasets.app, name="datasets")
     app.add_typer(executions.app, name="executions")
@@ -1,22 +1,191 @@
+import json
+from pathlib import Path
+
 import typer
+from loguru import logger
+from rich.console import Console
 
+from cmip_ref.cli._utils import pretty_print_df
+from cmip_ref.diagnostics import SolveDiagnostics
+from cmip_ref.plan import execute_plan, plan_metrics, read_plan, select_shard, write_plan
+from cmip_ref.profiling import SolveProfile
 from cmip_ref.solver import solve_metrics
+from cmip_ref.watch import watch_metrics
 
 app = typer.Typer()
+console = Console()
+
+
+def _parse_shard(value: str) -> tuple[int, int]:
+    try:
+        shard, n_shards = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise typer.BadParameter("Expected the shard in the form i/n, e.g. 1/4")
+    if n_shards < 1 or not (1 <= shard <= n_shards):
+        raise typer.BadParameter(f"Shard must be between 1 and {n_shards}")
+    return shard, n_shards
 
 
 @app.command()
-def solve(
+def solve(  # noqa: PLR0913
     ctx: typer.Context,
     dry_run: bool = typer.Option(False, help="Do not execute any metrics"),
+    incremental: bool = typer.Option(
+        False, help="Only solve for datasets that have been added or updated since the previous solve"
+    ),
+    n_jobs: int = typer.Option(1, "--jobs", "-j", help="Number of processes used to solve the metrics"),
+    batch_size: int = typer.Option(
+        100, help="Number of metric executions that are written to the database and submitted at a time"
+    ),
+    plan: Path | None = typer.Option(
+        None,
+        help="Write the candidate metric executions to this plan file instead of running them. "
+        "The plan can be run using `ref execute`",
+    ),
+    profile: bool = typer.Option(
+        False, help="Display the time spent solving each metric and the number of rejected groups"
+    ),
+    profile_json: Path | None = typer.Option(None, help="Write the solver profile to this JSON file"),
+    explain: bool = typer.Option(
+        False, help="Display the groups of datasets that were rejected by the constraints of each metric"
+    ),
+    dataset: list[str] | None = typer.Option(
+        None,
+        help="Only solve for the metric executions that include this dataset, "
+        "e.g. the instance_id of a CMIP6 dataset. Can be specified multiple times",
+    ),
+    provider: list[str] | None = typer.Option(
+        None, help="Only solve for the metrics of this provider. Can be specified multiple times"
+    ),
+    metric: list[str] | None = typer.Option(
+        None, help="Only solve for this metric. Can be specified multiple times"
+    ),
+    cache: bool = typer.Option(
+        False,
+        help="Reuse the groups of datasets found by previous solves if the data catalog hasn't changed",
+    ),
+    watch: bool = typer.Option(
+        False,
+        help="Keep running and solve for new or updated datasets as they are ingested. Stop using Ctrl+C",
+    ),
+    poll_interval: float = typer.Option(
+        30.0, help="Time in seconds between checks for new or updated datasets when using `--watch`"
+    ),
 ) -> None:
     """
     Solve for metrics that require recalculation
 
     This may trigger a number of additional calculations depending on what data has been ingested
     since the last solve.
+
+    The solve can be targeted at specific datasets, providers or metrics.
+    A targeted solve doesn't update the record of the last solve used by `--incremental`.
+
+    An incremental solve solves for all datasets if the providers or metrics have changed
+    since the previous solve.
+    Datasets ingested while a solve is running may be missed by the next incremental solve,
+    so run a complete solve after ingesting concurrently with a solve.
+
+    Using `--watch` keeps the providers and data catalogs in memory
+    and solves for the datasets that have been added or updated every `--poll-interval` seconds.
+    """
+    config = ctx.obj.config
+    db = ctx.obj.database
+
+    if watch:
+        if plan is not None or dataset or dry_run or cache or profile or profile_json or explain:
+            logger.error(
+                "--watch can't be combined with --plan, --dataset, --dry-run, --cache, --profile or --explain"
+            )
+            raise typer.Exit(code=1)
+        try:
+            watch_metrics(
+                db=db,
+                config=config,
+                poll_interval=poll_interval,
+                n_jobs=n_jobs,
+                batch_size=batch_size,
+                provider_slugs=provider or None,
+                metric_slugs=metric or None,
+            )
+        except ValueError as exc:
+            logger.error(str(exc))
+            raise typer.Exit(code=1)
+        return
+
+    solve_profile = SolveProfile() if profile or profile_json else None
+    diagnostics = SolveDiagnostics() if explain else None
+
+    try:
+        with ctx.obj.database.session.begin():
+            if plan is not None:
+                write_plan(
+                    plan_metrics(
+                        config=config,
+                        db=db,
+                        incremental=incremental,
+                        n_jobs=n_jobs,
+                        profile=solve_profile,
+                        dataset_slugs=dataset or None,
+                        provider_slugs=provider or None,
+                        metric_slugs=metric or None,
+                        diagnostics=diagnostics,
+                    ),
+                    plan,
+                )
+            else:
+                solve_metrics(
+                    config=config,
+                    db=db,
+                    dry_run=dry_run,
+                    incremental=incremental,
+                    n_jobs=n_jobs,
+                    batch_size=batch_size,
+                    profile=solve_profile,
+                    dataset_slugs=dataset or None,
+                    provider_slugs=provider or None,
+                    metric_slugs=metric or None,
+                    use_cache=cache,
+                    diagnostics=diagnostics,
+                )
+    except ValueError as exc:
+        logger.error(str(exc))
+        raise typer.Exit(code=1)
+
+    if solve_profile is not None:
+        if profile:
+            pretty_print_df(solve_profile.to_frame().round(3), console=console)
+        if profile_json:
+            profile_json.write_text(json.dumps(solve_profile.to_dict(), indent=2))
+
+    if diagnostics is not None:
+        for metric_diagnostics in diagnostics.metrics.values():
+            for rejection in metric_diagnostics.rejections:
+                console.print(
+                    f"{metric_diagnostics.provider}/{metric_diagnostics.metric} ({rejection.source_type}) "
+                    f"group {rejection.group_label or 'of all datasets'} with {rejection.n_files} files: "
+                    f"{rejection.reason}",
+                    markup=False,
+                    highlight=False,
+                )
+
+
+@app.command()
+def execute(
+    ctx: typer.Context,
+    plan: Path = typer.Argument(..., help="Plan file created by `ref solve --plan`", exists=True),
+    shard: str = typer.Option(
+        "1/1", help="Only execute a subset of the plan, in the form i/n. Shards are numbered from 1"
+    ),
+) -> None:
     """
+    Execute the metric executions in a plan
+
+    Metric executions that have already been run using the same datasets are skipped.
+    """
+    shard_number, n_shards = _parse_shard(shard)
+
     config = ctx.obj.config
     db = ctx.obj.database
     with ctx.obj.database.session.begin():
-        solve_metrics(config=config, db=db, dry_run=dry_run)
+        execute_plan(config=config, db=db, plan=select_shard(read_plan(plan), shard_number, n_shards))
@@ -1,12 +1,22 @@
+from __future__ import annotations
+
+from collections.abc import Collection, Iterable, Sequence
 from pathlib import Path
-from typing import Protocol
+from typing import Any, Protocol, cast
 
 import pandas as pd
 from loguru import logger
+from sqlalchemy import DateTime, String, select
 
 from cmip_ref.config import Config
 from cmip_ref.database import Database
 from cmip_ref.models.dataset import Dataset
+from cmip_ref_core.calendars import as_datetime64
+
+CATEGORICAL_MAX_FRACTION = 0.5
+"""
+Maximum ratio of distinct values to rows for a facet to be stored as a categorical column
+"""
 
 
 def _log_duplicate_metadata(
@@ -98,7 +108,9 @@ class DatasetAdapter(Protocol):
         # Verify that the dataset specific columns don't vary by dataset by counting the unique values
         # for each dataset and checking if there are any that have more than one unique value.
         unique_metadata = (
-            data_catalog[list(self.dataset_specific_metadata)].groupby(self.slug_column).nunique()
+            data_catalog[list(self.dataset_specific_metadata)]
+            .groupby(self.slug_column, observed=True)
+            .nunique()
         )
         if unique_metadata.gt(1).any(axis=1).any():
             _log_duplicate_metadata(data_catalog, unique_metadata, self.slug_column)
@@ -115,7 +127,12 @@ class DatasetAdapter(Protocol):
         return data_catalog
 
     def load_catalog(
-        self, db: Database, include_files: bool = True, limit: int | None = None
+        self,
+        db: Database,
+        include_files: bool = True,
+        limit: int | None = None,
+        columns: Iterable[str] | None = None,
+        dataset_ids: Collection[int] | None = None,
     ) -> pd.DataFrame:
         """
         Load the data catalog from the database
@@ -123,9 +140,173 @@ class DatasetAdapter(Protocol):
         The index of the data catalog is the primary key of the dataset.
         This should be maintained during any processing.
 
+        Parameters
+        ----------
+        db
+            Database instance
+        include_files
+            If True, the catalog contains a row per file rather than a row per dataset
+        limit
+            Maximum number of rows to load
+        columns
+            Metadata columns to load
+
+            The `slug_column` is always included.
+            If None, all the metadata columns are loaded.
+        dataset_ids
+            If provided, only the datasets with these ids are loaded
+
         Returns
         -------
         :
             Data catalog containing the metadata for the currently ingested datasets
+
+            Dataset-specific facets with few distinct values are stored as categorical columns
+            (see [encode_categorical][cmip_ref.datasets.base.encode_categorical]).
+            Pass `observed=True` when grouping by these columns
+            to avoid empty groups for the categories that aren't present after filtering.
         """
         ...
+
+
+def select_catalog_columns(
+    adapter: DatasetAdapter, columns: Iterable[str] | None, include_files: bool
+) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """
+    Determine which of an adapter's metadata columns to load
+
+    Parameters
+    ----------
+    adapter
+        Adapter for the source type
+    columns
+        Requested columns, or None to load all the columns
+    include_files
+        Whether the file-specific metadata is being loaded
+
+    Raises
+    ------
+    ValueError
+        If any of the requested columns aren't tracked by the adapter
+
+    Returns
+    -------
+    :
+        The file-specific and dataset-specific columns to load in the order defined by the adapter
+    """
+    file_columns = adapter.file_specific_metadata if include_files else ()
+    if columns is None:
+        return file_columns, adapter.dataset_specific_metadata
+
+    requested = set(columns) | {adapter.slug_column}
+    unknown = requested - set(file_columns) - set(adapter.dataset_specific_metadata)
+    if unknown:
+        raise ValueError(f"Unknown columns for {type(adapter).__name__}: {sorted(unknown)}")
+    return (
+        tuple(column for column in file_columns if column in requested),
+        tuple(column for column in adapter.dataset_specific_metadata if column in requested),
+    )
+
+
+def query_catalog(  # noqa: PLR0913
+    db: Database,
+    dataset_cls: type[Dataset],
+    file_cls: type[Any] | None,
+    file_columns: tuple[str, ...],
+    dataset_columns: tuple[str, ...],
+    limit: int | None = None,
+    dataset_ids: Collection[int] | None = None,
+) -> pd.DataFrame:
+    """
+    Load a data catalog from the database
+
+    Only the requested columns are selected,
+    which avoids building an ORM object for every file.
+
+    Parameters
+    ----------
+    db
+        Database instance
+    dataset_cls
+        Model of the datasets
+    file_cls
+        Model of the files in a dataset.
+        If None, the catalog contains a row per dataset.
+    file_columns
+        Columns to load from `file_cls`
+    dataset_columns
+        Columns to load from `dataset_cls`
+    limit
+        Maximum number of rows to load
+    dataset_ids
+        If provided, only the datasets with these ids are loaded
+
+    Returns
+    -------
+    :
+        Data catalog indexed by the id of the dataset
+    """
+    stmt = select(
+        dataset_cls.id,
+        *[getattr(file_cls, column) for column in file_columns],
+        *[getattr(dataset_cls, column) for column in dataset_columns],
+    )
+    # The ids break ties between datasets updated at the same time,
+    # so the rows are always loaded in the same order (see `catalog_fingerprint`)
+    order_by = [dataset_cls.updated_at.desc(), dataset_cls.id]
+    if file_cls is not None:
+        # The join is necessary to be able to order by the dataset columns
+        stmt = stmt.select_from(file_cls).join(file_cls.dataset)
+        order_by.append(file_cls.id)
+    if dataset_ids is not None:
+        stmt = stmt.where(dataset_cls.id.in_(list(dataset_ids)))
+    stmt = stmt.order_by(*order_by).limit(limit)
+
+    rows = db.session.execute(stmt).all()
+    data_catalog = pd.DataFrame(
+        [row[1:] for row in rows],
+        columns=[*file_columns, *dataset_columns],
+        index=[row[0] for row in rows],
+    )
+
+    for model, columns in ((file_cls, file_columns), (dataset_cls, dataset_columns)):
+        for column in columns:
+            column_type = getattr(model, column).type
+            if isinstance(column_type, DateTime):
+                # Timestamps are stored with a consistent dtype which can represent any year
+                data_catalog[column] = as_datetime64(data_catalog[column])
+            elif model is dataset_cls and isinstance(column_type, String):
+                data_catalog[column] = encode_categorical(data_catalog[column])
+    return data_catalog
+
+
+def encode_categorical(values: pd.Series[Any]) -> pd.Series[Any]:
+    """
+    Store a column of facet values as a categorical column if it has few distinct values
+
+    The facets of a dataset are repeated for each of its files,
+    so most facets only have a small number of distinct values.
+    Storing these as categorical columns uses much less memory
+    and speeds up comparing and grouping the values.
+
+    The categories are sorted so that sorting and grouping by the column
+    gives the same order as for the original values.
+
+    Parameters
+    ----------
+    values
+        Facet values
+
+    Returns
+    -------
+    :
+        The values as a categorical column,
+        or unchanged if more than `CATEGORICAL_MAX_FRACTION` of the values are distinct
+    """
+    codes, categories = pd.factorize(values, sort=True)
+    if len(categories) > CATEGORICAL_MAX_FRACTION * len(values):
+        return values
+    # Some versions of pandas-stubs only accept a sequence of codes,
+    # but converting the array to a list would copy every code into a Python int
+    categorical = pd.Categorical.from_codes(cast(Sequence[int], codes), categories=categories)
+    return pd.Series(categorical, index=values.index, name=values.name)
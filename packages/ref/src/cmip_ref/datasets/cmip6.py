@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import warnings
+from collections.abc import Collection, Iterable
 from datetime import datetime
 from pathlib import Path
 from typing import Any
@@ -9,13 +10,12 @@ import ecgtools.parsers
 import pandas as pd
 from ecgtools import Builder
 from loguru import logger
-from sqlalchemy.orm import joinedload
 
 from cmip_ref.config import Config
 from cmip_ref.database import Database
-from cmip_ref.datasets.base import DatasetAdapter
+from cmip_ref.datasets.base import DatasetAdapter, query_catalog, select_catalog_columns
 from cmip_ref.datasets.utils import validate_path
-from cmip_ref.models.dataset import CMIP6Dataset, CMIP6File, Dataset
+from cmip_ref.models.dataset import CMIP6Dataset, CMIP6File
 from cmip_ref_core.exceptions import RefException
 
 
@@ -256,7 +256,12 @@ class CMIP6DatasetAdapter(DatasetAdapter):
         return dataset
 
     def load_catalog(
-        self, db: Database, include_files: bool = True, limit: int | None = None
+        self,
+        db: Database,
+        include_files: bool = True,
+        limit: int | None = None,
+        columns: Iterable[str] | None = None,
+        dataset_ids: Collection[int] | None = None,
     ) -> pd.DataFrame:
         """
         Load the data catalog containing the currently tracked datasets/files from the database
@@ -267,44 +272,35 @@ class CMIP6DatasetAdapter(DatasetAdapter):
         The index of the data catalog is the primary key of the dataset.
         This should be maintained during any processing.
 
+        Parameters
+        ----------
+        db
+            Database instance
+        include_files
+            If True, the catalog contains a row per file rather than a row per dataset
+        limit
+            Maximum number of rows to load
+        columns
+            Metadata columns to load
+
+            The `slug_column` is always included.
+            If None, all the metadata columns are loaded.
+        dataset_ids
+            If provided, only the datasets with these ids are loaded
+
         Returns
         -------
         :
             Data catalog containing the metadata for the currently ingested datasets
         """
         # TODO: Paginate this query to avoid loading all the data at once
-        if include_files:
-            result = (
-                db.session.query(CMIP6File)
-                # The join is necessary to be able to order by the dataset columns
-                .join(CMIP6File.dataset)
-                # The joinedload is necessary to avoid N+1 queries (one for each dataset)
-                # https://docs.sqlalchemy.org/en/14/orm/loading_relationships.html#the-zen-of-joined-eager-loading
-                .options(joinedload(CMIP6File.dataset))
-                .order_by(Dataset.updated_at.desc())
-                .limit(limit)
-                .all()
-            )
-
-            return pd.DataFrame(
-                [
-                    {
-                        **{k: getattr(file, k) for k in self.file_specific_metadata},
-                        **{k: getattr(file.dataset, k) for k in self.dataset_specific_metadata},
-                    }
-                    for file in result
-                ],
-                index=[file.dataset.id for file in result],
-            )
-        else:
-            result_datasets = (
-                db.session.query(CMIP6Dataset).order_by(Dataset.updated_at.desc()).limit(limit).all()
-            )
-
-            return pd.DataFrame(
-                [
-                    {k: getattr(dataset, k) for k in self.dataset_specific_metadata}
-                    for dataset in result_datasets
-                ],
-                index=[file.id for file in result_datasets],
-            )
+        file_columns, dataset_columns = select_catalog_columns(self, columns, include_files)
+        return query_catalog(
+            db,
+            CMIP6Dataset,
+            CMIP6File if include_files else None,
+            file_columns,
+            dataset_columns,
+            limit=limit,
+            dataset_ids=dataset_ids,
+        )
@@ -0,0 +1,178 @@
+"""
+Diagnostics of the solver
+
+The diagnostics record which groups of datasets were rejected by the constraints of each metric,
+which explains why an expected metric execution wasn't identified by the solver.
+
+Only a compact record of each rejection is collected during the solve,
+along with the reason that the constraint gave for rejecting the group,
+e.g. which facets are missing or where the gap in a timerange is.
+"""
+
+from collections.abc import Mapping, Sequence
+from typing import Any
+
+import pandas as pd
+from attrs import define, field, frozen
+
+from cmip_ref_core.constraints import GroupConstraint
+
+
+@frozen
+class Rejection:
+    """
+    A group of datasets that was rejected by a constraint
+    """
+
+    source_type: str
+    """
+    Source type of the data requirement
+    """
+
+    constraint: GroupConstraint
+    """
+    The constraint that the group didn't satisfy
+    """
+
+    group: tuple[tuple[str, Any], ...]
+    """
+    The group_by facets of the data requirement and their values for the group
+
+    This is empty if the data requirement doesn't group the datasets.
+    """
+
+    n_files: int
+    """
+    Number of files in the group
+    """
+
+    reason: str
+    """
+    Description of why the group was rejected
+    """
+
+    @property
+    def group_label(self) -> str:
+        """
+        Description of the group, e.g. `source_id=ACCESS-ESM1-5, member_id=r1i1p1f1`
+        """
+        return ", ".join(f"{facet}={value}" for facet, value in self.group)
+
+
+@define
+class MetricDiagnostics:
+    """
+    Diagnostics of the solving of a single metric
+    """
+
+    provider: str
+    metric: str
+
+    rejections: list[Rejection] = field(factory=list)
+    """
+    Groups of datasets rejected by the constraints of the metric's data requirements
+    """
+
+    def reject(
+        self,
+        source_type: str,
+        constraint: GroupConstraint,
+        group: Mapping[str, Any],
+        n_files: int,
+        reason: str | None = None,
+    ) -> None:
+        """
+        Record that a group of datasets didn't satisfy a constraint
+
+        Parameters
+        ----------
+        source_type
+            Source type of the data requirement
+        constraint
+            The constraint that wasn't satisfied
+        group
+            The group_by facets of the data requirement and their values for the group
+        n_files
+            Number of files in the group
+        reason
+            Description of why the group was rejected,
+            e.g. the message of the [ConstraintNotSatisfied][cmip_ref_core.exceptions.ConstraintNotSatisfied]
+            exception.
+            If None, only the constraint is named.
+        """
+        self.rejections.append(
+            Rejection(
+                source_type=source_type,
+                constraint=constraint,
+                group=tuple(group.items()),
+                n_files=n_files,
+                reason=f"{constraint!r} not satisfied" if reason is None else reason,
+            )
+        )
+
+    def merge(self, other: "MetricDiagnostics") -> None:
+        """
+        Add the rejections from other diagnostics of the same metric
+        """
+        self.rejections.extend(other.rejections)
+
+
+@define
+class SolveDiagnostics:
+    """
+    Diagnostics of a solve across all metrics
+    """
+
+    metrics: dict[tuple[str, str], MetricDiagnostics] = field(factory=dict)
+
+    def get(self, provider: str, metric: str) -> MetricDiagnostics:
+        """
+        Get the diagnostics for a metric, creating them if needed
+
+        Parameters
+        ----------
+        provider
+            Slug of the provider
+        metric
+            Slug of the metric
+
+        Returns
+        -------
+        :
+            The diagnostics of the metric
+        """
+        key = (provider, metric)
+        if key not in self.metrics:
+            self.metrics[key] = MetricDiagnostics(provider=provider, metric=metric)
+        return self.metrics[key]
+
+    def add(self, diagnostics: MetricDiagnostics) -> None:
+        """
+        Add the diagnostics of a metric that were collected elsewhere, e.g. in a worker process
+        """
+        self.get(diagnostics.provider, diagnostics.metric).merge(diagnostics)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Convert the diagnostics to a DataFrame with a row per rejected group
+
+        Returns
+        -------
+        :
+            The rejected groups of each metric
+        """
+        columns = ["provider", "metric", "source_type", "constraint", "group", "n_files", "reason"]
+        rows: list[Sequence[Any]] = [
+            (
+                diagnostics.provider,
+                diagnostics.metric,
+                rejection.source_type,
+                type(rejection.constraint).__name__,
+                rejection.group_label,
+                rejection.n_files,
+                rejection.reason,
+            )
+            for diagnostics in self.metrics.values()
+            for rejection in diagnostics.rejections
+        ]
+        return pd.DataFrame(rows, columns=columns)
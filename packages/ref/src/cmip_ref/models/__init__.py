@@ -11,8 +11,19 @@ from cmip_ref.models.dataset import Dataset
 from cmip_ref.models.metric import Metric
 from cmip_ref.models.metric_execution import MetricExecution, MetricExecutionResult
 from cmip_ref.models.provider import Provider
+from cmip_ref.models.solve import SolveCacheEntry, SolveWatermark
 
 Table = TypeVar("Table", bound=Base)
 
 
-__all__ = ["Base", "Dataset", "Metric", "MetricExecution", "MetricExecutionResult", "Provider", "Table"]
+__all__ = [
+    "Base",
+    "Dataset",
+    "Metric",
+    "MetricExecution",
+    "MetricExecutionResult",
+    "Provider",
+    "SolveCacheEntry",
+    "SolveWatermark",
+    "Table",
+]
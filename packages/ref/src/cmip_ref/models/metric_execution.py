@@ -1,5 +1,6 @@
 import enum
 import pathlib
+from collections.abc import Iterable
 from typing import TYPE_CHECKING
 
 from loguru import logger
@@ -72,21 +73,48 @@ class MetricExecution(CreatedUpdatedMixin, Base):
         * no runs have been performed
         * the dataset hash is different from the last run
         """
-        if not self.results:
-            logger.debug(f"Execution {self.key} no previous results")
-            return True
+        latest_dataset_hash = self.results[-1].dataset_hash if self.results else None
 
-        if self.results[-1].dataset_hash != dataset_hash:
-            logger.debug(
-                f"Execution {self.key} hash mismatch: {self.results[-1].dataset_hash} != {dataset_hash}"
-            )
-            return True
+        return execution_should_run(self.key, dataset_hash, latest_dataset_hash, self.dirty)
+
+
+def execution_should_run(key: str, dataset_hash: str, latest_dataset_hash: str | None, dirty: bool) -> bool:
+    """
+    Check if a new run of a metric execution should be performed
+
+    This is the same check as [MetricExecution.should_run][cmip_ref.models.MetricExecution.should_run],
+    but operates on values that have already been loaded from the database.
+    This avoids loading all the results for each execution when checking many executions at once.
 
-        if self.dirty:
-            logger.debug(f"Execution {self.key} is dirty")
-            return True
+    Parameters
+    ----------
+    key
+        Key of the metric execution
+    dataset_hash
+        Hash of the datasets for the candidate run
+    latest_dataset_hash
+        Hash of the datasets used in the most recent run, or None if there have been no runs
+    dirty
+        Whether the execution has been marked as dirty
 
-        return False
+    Returns
+    -------
+    :
+        True if a new run should be performed
+    """
+    if latest_dataset_hash is None:
+        logger.debug(f"Execution {key} no previous results")
+        return True
+
+    if latest_dataset_hash != dataset_hash:
+        logger.debug(f"Execution {key} hash mismatch: {latest_dataset_hash} != {dataset_hash}")
+        return True
+
+    if dirty:
+        logger.debug(f"Execution {key} is dirty")
+        return True
+
+    return False
 
 
 metric_datasets = Table(
@@ -271,3 +299,52 @@ def get_execution_and_latest_result(
     )
 
     return query  # type: ignore
+
+
+def get_execution_states(
+    session: Session, metric_ids: Iterable[int]
+) -> dict[tuple[int, str], tuple[int, bool, str | None]]:
+    """
+    Get the state of the existing executions for a set of metrics in a single query
+
+    Parameters
+    ----------
+    session
+        The database session to use for the query.
+    metric_ids
+        Ids of the metrics to get the executions for
+
+    Returns
+    -------
+    :
+        Mapping of `(metric_id, key)` to a tuple of
+        `(metric execution id, dirty, dataset hash of the most recent result)`.
+        The dataset hash is None if the execution has no results.
+    """
+    # The result ids are monotonically increasing so the largest id is the most recent result
+    latest_result = (
+        session.query(
+            MetricExecutionResult.metric_execution_id,
+            func.max(MetricExecutionResult.id).label("latest_id"),
+        )
+        .group_by(MetricExecutionResult.metric_execution_id)
+        .subquery()
+    )
+
+    query = (
+        session.query(
+            MetricExecution.metric_id,
+            MetricExecution.key,
+            MetricExecution.id,
+            MetricExecution.dirty,
+            MetricExecutionResult.dataset_hash,
+        )
+        .outerjoin(latest_result, MetricExecution.id == latest_result.c.metric_execution_id)
+        .outerjoin(MetricExecutionResult, MetricExecutionResult.id == latest_result.c.latest_id)
+        .filter(MetricExecution.metric_id.in_(list(metric_ids)))
+    )
+
+    return {
+        (metric_id, key): (execution_id, dirty, dataset_hash)
+        for metric_id, key, execution_id, dirty, dataset_hash in query
+    }
@@ -0,0 +1,123 @@
+import datetime
+from typing import Any
+
+from sqlalchemy import JSON, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, Session, mapped_column
+
+from cmip_ref.models.base import Base, CreatedUpdatedMixin
+
+
+class SolveWatermark(CreatedUpdatedMixin, Base):
+    """
+    Represents the state of the data catalog when a solve was completed
+
+    An incremental solve only needs to consider the datasets that have been added or updated
+    since the most recent watermark.
+    """
+
+    __tablename__ = "solve_watermark"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    dataset_updated_at: Mapped[datetime.datetime | None] = mapped_column(nullable=True)
+    """
+    The time that the solve started according to the database
+
+    The datasets with an `updated_at` value at, or after, this time
+    are solved for by the next incremental solve.
+    If None, the next incremental solve solves for all datasets.
+    """
+
+    provider_fingerprint: Mapped[str | None] = mapped_column(nullable=True)
+    """
+    Fingerprint of the providers and metrics that were solved for
+
+    See [ProviderRegistry.fingerprint][cmip_ref.provider_registry.ProviderRegistry.fingerprint].
+    An incremental solve solves for all datasets if the providers or metrics have changed since.
+    """
+
+    def __repr__(self) -> str:
+        return f"<SolveWatermark dataset_updated_at={self.dataset_updated_at}>"
+
+
+class SolveCacheEntry(CreatedUpdatedMixin, Base):
+    """
+    The groups of datasets that were found for a data requirement of a metric
+
+    The groups are only valid for the data catalog with the same fingerprint,
+    and are reused by subsequent solves until the data catalog or the requirement changes.
+    """
+
+    __tablename__ = "solve_cache"
+    __table_args__ = (
+        UniqueConstraint(
+            "provider_slug", "provider_version", "metric_slug", "requirement_hash", name="solve_cache_ident"
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    provider_slug: Mapped[str]
+    provider_version: Mapped[str]
+    metric_slug: Mapped[str]
+
+    requirement_hash: Mapped[str]
+    """
+    Hash of the definition of the data requirement
+    """
+
+    catalog_fingerprint: Mapped[str]
+    """
+    Fingerprint of the data catalog that the groups were solved against
+    """
+
+    groups: Mapped[list[Any]] = mapped_column(JSON)
+    """
+    The dataset ids of each group
+
+    Consecutive rows of a group that belong to the same dataset are stored as a single id.
+    """
+
+    def __repr__(self) -> str:
+        return (
+            f"<SolveCacheEntry provider={self.provider_slug} version={self.provider_version} "
+            f"metric={self.metric_slug} requirement_hash={self.requirement_hash}>"
+        )
+
+
+def get_transaction_timestamp(session: Session) -> datetime.datetime:
+    """
+    Get the current time according to the database
+
+    For PostgreSQL this is the time that the current transaction started.
+    SQLite returns the time of the query instead,
+    so this should be called before any other query in the transaction.
+
+    Parameters
+    ----------
+    session
+        The database session to use for the query.
+
+    Returns
+    -------
+    :
+        The current time in the same format as the `created_at` and `updated_at` columns
+    """
+    return session.query(func.now()).scalar()  # type: ignore[no-any-return]
+
+
+def get_latest_watermark(session: Session) -> SolveWatermark | None:
+    """
+    Get the watermark of the most recently completed solve
+
+    Parameters
+    ----------
+    session
+        The database session to use for the query.
+
+    Returns
+    -------
+    :
+        The most recent watermark or None if no solves have been recorded
+    """
+    return session.query(SolveWatermark).order_by(SolveWatermark.id.desc()).first()
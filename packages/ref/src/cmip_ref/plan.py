@@ -0,0 +1,392 @@
+"""
+Execution plans
+
+An execution plan is a persisted list of the candidate metric executions identified by the solver.
+Separating the planning from the execution allows the work to be inspected,
+scheduled and split across multiple hosts before any metric executions are submitted.
+"""
+
+import pathlib
+from collections.abc import Collection, Iterable
+from typing import Any
+
+import pandas as pd
+from loguru import logger
+
+from cmip_ref.config import Config
+from cmip_ref.database import Database
+from cmip_ref.datasets import get_dataset_adapter
+from cmip_ref.diagnostics import SolveDiagnostics
+from cmip_ref.profiling import SolveProfile
+from cmip_ref.provider_registry import ProviderRegistry
+from cmip_ref.solver import (
+    MetricExecution,
+    MetricSolver,
+    build_solver,
+    get_required_columns,
+    select_dataset_files,
+    solve_candidates,
+    submit_candidates,
+)
+from cmip_ref_core.datasets import DatasetCollection, MetricDataset, SourceDatasetType
+from cmip_ref_core.metrics import MetricExecutionDefinition
+
+PLAN_COLUMNS = (
+    "provider",
+    "provider_version",
+    "metric",
+    "key",
+    "dataset_hash",
+    "datasets",
+    "paths",
+    "n_files",
+    "total_bytes",
+)
+"""
+Columns in an execution plan
+"""
+
+
+def _input_bytes(collection: DatasetCollection) -> int:
+    """
+    Get the total size of the files in a collection
+
+    Files that can't be found are ignored.
+    """
+    if "path" not in collection.datasets.columns:
+        return 0
+
+    total = 0
+    for path in collection.datasets["path"].dropna().unique():
+        try:
+            total += pathlib.Path(path).stat().st_size
+        except OSError:
+            logger.debug(f"Unable to determine the size of {path}")
+    return total
+
+
+def build_plan(candidates: Iterable[tuple[MetricExecution, MetricExecutionDefinition]]) -> pd.DataFrame:
+    """
+    Build an execution plan from the candidate metric executions
+
+    Parameters
+    ----------
+    candidates
+        Candidate metric executions and their definitions
+
+    Returns
+    -------
+    :
+        The execution plan
+
+        Each row is a candidate metric execution, with the ids of the datasets
+        and the paths of the files used from those datasets for each source type,
+        and an estimate of the cost of the execution (the number of input files and their total size).
+        The plan is sorted so that the executions with the largest inputs are first.
+    """
+    rows = []
+    for metric_execution, definition in candidates:
+        collections = list(metric_execution.metric_dataset.items())
+        rows.append(
+            {
+                "provider": metric_execution.provider.slug,
+                "provider_version": metric_execution.provider.version,
+                "metric": metric_execution.metric.slug,
+                "key": definition.key,
+                "dataset_hash": definition.metric_dataset.hash,
+                "datasets": {
+                    source_type.value: [int(dataset_id) for dataset_id in pd.unique(collection.index)]
+                    for source_type, collection in collections
+                },
+                "paths": {
+                    source_type.value: collection.datasets["path"].tolist()
+                    if "path" in collection.datasets.columns
+                    else None
+                    for source_type, collection in collections
+                },
+                "n_files": sum(len(collection.datasets) for _, collection in collections),
+                "total_bytes": sum(_input_bytes(collection) for _, collection in collections),
+            }
+        )
+
+    plan = pd.DataFrame(rows, columns=list(PLAN_COLUMNS))
+    return plan.sort_values("total_bytes", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def write_plan(plan: pd.DataFrame, path: pathlib.Path) -> None:
+    """
+    Write an execution plan to disk
+
+    Plans with a `.parquet` suffix are written as Parquet files.
+    Otherwise, the plan is written as JSON lines.
+
+    Parameters
+    ----------
+    plan
+        Execution plan
+    path
+        Path to write the plan to
+    """
+    if path.suffix == ".parquet":
+        plan.to_parquet(path, index=False)
+    else:
+        plan.to_json(path, orient="records", lines=True)
+    logger.info(f"Wrote execution plan with {len(plan)} metric executions to {path}")
+
+
+def read_plan(path: pathlib.Path) -> pd.DataFrame:
+    """
+    Read an execution plan from disk
+
+    Parameters
+    ----------
+    path
+        Path to a plan written by [write_plan][cmip_ref.plan.write_plan]
+
+    Returns
+    -------
+    :
+        The execution plan
+    """
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    # Disable the type inference to prevent values such as the provider version being coerced
+    return pd.read_json(path, orient="records", lines=True, dtype=False)
+
+
+def select_shard(plan: pd.DataFrame, shard: int, n_shards: int) -> pd.DataFrame:
+    """
+    Select a subset of an execution plan
+
+    The executions are assigned to the shards in a round-robin fashion,
+    which keeps the shards balanced and the largest executions at the start of each shard.
+
+    Parameters
+    ----------
+    plan
+        Execution plan
+    shard
+        Shard to select (starting at 1)
+    n_shards
+        Total number of shards
+
+    Raises
+    ------
+    ValueError
+        If the shard isn't in the range 1 to `n_shards`
+
+    Returns
+    -------
+    :
+        The metric executions in the shard
+    """
+    if n_shards < 1 or not (1 <= shard <= n_shards):
+        raise ValueError(f"Invalid shard {shard}/{n_shards}")
+    return plan.iloc[shard - 1 :: n_shards]
+
+
+def _load_metric_dataset(
+    datasets: dict[str, list[int] | None],
+    paths: dict[str, list[str] | None],
+    data_catalog: dict[SourceDatasetType, pd.DataFrame],
+) -> MetricDataset | None:
+    """
+    Select the files used by a planned execution from the data catalog
+
+    Returns None if any of the datasets are no longer in the data catalog.
+    """
+    collection: dict[SourceDatasetType | str, DatasetCollection] = {}
+    for source_type_value, dataset_ids in datasets.items():
+        # Parquet fills in the source types that weren't used by the execution
+        if dataset_ids is None:
+            continue
+        source_type = SourceDatasetType(source_type_value)
+        catalog = data_catalog[source_type]
+        if not pd.Index(dataset_ids).isin(catalog.index).all():
+            return None
+        source_paths = paths.get(source_type_value)
+        collection[source_type] = DatasetCollection(
+            # Preserve the order of the datasets as the order is used to build the key
+            datasets=select_dataset_files(
+                catalog, dataset_ids, None if source_paths is None else list(source_paths)
+            ),
+            slug_column=get_dataset_adapter(source_type.value).slug_column,
+        )
+    return MetricDataset(collection)
+
+
+def load_plan_candidates(
+    plan: pd.DataFrame,
+    provider_registry: ProviderRegistry,
+    data_catalog: dict[SourceDatasetType, pd.DataFrame],
+    config: Config,
+) -> list[tuple[MetricExecution, MetricExecutionDefinition]]:
+    """
+    Rebuild the candidate metric executions from an execution plan
+
+    Executions are skipped if the metric is no longer available
+    or if the datasets have changed since the plan was created.
+
+    Parameters
+    ----------
+    plan
+        Execution plan
+    provider_registry
+        Registry of the active providers
+    data_catalog
+        Data catalog for each of the source types used in the plan
+    config
+        Configuration instance
+
+    Returns
+    -------
+    :
+        Candidate metric executions and their definitions
+    """
+    providers = {provider.slug: provider for provider in provider_registry.providers}
+
+    candidates = []
+    for row in plan.to_dict(orient="records"):
+        provider_slug, metric_slug, key = row["provider"], row["metric"], row["key"]
+
+        provider = providers.get(provider_slug)
+        if provider is None:
+            logger.warning(f"Provider {provider_slug} is not available, skipping {key}")
+            continue
+        try:
+            metric = provider.get(metric_slug)
+        except KeyError:
+            logger.warning(f"Metric {provider_slug}/{metric_slug} is not available, skipping {key}")
+            continue
+
+        metric_dataset = _load_metric_dataset(row["datasets"], row.get("paths") or {}, data_catalog)
+        if metric_dataset is None or metric_dataset.hash != row["dataset_hash"]:
+            logger.warning(f"The datasets for {key} have changed since the plan was created, skipping")
+            continue
+
+        metric_execution = MetricExecution(provider=provider, metric=metric, metric_dataset=metric_dataset)
+        definition = metric_execution.build_metric_execution_info(output_root=config.paths.scratch)
+        candidates.append((metric_execution, definition))
+    return candidates
+
+
+def plan_metrics(  # noqa: PLR0913
+    db: Database,
+    config: Config | None = None,
+    solver: MetricSolver | None = None,
+    incremental: bool = False,
+    n_jobs: int = 1,
+    profile: SolveProfile | None = None,
+    dataset_slugs: Collection[str] | None = None,
+    provider_slugs: Collection[str] | None = None,
+    metric_slugs: Collection[str] | None = None,
+    diagnostics: SolveDiagnostics | None = None,
+) -> pd.DataFrame:
+    """
+    Create an execution plan for the metrics that require recalculation
+
+    No changes are made to the database and no metric executions are submitted.
+    As the solve isn't completed until the plan is executed,
+    the plan doesn't update the watermark used by incremental solves.
+
+    Parameters
+    ----------
+    db
+        Database instance
+    config
+        Configuration instance. If None, the default configuration is used
+    solver
+        Solver to use. If None, a new solver is built from the database
+    incremental
+        Only solve for the datasets that have been added or updated since the previous solve
+    n_jobs
+        Number of processes used to solve for the candidate metric executions
+    profile
+        If provided, the time spent solving each metric is recorded in this profile
+    dataset_slugs
+        If provided, only plan the metric executions that include one of these datasets
+    provider_slugs
+        If provided, only plan the metrics of these providers
+    metric_slugs
+        If provided, only plan these metrics
+    diagnostics
+        If provided, the groups of datasets rejected by the constraints of each metric are recorded
+
+    Returns
+    -------
+    :
+        The execution plan
+    """
+    if config is None:
+        config = Config.default()
+    if solver is None:
+        solver = build_solver(
+            config,
+            db,
+            incremental=incremental,
+            dataset_slugs=dataset_slugs,
+            provider_slugs=provider_slugs,
+            metric_slugs=metric_slugs,
+        )
+    if profile is not None:
+        solver.profile = profile
+    if diagnostics is not None:
+        solver.diagnostics = diagnostics
+
+    return build_plan(solve_candidates(solver, config, n_jobs=n_jobs))
+
+
+def execute_plan(
+    db: Database,
+    plan: pd.DataFrame,
+    config: Config | None = None,
+    timeout: int = 60,
+) -> None:
+    """
+    Submit the metric executions in an execution plan
+
+    The executions are reconciled against the database before being submitted,
+    so executions which have already been run with the same datasets are skipped.
+
+    Parameters
+    ----------
+    db
+        Database instance
+    plan
+        Execution plan, or a shard of a plan
+    config
+        Configuration instance. If None, the default configuration is used
+    timeout
+        Maximum time to wait for the metric executions to complete in seconds
+
+    Raises
+    ------
+    TimeoutError
+        If the execution isn't completed within the specified timeout
+    """
+    if config is None:
+        config = Config.default()
+
+    source_types: set[Any] = set()
+    for datasets in plan["datasets"]:
+        source_types.update(key for key, value in datasets.items() if value is not None)
+
+    provider_registry = ProviderRegistry.build_from_config(config, db)
+    # Only the columns used by the metrics are needed to rebuild the executions,
+    # the complete metadata is loaded for the executions that are submitted
+    required_columns = get_required_columns(provider_registry)
+    data_catalog = {}
+    for source_type in source_types:
+        adapter = get_dataset_adapter(source_type)
+        columns = required_columns.get(SourceDatasetType(source_type), frozenset())
+        data_catalog[SourceDatasetType(source_type)] = adapter.load_catalog(
+            db, columns=None if columns is None else {*columns, *adapter.file_specific_metadata}
+        )
+    candidates = load_plan_candidates(plan, provider_registry, data_catalog, config)
+    logger.info(f"Loaded {len(candidates)} of {len(plan)} metric executions from the plan")
+
+    executor = config.executor.build(config, db)
+    submit_candidates(db, executor, candidates, load_metadata=True)
+
+    if timeout > 0:
+        executor.join(timeout=timeout)
@@ -0,0 +1,175 @@
+"""
+Profiling of the solver
+
+The profile records where the solver spends its time for each metric,
+along with the number of groups of datasets that are identified and rejected.
+"""
+
+import contextlib
+import time
+from collections.abc import Generator
+from typing import Any
+
+import pandas as pd
+from attrs import define, field
+
+
+@define
+class MetricProfile:
+    """
+    Profile of the solving of a single metric
+    """
+
+    provider: str
+    metric: str
+
+    timings: dict[str, float] = field(factory=dict)
+    """
+    Wall time in seconds spent in each stage of the solve
+
+    The stages are `apply_filters`, `groupby` and the class name of each constraint.
+    """
+
+    n_groups: int = 0
+    """
+    Number of groups of datasets that were checked against the constraints
+    """
+
+    rejected: dict[str, int] = field(factory=dict)
+    """
+    Number of groups rejected by each class of constraint
+    """
+
+    @contextlib.contextmanager
+    def timer(self, stage: str) -> Generator[None, None, None]:
+        """
+        Record the wall time spent in a stage of the solve
+
+        Parameters
+        ----------
+        stage
+            Name of the stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
+
+    def merge(self, other: "MetricProfile") -> None:
+        """
+        Add the measurements from another profile of the same metric
+        """
+        for stage, duration in other.timings.items():
+            self.timings[stage] = self.timings.get(stage, 0.0) + duration
+        for constraint, count in other.rejected.items():
+            self.rejected[constraint] = self.rejected.get(constraint, 0) + count
+        self.n_groups += other.n_groups
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Convert the profile to a JSON-serialisable dictionary
+        """
+        return {
+            "provider": self.provider,
+            "metric": self.metric,
+            "n_groups": self.n_groups,
+            "n_rejected": sum(self.rejected.values()),
+            "timings": dict(self.timings),
+            "rejected": dict(self.rejected),
+        }
+
+
+@contextlib.contextmanager
+def timer(profile: MetricProfile | None, stage: str) -> Generator[None, None, None]:
+    """
+    Record the wall time spent in a stage if profiling is enabled
+
+    Parameters
+    ----------
+    profile
+        Profile to record the time in.
+
+        If None, nothing is recorded.
+    stage
+        Name of the stage
+    """
+    if profile is None:
+        yield
+        return
+    with profile.timer(stage):
+        yield
+
+
+@define
+class SolveProfile:
+    """
+    Profile of a solve across all metrics
+    """
+
+    metrics: dict[tuple[str, str], MetricProfile] = field(factory=dict)
+
+    def get(self, provider: str, metric: str) -> MetricProfile:
+        """
+        Get the profile for a metric, creating it if needed
+
+        Parameters
+        ----------
+        provider
+            Slug of the provider
+        metric
+            Slug of the metric
+
+        Returns
+        -------
+        :
+            The profile of the metric
+        """
+        key = (provider, metric)
+        if key not in self.metrics:
+            self.metrics[key] = MetricProfile(provider=provider, metric=metric)
+        return self.metrics[key]
+
+    def add(self, profile: MetricProfile) -> None:
+        """
+        Add the profile of a metric that was collected elsewhere, e.g. in a worker process
+        """
+        self.get(profile.provider, profile.metric).merge(profile)
+
+    def to_dict(self) -> list[dict[str, Any]]:
+        """
+        Convert the profile to a JSON-serialisable list with an item per metric
+        """
+        return [profile.to_dict() for profile in self.metrics.values()]
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Convert the profile to a DataFrame with a row per metric
+
+        The timings (in seconds) and rejections of each stage are included as separate columns.
+        The metrics are sorted so that the slowest metrics are first.
+
+        Returns
+        -------
+        :
+            Summary of the profile
+        """
+        if not self.metrics:
+            return pd.DataFrame(columns=["provider", "metric", "total_time", "n_groups", "n_rejected"])
+
+        rows = []
+        for profile in self.metrics.values():
+            row: dict[str, Any] = {
+                "provider": profile.provider,
+                "metric": profile.metric,
+                "total_time": sum(profile.timings.values()),
+                "n_groups": profile.n_groups,
+                "n_rejected": sum(profile.rejected.values()),
+            }
+            row.update({f"time.{stage}": duration for stage, duration in profile.timings.items()})
+            row.update({f"rejected.{constraint}": count for constraint, count in profile.rejected.items()})
+            rows.append(row)
+
+        # Stages that weren't used by a metric are missing
+        frame = pd.DataFrame(rows).fillna(0)
+        return frame.sort_values("total_time", ascending=False, kind="stable").reset_index(drop=True)
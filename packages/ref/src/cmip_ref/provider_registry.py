@@ -9,6 +9,11 @@ For remote providers, a proxy is used to access the metadata associated with the
 These metrics cannot be run locally, but can be executed using other executors.
 """
 
+import functools
+import hashlib
+import importlib.metadata
+import json
+
 from attrs import field, frozen
 from loguru import logger
 
@@ -17,6 +22,34 @@ from cmip_ref.database import Database
 from cmip_ref_core.providers import MetricsProvider, import_provider
 
 
+@functools.cache
+def _get_distribution_version(package: str) -> str | None:
+    for distribution in importlib.metadata.packages_distributions().get(package, []):
+        try:
+            return importlib.metadata.version(distribution)
+        except importlib.metadata.PackageNotFoundError:
+            continue
+    return None
+
+
+def get_package_version(obj: object) -> str | None:
+    """
+    Get the version of the installed package which defines the class of an object
+
+    Parameters
+    ----------
+    obj
+        Object to inspect, e.g. a metric
+
+    Returns
+    -------
+    :
+        The version of the distribution that provides the top-level package of the module
+        where the class is defined, or None if the package isn't installed as a distribution
+    """
+    return _get_distribution_version(type(obj).__module__.split(".")[0])
+
+
 def _register_provider(db: Database, provider: MetricsProvider) -> None:
     """
     Register a provider with the database
@@ -94,3 +127,22 @@ class ProviderRegistry:
                 _register_provider(db, provider)
 
         return ProviderRegistry(providers=providers)
+
+    def fingerprint(self) -> str:
+        """
+        Calculate a fingerprint of the providers and metrics in the registry
+
+        The fingerprint changes if a provider or metric is added or removed,
+        or if the version of a provider or of the package which defines a metric changes.
+
+        Returns
+        -------
+        :
+            SHA1 hash of the providers and metrics
+        """
+        metrics = sorted(
+            (provider.slug, provider.version, metric.slug, get_package_version(metric) or "")
+            for provider in self.providers
+            for metric in provider.metrics()
+        )
+        return hashlib.sha1(json.dumps(metrics).encode(), usedforsecurity=False).hexdigest()
@@ -0,0 +1,189 @@
+"""
+Reverse index from facet values to the data requirements of the metrics
+
+The index is used to determine which metrics could use a set of datasets,
+so that a solve for a few datasets can skip the metrics that will never see them.
+"""
+
+from collections.abc import Iterable, Mapping
+
+import numpy as np
+import pandas as pd
+from attrs import define, field
+
+from cmip_ref_core.datasets import SourceDatasetType, is_pattern
+from cmip_ref_core.metrics import DataRequirement, Metric
+from cmip_ref_core.providers import MetricsProvider
+
+
+def get_kept_values(requirement: DataRequirement) -> dict[str, frozenset[str]]:
+    """
+    Get the values of each facet that can be kept by the filters of a requirement
+
+    Parameters
+    ----------
+    requirement
+        Requirement to inspect
+
+    Returns
+    -------
+    :
+        The values that a dataset may have for each facet that the requirement filters on
+
+        Facets that are filtered on multiple times may only have the values that are kept by all the filters.
+        Filters that remove datasets (`keep=False`) are ignored,
+        as are the facets of a filter that are matched using a pattern
+        because the values that they match aren't known until a data catalog is filtered.
+    """
+    kept: dict[str, frozenset[str]] = {}
+    for facet_filter in requirement.filters:
+        if not facet_filter.keep:
+            continue
+        for facet, values in facet_filter.facets.items():
+            if any(is_pattern(value) for value in values):
+                continue
+            literals = frozenset(value for value in values if isinstance(value, str))
+            kept[facet] = kept[facet] & literals if facet in kept else literals
+    return kept
+
+
+@define
+class _SourceTypeIndex:
+    entries: list[int] = field(factory=list)
+    """
+    Positions of the indexed requirements in `RequirementIndex.entries`
+    """
+
+    n_facets: list[int] = field(factory=list)
+    """
+    Number of facets that each requirement filters on
+    """
+
+    postings: dict[str, dict[str, list[int]]] = field(factory=dict)
+    """
+    The requirements (as positions in `entries`) that keep each value of each facet
+    """
+
+
+@define
+class RequirementIndex:
+    """
+    Reverse index from facet values to the data requirements whose filters can match them
+
+    A dataset can only be selected by a requirement if, for every facet that the requirement filters on,
+    the value of the dataset is one of the values kept by the filters.
+    Filters that remove datasets are ignored,
+    so a requirement may be matched even if its filters remove the dataset,
+    but a requirement that can select a dataset is never missed.
+
+    Datasets that are only included in a group by a constraint,
+    e.g. a cell measure added by
+    [AddSupplementaryDataset][cmip_ref_core.constraints.AddSupplementaryDataset], aren't matched.
+    This is consistent with how the solver handles the datasets that have changed since the previous solve.
+    """
+
+    entries: list[tuple[MetricsProvider, Metric, DataRequirement]] = field(factory=list)
+    """
+    The indexed requirements along with their metric and provider
+    """
+
+    _index: dict[SourceDatasetType, _SourceTypeIndex] = field(factory=dict, init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        for position, (_, _, requirement) in enumerate(self.entries):
+            index = self._index.setdefault(requirement.source_type, _SourceTypeIndex())
+            kept = get_kept_values(requirement)
+            for facet, values in kept.items():
+                facet_postings = index.postings.setdefault(facet, {})
+                for value in values:
+                    facet_postings.setdefault(value, []).append(len(index.entries))
+            index.entries.append(position)
+            index.n_facets.append(len(kept))
+
+    @classmethod
+    def build(cls, metrics: Iterable[tuple[MetricsProvider, Metric]]) -> "RequirementIndex":
+        """
+        Index the data requirements of a collection of metrics
+
+        Parameters
+        ----------
+        metrics
+            The metrics to index along with their provider
+
+        Returns
+        -------
+        :
+            A new index
+        """
+        return cls(
+            entries=[
+                (provider, metric, requirement)
+                for provider, metric in metrics
+                for requirement in metric.data_requirements
+            ]
+        )
+
+    def match(self, source_type: SourceDatasetType, datasets: pd.DataFrame) -> list[int]:
+        """
+        Find the requirements whose filters can select at least one of the datasets
+
+        Parameters
+        ----------
+        source_type
+            Source type of the datasets
+        datasets
+            Data catalog of the datasets to match
+
+            Each column contains a facet.
+
+        Returns
+        -------
+        :
+            Sorted positions of the matching requirements in `entries`
+        """
+        index = self._index.get(source_type)
+        if index is None or datasets.empty:
+            return []
+
+        # Only the unique combinations of the indexed facets need to be matched
+        facets = [facet for facet in index.postings if facet in datasets]
+        datasets = datasets[facets].drop_duplicates()
+
+        counts = np.zeros((len(datasets), len(index.entries)), dtype=np.intp)
+        for facet in facets:
+            codes, values = pd.factorize(datasets[facet])
+            for code, value in enumerate(values):
+                requirements = index.postings[facet].get(value)
+                if requirements is not None:
+                    counts[np.ix_(codes == code, requirements)] += 1
+
+        # A requirement filtering on a facet which isn't in the data catalog can't match
+        is_match = (counts == np.asarray(index.n_facets)).any(axis=0)
+        return [index.entries[i] for i in np.flatnonzero(is_match)]
+
+    def match_metrics(
+        self, data_catalog: Mapping[SourceDatasetType, pd.DataFrame]
+    ) -> list[tuple[MetricsProvider, Metric]]:
+        """
+        Find the metrics which have a requirement that can select at least one of the datasets
+
+        Parameters
+        ----------
+        data_catalog
+            Data catalogs of the datasets to match for each source type
+
+        Returns
+        -------
+        :
+            The matching metrics along with their provider,
+            in the same order as they were indexed
+        """
+        positions: set[int] = set()
+        for source_type, datasets in data_catalog.items():
+            positions.update(self.match(source_type, datasets))
+
+        matched: dict[tuple[int, int], tuple[MetricsProvider, Metric]] = {}
+        for position in sorted(positions):
+            provider, metric, _ = self.entries[position]
+            matched.setdefault((id(provider), id(metric)), (provider, metric))
+        return list(matched.values())
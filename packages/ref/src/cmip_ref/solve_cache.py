@@ -0,0 +1,308 @@
+"""
+Persistent cache of the groups of datasets found by the solver
+
+Determining the groups of datasets for a data requirement is the most expensive part of a solve.
+If neither the data catalog nor the requirement have changed since a previous solve,
+the groups from the previous solve are reused.
+"""
+
+import hashlib
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from attrs import define, field
+from loguru import logger
+
+import cmip_ref_core
+from cmip_ref.database import Database
+from cmip_ref.models.solve import SolveCacheEntry
+from cmip_ref.provider_registry import get_package_version
+from cmip_ref_core.metrics import DataRequirement, Metric
+from cmip_ref_core.providers import MetricsProvider
+
+CacheKey = tuple[str, str, str, str]
+"""
+The provider slug, provider version, metric slug and requirement hash of a cached requirement
+"""
+
+
+def requirement_hash(metric: Metric, requirement: DataRequirement) -> str:
+    """
+    Calculate a stable hash of the definition of a data requirement of a metric
+
+    The hash is calculated from the representation of the requirement,
+    the version of `cmip_ref_core`, which implements the filters and built-in constraints,
+    and the versions of the packages which define the metric and its constraints.
+    A metric package can change how its constraints behave without changing their representation,
+    so upgrading the package invalidates the cached groups.
+    Constraints that don't have a stable representation (e.g. one which includes a memory address)
+    produce a different hash in each process, so their groups are never reused.
+
+    Parameters
+    ----------
+    metric
+        Metric which defines the requirement
+    requirement
+        Requirement to hash
+
+    Returns
+    -------
+    :
+        SHA1 hash of the requirement
+    """
+    package_versions = sorted(
+        {
+            f"{type(obj).__module__.split('.')[0]}=={get_package_version(obj)}"
+            for obj in (metric, *requirement.constraints)
+        }
+    )
+    definition = f"{cmip_ref_core.__version__}:{package_versions!r}:{requirement!r}"
+    return hashlib.sha1(definition.encode(), usedforsecurity=False).hexdigest()
+
+
+def catalog_fingerprint(data_catalog: pd.DataFrame) -> str:
+    """
+    Calculate a fingerprint of the contents of a data catalog
+
+    The fingerprint changes if any value, the index, the columns or the order of the rows change.
+
+    Parameters
+    ----------
+    data_catalog
+        Data catalog to fingerprint
+
+    Returns
+    -------
+    :
+        SHA1 hash of the data catalog
+    """
+    digest = hashlib.sha1(usedforsecurity=False)
+    digest.update(repr(list(data_catalog.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(data_catalog, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def get_cache_key(provider: MetricsProvider, metric: Metric, requirement: DataRequirement) -> CacheKey:
+    """
+    Get the key of a data requirement of a metric in the cache
+    """
+    return provider.slug, provider.version, metric.slug, requirement_hash(metric, requirement)
+
+
+@define
+class CachedGroups:
+    """
+    The groups of datasets for a requirement, along with the data catalog they were solved against
+    """
+
+    catalog_fingerprint: str
+    groups: list[list[int]]
+    """
+    The dataset id of each run of consecutive rows in each group
+    """
+
+
+def _encode_group(group: pd.DataFrame, dataset_rows: dict[Any, np.ndarray[Any, Any]]) -> list[int] | None:
+    """
+    Encode a group as the dataset ids of its runs of consecutive rows
+
+    Returns None if the group can't be rebuilt from the ids,
+    which is the case if a run doesn't contain all the rows of the dataset in the data catalog.
+    """
+    index = group.index.to_numpy()
+    if len(index) == 0:
+        return []
+    run_starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    run_lengths = np.diff(np.r_[run_starts, len(index)])
+
+    dataset_ids = index[run_starts]
+    for dataset_id, run_length in zip(dataset_ids, run_lengths):
+        rows = dataset_rows.get(dataset_id)
+        if rows is None or len(rows) != run_length:
+            return None
+    return [int(dataset_id) for dataset_id in dataset_ids]
+
+
+@define
+class SolveCache:
+    """
+    Cache of the groups of datasets for each data requirement of each metric
+
+    The groups are stored as dataset ids, which are only valid for the data catalog that was solved against.
+    A cached requirement is only reused if the fingerprint of the current data catalog is the same.
+
+    The cache is loaded from the database before a solve using [load][cmip_ref.solve_cache.SolveCache.load]
+    and the new or updated entries are written back using [save][cmip_ref.solve_cache.SolveCache.save].
+    """
+
+    entries: dict[CacheKey, CachedGroups] = field(factory=dict)
+    updated: set[CacheKey] = field(factory=set)
+    """
+    Keys of the entries which have been added or updated since the cache was loaded
+    """
+
+    _dataset_rows: dict[str, dict[Any, np.ndarray[Any, Any]]] = field(factory=dict, init=False, repr=False)
+    """
+    Positions of the rows of each dataset in the data catalog with a given fingerprint
+    """
+
+    @classmethod
+    def load(cls, db: Database) -> "SolveCache":
+        """
+        Load the cache from the database
+
+        Parameters
+        ----------
+        db
+            Database instance
+
+        Returns
+        -------
+        :
+            The cached groups of all the requirements
+        """
+        entries = {
+            (entry.provider_slug, entry.provider_version, entry.metric_slug, entry.requirement_hash): (
+                CachedGroups(catalog_fingerprint=entry.catalog_fingerprint, groups=entry.groups)
+            )
+            for entry in db.session.query(SolveCacheEntry)
+        }
+        logger.debug(f"Loaded {len(entries)} cached requirements")
+        return cls(entries=entries)
+
+    def save(self, db: Database) -> None:
+        """
+        Write the entries which have been added or updated to the database
+
+        Parameters
+        ----------
+        db
+            Database instance
+        """
+        if not self.updated:
+            return
+
+        existing = {
+            (entry.provider_slug, entry.provider_version, entry.metric_slug, entry.requirement_hash): entry
+            for entry in db.session.query(SolveCacheEntry)
+        }
+        for key in sorted(self.updated):
+            cached = self.entries[key]
+            entry = existing.get(key)
+            if entry is None:
+                provider_slug, provider_version, metric_slug, requirement_hash_ = key
+                entry = SolveCacheEntry(
+                    provider_slug=provider_slug,
+                    provider_version=provider_version,
+                    metric_slug=metric_slug,
+                    requirement_hash=requirement_hash_,
+                )
+                db.session.add(entry)
+            entry.catalog_fingerprint = cached.catalog_fingerprint
+            entry.groups = cached.groups
+        db.session.flush()
+        logger.debug(f"Saved {len(self.updated)} cached requirements")
+        self.updated.clear()
+
+    def _get_dataset_rows(
+        self, data_catalog: pd.DataFrame, fingerprint: str
+    ) -> dict[Any, np.ndarray[Any, Any]]:
+        if fingerprint not in self._dataset_rows:
+            self._dataset_rows[fingerprint] = {
+                dataset_id: np.asarray(rows)
+                for dataset_id, rows in data_catalog.groupby(level=0, sort=False).indices.items()
+            }
+        return self._dataset_rows[fingerprint]
+
+    def get(self, key: CacheKey, data_catalog: pd.DataFrame, fingerprint: str) -> list[pd.DataFrame] | None:
+        """
+        Get the cached groups of datasets for a requirement
+
+        Parameters
+        ----------
+        key
+            Key of the requirement
+        data_catalog
+            Data catalog of the datasets for the requirement's source type
+        fingerprint
+            Fingerprint of `data_catalog`
+
+        Returns
+        -------
+        :
+            The groups of datasets or None if the requirement hasn't been solved against the data catalog
+        """
+        cached = self.entries.get(key)
+        if cached is None or cached.catalog_fingerprint != fingerprint:
+            return None
+
+        dataset_rows = self._get_dataset_rows(data_catalog, fingerprint)
+        groups = []
+        for group in cached.groups:
+            positions: np.ndarray[Any, np.dtype[np.intp]] = (
+                np.concatenate([dataset_rows[dataset_id] for dataset_id in group])
+                if group
+                else np.empty(0, dtype=np.intp)
+            )
+            groups.append(data_catalog.iloc[positions])
+        return groups
+
+    def put(
+        self, key: CacheKey, data_catalog: pd.DataFrame, fingerprint: str, groups: list[pd.DataFrame]
+    ) -> None:
+        """
+        Store the groups of datasets for a requirement
+
+        The requirement isn't cached if the groups can't be rebuilt from the data catalog,
+        e.g. if a group only contains some of the rows of a dataset.
+
+        Parameters
+        ----------
+        key
+            Key of the requirement
+        data_catalog
+            Data catalog that the groups were found in
+        fingerprint
+            Fingerprint of `data_catalog`
+        groups
+            The groups of datasets for the requirement
+        """
+        dataset_rows = self._get_dataset_rows(data_catalog, fingerprint)
+        encoded = []
+        for group in groups:
+            encoded_group = _encode_group(group, dataset_rows)
+            if encoded_group is None:
+                logger.debug(f"Unable to cache the groups for {key}")
+                return
+            encoded.append(encoded_group)
+
+        self.entries[key] = CachedGroups(catalog_fingerprint=fingerprint, groups=encoded)
+        self.updated.add(key)
+
+    def pop_updates(self) -> dict[CacheKey, CachedGroups]:
+        """
+        Remove the record of the added or updated entries
+
+        This is used to send the entries created by a worker process back to the parent process.
+
+        Returns
+        -------
+        :
+            The entries which have been added or updated
+        """
+        updates = {key: self.entries[key] for key in self.updated}
+        self.updated.clear()
+        return updates
+
+    def merge(self, updates: dict[CacheKey, CachedGroups]) -> None:
+        """
+        Add entries that were created by another cache, e.g. in a worker process
+
+        Parameters
+        ----------
+        updates
+            The entries to add
+        """
+        self.entries.update(updates)
+        self.updated.update(updates)
@@ -6,26 +6,56 @@ This module provides a solver to determine which metrics need to be calculated.
 This module is still a work in progress and is not yet fully implemented.
 """
 
+import datetime
 import itertools
+import multiprocessing
 import pathlib
+import queue
+import threading
 import typing
+from collections.abc import Collection, Sequence
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import pandas as pd
-from attrs import define, frozen
+from attrs import define, evolve, field, frozen
 from loguru import logger
+from sqlalchemy import insert
 
 from cmip_ref.config import Config
 from cmip_ref.database import Database
 from cmip_ref.datasets import get_dataset_adapter
-from cmip_ref.datasets.cmip6 import CMIP6DatasetAdapter
+from cmip_ref.datasets.base import encode_categorical
+from cmip_ref.diagnostics import MetricDiagnostics, SolveDiagnostics
+from cmip_ref.models import Dataset as DatasetModel
 from cmip_ref.models import Metric as MetricModel
 from cmip_ref.models import MetricExecution as MetricExecutionModel
 from cmip_ref.models import Provider as ProviderModel
-from cmip_ref.models.metric_execution import MetricExecutionResult
+from cmip_ref.models import SolveWatermark
+from cmip_ref.models.metric_execution import (
+    MetricExecutionResult,
+    execution_should_run,
+    get_execution_states,
+    metric_datasets,
+)
+from cmip_ref.models.solve import get_latest_watermark, get_transaction_timestamp
+from cmip_ref.profiling import MetricProfile, SolveProfile, timer
 from cmip_ref.provider_registry import ProviderRegistry
-from cmip_ref_core.constraints import apply_constraint
-from cmip_ref_core.datasets import DatasetCollection, MetricDataset, SourceDatasetType
-from cmip_ref_core.exceptions import InvalidMetricException
+from cmip_ref.requirement_index import RequirementIndex
+from cmip_ref.solve_cache import CachedGroups, CacheKey, SolveCache, catalog_fingerprint, get_cache_key
+from cmip_ref_core.constraints import (
+    GroupConstraint,
+    adds_datasets,
+    apply_operation_to_groups,
+    check_constraint,
+    explain_rejection,
+    order_constraints,
+    supports_batch_application,
+    supports_batch_validation,
+)
+from cmip_ref_core.datasets import DatasetCollection, FacetFilterCache, MetricDataset, SourceDatasetType
+from cmip_ref_core.exceptions import ConstraintNotSatisfied, InvalidMetricException
+from cmip_ref_core.executor import Executor
 from cmip_ref_core.metrics import DataRequirement, Metric, MetricExecutionDefinition
 from cmip_ref_core.providers import MetricsProvider
 
@@ -68,47 +98,321 @@ class MetricExecution:
         )
 
 
-def extract_covered_datasets(data_catalog: pd.DataFrame, requirement: DataRequirement) -> list[pd.DataFrame]:
+def extract_covered_datasets(  # noqa: PLR0913
+    data_catalog: pd.DataFrame,
+    requirement: DataRequirement,
+    changed_datasets: Collection[int] | None = None,
+    filter_cache: FacetFilterCache | None = None,
+    profile: MetricProfile | None = None,
+    diagnostics: MetricDiagnostics | None = None,
+) -> list[pd.DataFrame]:
     """
     Determine the different metric executions that should be performed with the current data catalog
+
+    Parameters
+    ----------
+    data_catalog
+        Data catalog of the datasets for the requirement's source type
+    requirement
+        The requirement to extract the groups for
+    changed_datasets
+        Ids of the datasets that have been added or updated since the previous solve
+
+        If provided, only the groups that contain at least one of these datasets are returned.
+        Groups that don't contain a changed dataset aren't processed at all.
+        If None (default), all groups are returned.
+    filter_cache
+        Cache of the filter masks for `data_catalog`
+
+        If None (default), a new cache is created for this requirement.
+    profile
+        If provided, the time spent in each stage and the number of rejected groups are recorded
+    diagnostics
+        If provided, the groups that are rejected by each constraint are recorded
+
+    Returns
+    -------
+    :
+        The groups of datasets that satisfy the requirement
     """
     if len(data_catalog) == 0:
         logger.error(f"No datasets found in the data catalog: {requirement.source_type.value}")
         return []
 
-    subset = requirement.apply_filters(data_catalog)
+    if filter_cache is None:
+        filter_cache = FacetFilterCache(data_catalog)
+
+    with timer(profile, "apply_filters"):
+        subset = requirement.apply_filters(data_catalog, filter_cache)
+
+    if changed_datasets is not None:
+        subset = _select_changed_groups(subset, requirement, changed_datasets)
 
     if len(subset) == 0:
         logger.debug(f"No datasets found for requirement {requirement}")
         return []
 
+    # Cheap validators are applied first if this doesn't change the result
+    constraints = order_constraints(requirement.constraints or ())
     if requirement.group_by is None:
         # Use a single group
-        groups = [(None, subset)]
+        groups = [subset]
     else:
-        groups = subset.groupby(list(requirement.group_by))  # type: ignore
+        # The leading validators are applied to all the groups at once
+        n_batched = len(list(itertools.takewhile(supports_batch_validation, constraints)))
+        subset = _validate_groups(
+            subset, requirement, constraints[:n_batched], profile=profile, diagnostics=diagnostics
+        )
+        constraints = constraints[n_batched:]
+        if len(subset) == 0:
+            logger.debug(f"No groups satisfy the constraints of requirement {requirement}")
+            return []
+
+        with timer(profile, "groupby"):
+            groups = [group for _, group in subset.groupby(list(requirement.group_by), observed=True)]
+
+    if profile is not None:
+        profile.n_groups += len(groups)
+
+    # Each constraint is applied to all the remaining groups before moving on to the next constraint,
+    # so operations which support it can update all the groups at once
+    for constraint in constraints:
+        groups = _apply_constraint(
+            data_catalog,
+            requirement,
+            groups,
+            constraint,
+            filter_cache,
+            profile=profile,
+            diagnostics=diagnostics,
+        )
+
+    return groups
+
+
+def _select_changed_groups(
+    subset: pd.DataFrame, requirement: DataRequirement, changed_datasets: Collection[int]
+) -> pd.DataFrame:
+    """
+    Reduce a filtered data catalog to the groups which contain a changed dataset
+
+    The group_by values of the changed datasets are used to select all the rows
+    (including unchanged datasets) that belong to the same groups.
+    """
+    is_changed = subset.index.isin(changed_datasets)
+    if not is_changed.any():
+        return subset.iloc[0:0]
+
+    if requirement.group_by is None:
+        # Everything is in a single group
+        return subset
+
+    group_by = list(requirement.group_by)
+    changed_keys = pd.MultiIndex.from_frame(subset.loc[is_changed, group_by].drop_duplicates())
+    return subset[pd.MultiIndex.from_frame(subset[group_by]).isin(changed_keys)]
+
+
+def _validate_groups(
+    subset: pd.DataFrame,
+    requirement: DataRequirement,
+    validators: Sequence[GroupConstraint],
+    *,
+    profile: MetricProfile | None = None,
+    diagnostics: MetricDiagnostics | None = None,
+) -> pd.DataFrame:
+    """
+    Remove the groups that don't satisfy the validators
+
+    Each validator is applied to all the remaining groups at once using its `validate_groups` method,
+    which gives the same result as validating each group in turn.
+    """
+    if not validators:
+        return subset
+
+    group_by = list(requirement.group_by or ())
+    grouped = subset.groupby(group_by, observed=True)
+    keys = grouped.size().index
+    # Rows with a missing group_by value are not part of any group and have a code of -1
+    codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.intp)
+    is_valid = np.ones(len(keys) + 1, dtype=bool)
+    is_valid[-1] = False
+
+    for validator in validators:
+        validator_name = type(validator).__name__
+        remaining = is_valid[codes]
+        with timer(profile, validator_name):
+            valid = validator.validate_groups(subset[remaining], group_by)  # type: ignore[union-attr]
+        # Groups that have already been rejected are missing from the result
+        rejected = is_valid[:-1] & ~valid.reindex(keys, fill_value=False).to_numpy(dtype=bool)
+        if profile is not None:
+            # The rejected groups are not processed any further, so they are counted here
+            profile.n_groups += int(rejected.sum())
+            profile.rejected[validator_name] = profile.rejected.get(validator_name, 0) + int(rejected.sum())
+        if diagnostics is not None and rejected.any():
+            # The rows of each group are contiguous when ordered by their code,
+            # with the rows that aren't part of any group first
+            order = np.argsort(codes, kind="stable")
+            offsets = np.r_[0, np.cumsum(np.bincount(codes + 1, minlength=len(keys) + 1))]
+            for position in np.flatnonzero(rejected):
+                key = keys[position]
+                group = subset.iloc[order[offsets[position + 1] : offsets[position + 2]]]
+                diagnostics.reject(
+                    requirement.source_type.value,
+                    validator,
+                    dict(zip(group_by, key if isinstance(key, tuple) else (key,))),
+                    len(group),
+                    explain_rejection(validator, group),
+                )
+        is_valid[:-1] &= ~rejected
+
+    return subset.iloc[np.flatnonzero(is_valid[codes])]
+
+
+def _apply_constraint(  # noqa: PLR0913
+    data_catalog: pd.DataFrame,
+    requirement: DataRequirement,
+    groups: list[pd.DataFrame],
+    constraint: GroupConstraint,
+    filter_cache: FacetFilterCache | None = None,
+    *,
+    profile: MetricProfile | None = None,
+    diagnostics: MetricDiagnostics | None = None,
+) -> list[pd.DataFrame]:
+    """
+    Apply a constraint to each of the groups
+
+    Operations which provide an `apply_groups` method are applied to all the groups at once,
+    which gives the same result as applying the operation to each group in turn.
+
+    Returns the updated groups which satisfy the constraint
+    """
+    constraint_name = type(constraint).__name__
+    with timer(profile, constraint_name):
+        if supports_batch_application(constraint):
+            updated = apply_operation_to_groups(
+                groups,
+                constraint,  # type: ignore[arg-type]
+                data_catalog,
+                filter_cache,
+            )
+        else:
+            updated = [
+                check_constraint(
+                    group, constraint, data_catalog, filter_cache, explain=diagnostics is not None
+                )
+                for group in groups
+            ]
+
+    constrained_groups = [group for group in updated if not isinstance(group, ConstraintNotSatisfied)]
+    n_rejected = len(groups) - len(constrained_groups)
+    if profile is not None and n_rejected:
+        profile.rejected[constraint_name] = profile.rejected.get(constraint_name, 0) + n_rejected
+    if diagnostics is not None and n_rejected:
+        group_by = requirement.group_by or ()
+        for group, updated_group in zip(groups, updated):
+            if isinstance(updated_group, ConstraintNotSatisfied):
+                diagnostics.reject(
+                    requirement.source_type.value,
+                    constraint,
+                    {facet: group[facet].iloc[0] for facet in group_by},
+                    len(group),
+                    str(updated_group),
+                )
+    return constrained_groups
 
-    results = []
 
-    for name, group in groups:
-        constrained_group = _process_group_constraints(data_catalog, group, requirement)
+_JoinKey = tuple[frozenset[typing.Any], ...]
 
-        if constrained_group is not None:
-            results.append(constrained_group)
 
-    return results
+def _join_key(group: pd.DataFrame, facets: typing.Iterable[str]) -> _JoinKey:
+    return tuple(frozenset(group[facet].unique()) for facet in facets)
 
 
-def _process_group_constraints(
-    data_catalog: pd.DataFrame, group: pd.DataFrame, requirement: DataRequirement
-) -> pd.DataFrame | None:
-    for constraint in requirement.constraints or []:
-        constrained_group = apply_constraint(group, constraint, data_catalog)
-        if constrained_group is None:
-            return None
+def join_dataset_groups(
+    requirements: Sequence[DataRequirement], dataset_groups: Sequence[list[pd.DataFrame]]
+) -> typing.Generator[tuple[pd.DataFrame, ...], None, None]:
+    """
+    Combine the groups of datasets from each requirement of a metric
+
+    The groups are combined using a hash join on the
+    [join_facets][cmip_ref_core.metrics.DataRequirement.join_facets] of the requirements,
+    so only the combinations where the shared join facets have the same values are generated.
+    If no join facets are declared, this is equivalent to taking the product of the groups.
+
+    Parameters
+    ----------
+    requirements
+        The requirements of a metric
+    dataset_groups
+        The groups of datasets for each requirement
+
+    Yields
+    ------
+    :
+        A group of datasets for each requirement
+
+        The combinations are yielded in the same order as `itertools.product`.
+    """
+    # Each partial combination is stored with the values of the join facets that have been bound so far
+    combinations: list[tuple[tuple[pd.DataFrame, ...], dict[str, frozenset[typing.Any]]]] = [((), {})]
+    bound_facets: list[str] = []
+
+    for requirement, groups in zip(requirements, dataset_groups):
+        shared_facets = [facet for facet in requirement.join_facets if facet in bound_facets]
+        new_facets = [facet for facet in requirement.join_facets if facet not in bound_facets]
+
+        buckets: dict[_JoinKey, list[tuple[pd.DataFrame, dict[str, frozenset[typing.Any]]]]] = {}
+        for group in groups:
+            buckets.setdefault(_join_key(group, shared_facets), []).append(
+                (group, dict(zip(new_facets, _join_key(group, new_facets))))
+            )
 
-        group = constrained_group
-    return group
+        combinations = [
+            ((*items, group), {**values, **group_values})
+            for items, values in combinations
+            for group, group_values in buckets.get(tuple(values[facet] for facet in shared_facets), [])
+        ]
+        bound_facets.extend(new_facets)
+
+    for items, _ in combinations:
+        yield items
+
+
+def solves_changed_datasets(metric: Metric) -> bool:
+    """
+    Check if the executions of a metric which include a changed dataset can be solved for in isolation
+
+    This isn't possible if a constraint of the metric may add datasets from the data catalog to a group,
+    e.g. [AddSupplementaryDataset][cmip_ref_core.constraints.AddSupplementaryDataset],
+    as a changed dataset may then be added to a group that doesn't otherwise include any changed datasets.
+
+    Parameters
+    ----------
+    metric
+        Metric to inspect
+
+    Returns
+    -------
+    :
+        False if any of the constraints of the metric may add datasets to a group
+    """
+    return not any(
+        adds_datasets(constraint)
+        for requirement in metric.data_requirements
+        for constraint in requirement.constraints
+    )
+
+
+def _combine_groups(groups: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Combine the groups selected by requirements that share a source type
+
+    Files that are selected by more than one of the requirements are only included once.
+    """
+    if len(groups) == 1:
+        return groups[0]
+    combined = pd.concat(groups)
+    return combined[~combined.reset_index().duplicated().to_numpy()]
 
 
 @define
@@ -119,30 +423,208 @@ class MetricSolver:
 
     provider_registry: ProviderRegistry
     data_catalog: dict[SourceDatasetType, pd.DataFrame]
+    changed_datasets: Collection[int] | None = None
+    """
+    Ids of the datasets that have been added or updated since the previous solve
+
+    If set, only the metric executions that include at least one of these datasets are solved for.
+    If None, all possible metric executions are solved for.
+
+    All the executions of the metrics that may add datasets to a group using a constraint
+    are solved for regardless (see [solves_changed_datasets][cmip_ref.solver.solves_changed_datasets]).
+    """
+    profile: SolveProfile | None = None
+    """
+    If set, the time spent solving each metric is recorded in this profile
+    """
+    diagnostics: SolveDiagnostics | None = None
+    """
+    If set, the groups of datasets rejected by the constraints of each metric are recorded
+    """
+    projected: bool = False
+    """
+    Whether the data catalogs only contain the columns that are used by the data requirements
+
+    If True, the complete metadata of the datasets must be loaded before a metric execution is run.
+    """
+    provider_slugs: Collection[str] | None = None
+    """
+    Slugs of the providers to solve for
+
+    If None, the metrics of all providers are solved for.
+    """
+    metric_slugs: Collection[str] | None = None
+    """
+    Slugs of the metrics to solve for
+
+    If None, all metrics are solved for.
+    """
+    solve_cache: SolveCache | None = None
+    """
+    If set, the groups of datasets for each requirement are reused from previous solves
+    against the same data catalog, and the newly solved requirements are added to the cache
+
+    The cache isn't used when only solving for the changed datasets.
+    """
+    _filter_caches: dict[SourceDatasetType, FacetFilterCache] = field(factory=dict, init=False, repr=False)
+    _fingerprints: dict[SourceDatasetType, tuple[pd.DataFrame, str]] = field(
+        factory=dict, init=False, repr=False
+    )
 
     @staticmethod
-    def build_from_db(config: Config, db: Database) -> "MetricSolver":
+    def build_from_db(  # noqa: PLR0913
+        config: Config,
+        db: Database,
+        changed_since: datetime.datetime | None = None,
+        dataset_slugs: Collection[str] | None = None,
+        provider_slugs: Collection[str] | None = None,
+        metric_slugs: Collection[str] | None = None,
+        provider_registry: ProviderRegistry | None = None,
+    ) -> "MetricSolver":
         """
         Initialise the solver using information from the database
 
         Parameters
         ----------
+        config
+            Configuration instance
         db
             Database instance
+        changed_since
+            If provided, only solve for the datasets which have been added or updated
+            at, or after, this time.
+        dataset_slugs
+            If provided, only solve for these datasets, e.g. the instance_id of a CMIP6 dataset
+
+            If `changed_since` is also provided,
+            the datasets that have changed since then are solved for as well.
+        provider_slugs
+            If provided, only solve for the metrics of these providers
+        metric_slugs
+            If provided, only solve for these metrics
+        provider_registry
+            Registry of the active providers.
+            If None, the registry is built from the configuration
+
+        Raises
+        ------
+        ValueError
+            A dataset, provider or metric could not be found
 
         Returns
         -------
         :
             A new MetricSolver instance
         """
+        changed_datasets = None
+        if changed_since is not None:
+            # Datasets updated in the same second as the watermark are included,
+            # as the timestamps may not have sub-second resolution
+            changed_datasets = {
+                dataset_id
+                for (dataset_id,) in db.session.query(DatasetModel.id).filter(
+                    DatasetModel.updated_at >= changed_since
+                )
+            }
+            logger.info(f"Found {len(changed_datasets)} datasets that changed since {changed_since}")
+        if dataset_slugs is not None:
+            changed_datasets = (changed_datasets or set()) | _get_dataset_ids(db, dataset_slugs)
+
+        if provider_registry is None:
+            provider_registry = ProviderRegistry.build_from_config(config, db)
+
+        # Only the columns used by the selected metrics are loaded, and only for the source types they use
+        data_catalog = {}
+        for source_type, columns in get_required_columns(
+            provider_registry, provider_slugs=provider_slugs, metric_slugs=metric_slugs
+        ).items():
+            try:
+                adapter = get_dataset_adapter(source_type.value)
+            except ValueError:
+                logger.warning(f"Unable to load the data catalog for source type {source_type.value}")
+                continue
+            data_catalog[source_type] = adapter.load_catalog(
+                db, columns=None if columns is None else {*columns, *adapter.file_specific_metadata}
+            )
+
         return MetricSolver(
-            provider_registry=ProviderRegistry.build_from_config(config, db),
-            data_catalog={
-                SourceDatasetType.CMIP6: CMIP6DatasetAdapter().load_catalog(db),
-            },
+            provider_registry=provider_registry,
+            data_catalog=data_catalog,
+            changed_datasets=changed_datasets,
+            projected=True,
+            provider_slugs=provider_slugs,
+            metric_slugs=metric_slugs,
         )
 
-    def solve(self) -> typing.Generator[MetricExecution, None, None]:
+    def select_metrics(self) -> list[tuple[MetricsProvider, Metric]]:
+        """
+        Get the metrics to solve for
+
+        If only the changed datasets are solved for,
+        the metrics which can't use any of the changed datasets are skipped
+        (see [RequirementIndex][cmip_ref.requirement_index.RequirementIndex]),
+        unless they may add datasets to a group using a constraint.
+
+        Raises
+        ------
+        ValueError
+            A provider or metric could not be found
+
+        Returns
+        -------
+        :
+            The metrics along with their provider
+        """
+        metrics = select_metrics(self.provider_registry, self.provider_slugs, self.metric_slugs)
+        if self.changed_datasets is None:
+            return metrics
+
+        changed_datasets = {
+            source_type: data_catalog[data_catalog.index.isin(self.changed_datasets)]
+            for source_type, data_catalog in self.data_catalog.items()
+        }
+        matched_metrics = {
+            id(metric) for _, metric in RequirementIndex.build(metrics).match_metrics(changed_datasets)
+        }
+        matched = [
+            (provider, metric)
+            for provider, metric in metrics
+            if id(metric) in matched_metrics or not solves_changed_datasets(metric)
+        ]
+        if len(matched) < len(metrics):
+            logger.info(f"Skipping {len(metrics) - len(matched)} metrics that can't use the changed datasets")
+        return matched
+
+    def update_datasets(self, source_type: SourceDatasetType, datasets: pd.DataFrame) -> None:
+        """
+        Add new datasets to a data catalog, or replace existing ones
+
+        All the rows of the datasets in `datasets` replace the existing rows for those datasets.
+        The filter cache for the data catalog is rebuilt when it is next used.
+
+        Parameters
+        ----------
+        source_type
+            Source type of the datasets
+        datasets
+            Data catalog of the added or updated datasets, indexed by the dataset id
+
+            The data catalog must contain at least the same columns as the existing data catalog.
+        """
+        data_catalog = self.data_catalog.get(source_type)
+        if data_catalog is None:
+            self.data_catalog[source_type] = datasets
+            return
+
+        unchanged = data_catalog[~data_catalog.index.isin(datasets.index)]
+        updated = pd.concat([unchanged, datasets[data_catalog.columns]])
+        for column in data_catalog.columns:
+            # Concatenating categorical columns with different categories gives an object column
+            if isinstance(data_catalog[column].dtype, pd.CategoricalDtype):
+                updated[column] = encode_categorical(updated[column].astype(object))
+        self.data_catalog[source_type] = updated
+
+    def solve(self, n_jobs: int = 1) -> typing.Generator[MetricExecution, None, None]:
         """
         Solve which metrics need to be calculated for a dataset
 
@@ -151,14 +633,122 @@ class MetricSolver:
         After each iteration we check if there are any more metrics to solve.
         This may not be the most efficient way to solve the metrics, but it's a start.
 
+        Parameters
+        ----------
+        n_jobs
+            Number of processes used to solve the metrics in parallel
+
+            Each metric is solved independently in a worker process.
+            The metric executions are yielded in the same order as a serial solve.
+
         Yields
         ------
         MetricExecution
             A class containing the information related to the execution of a metric
         """
-        for provider in self.provider_registry.providers:
-            for metric in provider.metrics():
-                yield from self.solve_metric_executions(metric, provider)
+        if n_jobs > 1:
+            yield from self._solve_parallel(n_jobs)
+            return
+
+        for provider, metric in self.select_metrics():
+            yield from self.solve_metric_executions(metric, provider)
+
+    def _solve_parallel(self, n_jobs: int) -> typing.Generator[MetricExecution, None, None]:
+        tasks = self.select_metrics()
+        provider_indices = {id(provider): i for i, provider in enumerate(self.provider_registry.providers)}
+
+        # Forked workers inherit the solver, including the data catalogs, without any serialisation.
+        # Otherwise the solver is pickled once per worker rather than once per task.
+        start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_initialise_worker,
+            initargs=(self,),
+        ) as pool:
+            # map returns the results in the order of the tasks as they become available
+            solved = pool.map(
+                _solve_metric_datasets,
+                [provider_indices[id(provider)] for provider, _ in tasks],
+                [metric.slug for _, metric in tasks],
+            )
+            for (provider, metric), (
+                metric_datasets,
+                metric_profile,
+                metric_diagnostics,
+                cache_updates,
+            ) in zip(tasks, solved):
+                if self.profile is not None and metric_profile is not None:
+                    self.profile.add(metric_profile)
+                if self.diagnostics is not None and metric_diagnostics is not None:
+                    self.diagnostics.add(metric_diagnostics)
+                if self.solve_cache is not None and cache_updates:
+                    self.solve_cache.merge(cache_updates)
+                for metric_dataset in metric_datasets:
+                    yield MetricExecution(provider=provider, metric=metric, metric_dataset=metric_dataset)
+
+    def _get_filter_cache(self, source_type: SourceDatasetType) -> FacetFilterCache:
+        """
+        Get the filter cache for a data catalog
+
+        The cache is shared between the metrics so that common filters are only evaluated once.
+        A new cache is created if the data catalog has been replaced.
+        """
+        data_catalog = self.data_catalog[source_type]
+        filter_cache = self._filter_caches.get(source_type)
+        if filter_cache is None or filter_cache.data_catalog is not data_catalog:
+            filter_cache = FacetFilterCache(data_catalog)
+            self._filter_caches[source_type] = filter_cache
+        return filter_cache
+
+    def _get_fingerprint(self, source_type: SourceDatasetType) -> str:
+        """
+        Get the fingerprint of a data catalog
+
+        The fingerprint is recalculated if the data catalog has been replaced.
+        """
+        data_catalog = self.data_catalog[source_type]
+        cached = self._fingerprints.get(source_type)
+        if cached is None or cached[0] is not data_catalog:
+            cached = (data_catalog, catalog_fingerprint(data_catalog))
+            self._fingerprints[source_type] = cached
+        return cached[1]
+
+    def _extract_covered_datasets(  # noqa: PLR0913
+        self,
+        provider: MetricsProvider,
+        metric: Metric,
+        requirement: DataRequirement,
+        changed_datasets: Collection[int] | None,
+        profile: MetricProfile | None,
+        diagnostics: MetricDiagnostics | None,
+    ) -> list[pd.DataFrame]:
+        """
+        Extract the groups of datasets for a requirement, reusing the cached groups if possible
+        """
+        data_catalog = self.data_catalog[requirement.source_type]
+        filter_cache = self._get_filter_cache(requirement.source_type)
+        if self.solve_cache is None or changed_datasets is not None:
+            return extract_covered_datasets(
+                data_catalog,
+                requirement,
+                changed_datasets,
+                filter_cache=filter_cache,
+                profile=profile,
+                diagnostics=diagnostics,
+            )
+
+        key = get_cache_key(provider, metric, requirement)
+        with timer(profile, "solve_cache"):
+            fingerprint = self._get_fingerprint(requirement.source_type)
+            groups = self.solve_cache.get(key, data_catalog, fingerprint)
+        if groups is None:
+            groups = extract_covered_datasets(
+                data_catalog, requirement, filter_cache=filter_cache, profile=profile, diagnostics=diagnostics
+            )
+            with timer(profile, "solve_cache"):
+                self.solve_cache.put(key, data_catalog, fingerprint, groups)
+        return groups
 
     def solve_metric_executions(
         self, metric: Metric, provider: MetricsProvider
@@ -179,8 +769,17 @@ class MetricSolver:
             A generator that yields the metric executions that need to be performed
 
         """
+        profile = self.profile.get(provider.slug, metric.slug) if self.profile is not None else None
+        diagnostics = (
+            self.diagnostics.get(provider.slug, metric.slug) if self.diagnostics is not None else None
+        )
+
+        changed_datasets = self.changed_datasets if solves_changed_datasets(metric) else None
+
         # Collect up the different data groups that can be used to calculate the metric
-        dataset_groups = {}
+        # The groups are stored in the same order as the requirements,
+        # as several requirements may share a source type
+        dataset_groups: list[list[pd.DataFrame]] = []
 
         for requirement in metric.data_requirements:
             if requirement.source_type not in self.data_catalog:
@@ -188,32 +787,683 @@ class MetricSolver:
                     metric, f"No data catalog for source type {requirement.source_type}"
                 )
 
-            dataset_groups[requirement.source_type] = extract_covered_datasets(
-                self.data_catalog[requirement.source_type], requirement
+            dataset_groups.append(
+                self._extract_covered_datasets(
+                    provider, metric, requirement, changed_datasets, profile, diagnostics
+                )
             )
 
-        # I'm not sure if the right approach here is a product of the groups
-        for items in itertools.product(*dataset_groups.values()):
+        if changed_datasets is not None and len(dataset_groups) > 1:
+            if not any(dataset_groups):
+                # None of the changed datasets are used by this metric
+                return
+
+            # A changed group may be combined with any of the unchanged groups from the other
+            # requirements, so the complete set of groups is required
+            dataset_groups = [
+                self._extract_covered_datasets(provider, metric, requirement, None, profile, diagnostics)
+                for requirement in metric.data_requirements
+            ]
+
+        for items in join_dataset_groups(metric.data_requirements, dataset_groups):
+            if changed_datasets is not None and not any(
+                group.index.isin(changed_datasets).any() for group in items
+            ):
+                continue
+
+            groups_by_source_type: dict[SourceDatasetType, list[pd.DataFrame]] = {}
+            for requirement, group in zip(metric.data_requirements, items):
+                groups_by_source_type.setdefault(requirement.source_type, []).append(group)
+
             yield MetricExecution(
                 provider=provider,
                 metric=metric,
                 metric_dataset=MetricDataset(
                     {
                         key: DatasetCollection(
-                            datasets=value, slug_column=get_dataset_adapter(key.value).slug_column
+                            datasets=_combine_groups(value),
+                            slug_column=get_dataset_adapter(key.value).slug_column,
                         )
-                        for key, value in zip(dataset_groups.keys(), items)
+                        for key, value in groups_by_source_type.items()
                     }
                 ),
             )
 
 
-def solve_metrics(
+def select_metrics(
+    provider_registry: ProviderRegistry,
+    provider_slugs: Collection[str] | None = None,
+    metric_slugs: Collection[str] | None = None,
+) -> list[tuple[MetricsProvider, Metric]]:
+    """
+    Select a subset of the metrics of the providers
+
+    Parameters
+    ----------
+    provider_registry
+        Registry of the active providers
+    provider_slugs
+        If provided, only the metrics of these providers are selected
+    metric_slugs
+        If provided, only the metrics with these slugs are selected
+
+    Raises
+    ------
+    ValueError
+        A provider or metric isn't available
+
+    Returns
+    -------
+    :
+        The selected metrics along with their provider
+    """
+    providers = provider_registry.providers
+    if provider_slugs is not None:
+        available_providers = {provider.slug for provider in providers}
+        unknown = sorted(set(provider_slugs) - available_providers)
+        if unknown:
+            raise ValueError(f"Unknown providers: {unknown}. Choose from: {sorted(available_providers)}")
+        providers = [provider for provider in providers if provider.slug in provider_slugs]
+
+    metrics = [(provider, metric) for provider in providers for metric in provider.metrics()]
+    if metric_slugs is not None:
+        available_metrics = {metric.slug for _, metric in metrics}
+        unknown = sorted(set(metric_slugs) - available_metrics)
+        if unknown:
+            raise ValueError(f"Unknown metrics: {unknown}. Choose from: {sorted(available_metrics)}")
+        metrics = [(provider, metric) for provider, metric in metrics if metric.slug in metric_slugs]
+    return metrics
+
+
+def get_required_columns(
+    provider_registry: ProviderRegistry,
+    provider_slugs: Collection[str] | None = None,
+    metric_slugs: Collection[str] | None = None,
+) -> dict[SourceDatasetType, frozenset[str] | None]:
+    """
+    Determine which columns of the data catalogs are used by the metrics of the providers
+
+    Parameters
+    ----------
+    provider_registry
+        Registry of the active providers
+    provider_slugs
+        If provided, only the metrics of these providers are considered
+    metric_slugs
+        If provided, only the metrics with these slugs are considered
+
+    Returns
+    -------
+    :
+        The columns used for each of the source types required by the metrics
+
+        The value is None if all the columns of a source type may be used,
+        which is the case if a constraint doesn't declare which columns it uses.
+        Source types that aren't used by any of the metrics aren't included.
+    """
+    required: dict[SourceDatasetType, frozenset[str] | None] = {}
+    for _, metric in select_metrics(provider_registry, provider_slugs, metric_slugs):
+        for requirement in metric.data_requirements:
+            columns = requirement.required_columns()
+            current = required.get(requirement.source_type, frozenset())
+            if columns is None or current is None:
+                required[requirement.source_type] = None
+            else:
+                required[requirement.source_type] = current | columns
+    return required
+
+
+# Maximum number of dataset ids included in a single query
+_QUERY_CHUNK_SIZE = 500
+
+
+def _get_dataset_ids(db: Database, dataset_slugs: Collection[str]) -> set[int]:
+    """
+    Get the ids of the datasets with the given slugs
+
+    Raises
+    ------
+    ValueError
+        A dataset couldn't be found
+    """
+    slugs = list(set(dataset_slugs))
+    dataset_ids: dict[str, int] = {}
+    for start in range(0, len(slugs), _QUERY_CHUNK_SIZE):
+        chunk = slugs[start : start + _QUERY_CHUNK_SIZE]
+        for slug, dataset_id in db.session.query(DatasetModel.slug, DatasetModel.id).filter(
+            DatasetModel.slug.in_(chunk)
+        ):
+            dataset_ids[slug] = dataset_id
+    unknown = sorted(set(slugs) - set(dataset_ids))
+    if unknown:
+        raise ValueError(f"Unknown datasets: {unknown}")
+    return set(dataset_ids.values())
+
+
+def select_dataset_files(
+    data_catalog: pd.DataFrame, dataset_ids: typing.Iterable[int], paths: Collection[str] | None = None
+) -> pd.DataFrame:
+    """
+    Select the files of a set of datasets from a data catalog
+
+    Constraints such as [SelectTimerange][cmip_ref_core.constraints.SelectTimerange]
+    may only use some of the files of a dataset,
+    so the files are also selected by their path if the paths are provided.
+
+    Parameters
+    ----------
+    data_catalog
+        Data catalog indexed by the dataset id
+    dataset_ids
+        Ids of the datasets to select, in the order that they should be returned
+    paths
+        If provided, only the files with these paths are selected
+
+    Returns
+    -------
+    :
+        The selected files
+    """
+    selected = data_catalog.loc[list(dataset_ids)]
+    if paths is not None:
+        selected = selected[selected["path"].isin(list(paths)).to_numpy()]
+    return selected
+
+
+def _load_full_metadata(
+    db: Database, runs: list[tuple[MetricExecution, MetricExecutionDefinition, MetricExecutionResult]]
+) -> list[tuple[MetricExecution, MetricExecutionDefinition, MetricExecutionResult]]:
+    """
+    Replace the datasets of the metric executions with the complete metadata from the database
+
+    This is required if the solver only loaded a subset of the columns of the data catalogs.
+    Only the datasets used by the executions that are being run are loaded,
+    and only the files of those datasets that were selected by the solver are used.
+    """
+    dataset_ids: dict[SourceDatasetType, set[int]] = {}
+    for metric_execution, _, _ in runs:
+        for source_type, collection in metric_execution.metric_dataset.items():
+            dataset_ids.setdefault(source_type, set()).update(collection.index.unique())
+
+    catalogs = {}
+    for source_type, ids in dataset_ids.items():
+        adapter = get_dataset_adapter(source_type.value)
+        sorted_ids = sorted(ids)
+        catalogs[source_type] = pd.concat(
+            [
+                adapter.load_catalog(db, dataset_ids=sorted_ids[i : i + _QUERY_CHUNK_SIZE])
+                for i in range(0, len(sorted_ids), _QUERY_CHUNK_SIZE)
+            ]
+        )
+
+    updated_runs = []
+    for metric_execution, definition, metric_execution_result in runs:
+        metric_dataset = MetricDataset(
+            {
+                source_type: DatasetCollection(
+                    # Preserve the order of the datasets as the order is used to build the key
+                    datasets=select_dataset_files(
+                        catalogs[source_type],
+                        collection.index.unique(),
+                        collection.datasets["path"] if "path" in collection.datasets.columns else None,
+                    ),
+                    slug_column=collection.slug_column,
+                )
+                for source_type, collection in metric_execution.metric_dataset.items()
+            }
+        )
+        updated_runs.append(
+            (
+                evolve(metric_execution, metric_dataset=metric_dataset),
+                evolve(definition, metric_dataset=metric_dataset),
+                metric_execution_result,
+            )
+        )
+    return updated_runs
+
+
+def _get_metric_ids(db: Database) -> dict[tuple[str, str, str], int]:
+    """
+    Get the ids of all the registered metrics
+
+    Returns
+    -------
+    :
+        Mapping of `(provider slug, provider version, metric slug)` to the metric id
+    """
+    query = db.session.query(
+        ProviderModel.slug, ProviderModel.version, MetricModel.slug, MetricModel.id
+    ).join(MetricModel.provider)
+
+    return {
+        (provider_slug, provider_version, metric_slug): metric_id
+        for provider_slug, provider_version, metric_slug, metric_id in query
+    }
+
+
+def _reconcile_executions(
+    db: Database, candidates: list[tuple[MetricExecution, MetricExecutionDefinition]]
+) -> list[tuple[MetricExecution, MetricExecutionDefinition, MetricExecutionResult]]:
+    """
+    Determine which of the candidate metric executions need to be run
+
+    The existing state of the executions is loaded using a fixed number of queries
+    and compared to the candidates in memory.
+    Any new executions and results are then inserted in bulk.
+
+    Parameters
+    ----------
+    db
+        Database instance
+    candidates
+        Candidate metric executions and their definitions identified by the solver
+
+    Returns
+    -------
+    :
+        The candidates that should be run along with the newly created result for each run
+    """
+    metric_ids = _get_metric_ids(db)
+    candidate_metric_ids: list[int] = []
+    for metric_execution, _ in candidates:
+        provider = metric_execution.provider
+        metric = metric_execution.metric
+        registered_id = metric_ids.get((provider.slug, provider.version, metric.slug))
+        if registered_id is None:
+            raise InvalidMetricException(metric, "Metric has not been registered in the database")
+        candidate_metric_ids.append(registered_id)
+
+    existing = get_execution_states(db.session, set(candidate_metric_ids))
+
+    # Create any executions that don't exist yet
+    new_executions: dict[tuple[int, str], dict[str, typing.Any]] = {}
+    for metric_id, (_, definition) in zip(candidate_metric_ids, candidates):
+        ident = (metric_id, definition.key)
+        if ident not in existing and ident not in new_executions:
+            logger.info(f"Created metric execution {definition.key}")
+            new_executions[ident] = {
+                "metric_id": metric_id,
+                "key": definition.key,
+                "dirty": True,
+                "retracted": False,
+            }
+
+    if new_executions:
+        inserted = db.session.execute(
+            insert(MetricExecutionModel).returning(
+                MetricExecutionModel.metric_id, MetricExecutionModel.key, MetricExecutionModel.id
+            ),
+            list(new_executions.values()),
+        )
+        for metric_id, key, execution_id in inserted:
+            existing[(metric_id, key)] = (execution_id, True, None)
+
+    # Compare the candidates to the most recent result of each execution
+    runs = []
+    result_rows = []
+    for metric_id, (metric_execution, definition) in zip(candidate_metric_ids, candidates):
+        dataset_hash = definition.metric_dataset.hash
+        execution_id, dirty, latest_dataset_hash = existing[(metric_id, definition.key)]
+
+        if execution_should_run(definition.key, dataset_hash, latest_dataset_hash, dirty):
+            logger.info(f"Running metric {definition.key}")
+            runs.append((metric_execution, definition, execution_id))
+            result_rows.append(
+                {
+                    "metric_execution_id": execution_id,
+                    "dataset_hash": dataset_hash,
+                    "output_fragment": str(definition.output_fragment()),
+                }
+            )
+            # Duplicate candidates within the same solve should only be run once
+            existing[(metric_id, definition.key)] = (execution_id, False, dataset_hash)
+
+    if not result_rows:
+        return []
+
+    # Each execution is run at most once per solve, so the results can be matched using the execution id
+    results = {
+        result.metric_execution_id: result
+        for result in db.session.scalars(
+            insert(MetricExecutionResult).returning(MetricExecutionResult), result_rows
+        )
+    }
+    runs_with_results = [
+        (metric_execution, definition, results[execution_id])
+        for metric_execution, definition, execution_id in runs
+    ]
+
+    # Add links to the datasets used in each execution
+    dataset_links = [
+        {"metric_execution_result_id": result.id, "dataset_id": dataset_id}
+        for _, definition, result in runs_with_results
+        for _, dataset in definition.metric_dataset.items()
+        for dataset_id in dataset.index.unique()
+    ]
+    if dataset_links:
+        db.session.execute(metric_datasets.insert(), dataset_links)
+
+    return runs_with_results
+
+
+_worker_solver: MetricSolver | None = None
+"""
+Solver used by the worker processes when solving in parallel
+"""
+
+
+def _initialise_worker(solver: MetricSolver) -> None:
+    global _worker_solver  # noqa: PLW0603
+    _worker_solver = solver
+    if solver.profile is not None:
+        # Only the measurements made by the worker are sent back to the parent process
+        solver.profile = SolveProfile()
+    if solver.diagnostics is not None:
+        solver.diagnostics = SolveDiagnostics()
+    if solver.solve_cache is not None:
+        # Only the entries added by the worker are sent back to the parent process
+        solver.solve_cache.updated.clear()
+
+
+def _solve_metric_datasets(
+    provider_index: int, metric_slug: str
+) -> tuple[
+    list[MetricDataset],
+    MetricProfile | None,
+    MetricDiagnostics | None,
+    dict[CacheKey, CachedGroups] | None,
+]:
+    """
+    Solve a single metric in a worker process
+
+    Only the datasets (and the profile, diagnostics and new cache entries if enabled)
+    are returned to the parent process,
+    which avoids having to serialise the provider and metric for every execution.
+    """
+    if _worker_solver is None:  # pragma: no cover
+        raise RuntimeError("Worker process has not been initialised")
+
+    provider = _worker_solver.provider_registry.providers[provider_index]
+    metric = provider.get(metric_slug)
+    metric_datasets = [
+        metric_execution.metric_dataset
+        for metric_execution in _worker_solver.solve_metric_executions(metric, provider)
+    ]
+
+    metric_profile = None
+    if _worker_solver.profile is not None:
+        metric_profile = _worker_solver.profile.metrics.pop((provider.slug, metric.slug), None)
+    metric_diagnostics = None
+    if _worker_solver.diagnostics is not None:
+        metric_diagnostics = _worker_solver.diagnostics.metrics.pop((provider.slug, metric.slug), None)
+    cache_updates = None
+    if _worker_solver.solve_cache is not None:
+        cache_updates = _worker_solver.solve_cache.pop_updates()
+    return metric_datasets, metric_profile, metric_diagnostics, cache_updates
+
+
+def build_solver(  # noqa: PLR0913
+    config: Config,
+    db: Database,
+    incremental: bool = False,
+    dataset_slugs: Collection[str] | None = None,
+    provider_slugs: Collection[str] | None = None,
+    metric_slugs: Collection[str] | None = None,
+) -> MetricSolver:
+    """
+    Build a solver using the current state of the database
+
+    Parameters
+    ----------
+    config
+        Configuration instance
+    db
+        Database instance
+    incremental
+        Only solve for the datasets that have been added or updated since the previous solve
+
+        The previous solve is identified using the most recent
+        [SolveWatermark][cmip_ref.models.SolveWatermark].
+        A complete solve is performed if no previous solve has been recorded,
+        or if the providers or metrics have changed since the previous solve
+        (see [ProviderRegistry.fingerprint][cmip_ref.provider_registry.ProviderRegistry.fingerprint]).
+    dataset_slugs
+        If provided, only solve for these datasets
+    provider_slugs
+        If provided, only solve for the metrics of these providers
+    metric_slugs
+        If provided, only solve for these metrics
+
+    Returns
+    -------
+    :
+        A new MetricSolver instance
+    """
+    provider_registry = ProviderRegistry.build_from_config(config, db)
+
+    changed_since = None
+    if incremental:
+        watermark = get_latest_watermark(db.session)
+        if watermark is None:
+            logger.info("No previous solve found, solving for all datasets")
+        elif watermark.provider_fingerprint != provider_registry.fingerprint():
+            logger.info(
+                "The providers or metrics have changed since the previous solve, solving for all datasets"
+            )
+        else:
+            changed_since = watermark.dataset_updated_at
+    return MetricSolver.build_from_db(
+        config,
+        db,
+        changed_since=changed_since,
+        dataset_slugs=dataset_slugs,
+        provider_slugs=provider_slugs,
+        metric_slugs=metric_slugs,
+        provider_registry=provider_registry,
+    )
+
+
+def solve_candidates(
+    solver: MetricSolver, config: Config, n_jobs: int = 1
+) -> typing.Generator[tuple[MetricExecution, MetricExecutionDefinition], None, None]:
+    """
+    Identify the candidate metric executions
+
+    This doesn't modify the database.
+
+    Parameters
+    ----------
+    solver
+        Solver to use
+    config
+        Configuration instance
+    n_jobs
+        Number of processes used to solve for the candidate metric executions
+
+    Yields
+    ------
+    :
+        The candidate metric executions along with their definitions
+    """
+    logger.info("Solving for metrics that require recalculation...")
+
+    for metric_execution in solver.solve(n_jobs=n_jobs):
+        # The metric output is first written to the scratch directory
+        definition = metric_execution.build_metric_execution_info(output_root=config.paths.scratch)
+
+        logger.debug(f"Identified candidate metric execution {definition.key}")
+        yield metric_execution, definition
+
+
+_T = typing.TypeVar("_T")
+
+
+def _prefetch(iterable: typing.Iterable[_T], maxsize: int) -> typing.Generator[_T, None, None]:
+    """
+    Iterate over an iterable in a background thread
+
+    Up to `maxsize` items are buffered in a queue,
+    so the producer can run ahead of the consumer without holding all the items in memory.
+    Any exception raised by the producer is re-raised in the consuming thread.
+    """
+    buffer: queue.Queue[tuple[str, typing.Any]] = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def _put(message: tuple[str, typing.Any]) -> bool:
+        # Stop waiting for space in the queue if the consumer has gone away
+        while not stop.is_set():
+            try:
+                buffer.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce() -> None:
+        try:
+            for item in iterable:
+                if not _put(("item", item)):
+                    return
+        except BaseException as exc:
+            _put(("error", exc))
+        else:
+            _put(("end", None))
+
+    producer = threading.Thread(target=_produce, name="cmip_ref-solver", daemon=True)
+    producer.start()
+    try:
+        while True:
+            kind, value = buffer.get()
+            if kind == "end":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stop.set()
+        producer.join()
+
+
+def _batched(iterable: typing.Iterable[_T], batch_size: int) -> typing.Generator[list[_T], None, None]:
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+def submit_candidates(
+    db: Database,
+    executor: Executor,
+    candidates: list[tuple[MetricExecution, MetricExecutionDefinition]],
+    load_metadata: bool = False,
+) -> None:
+    """
+    Submit the candidate metric executions which need to be run
+
+    The candidates are reconciled against the database first
+    so only the new, or out of date, executions are submitted to the executor.
+
+    Parameters
+    ----------
+    db
+        Database instance
+    executor
+        Executor used to run the metric executions
+    candidates
+        Candidate metric executions and their definitions
+    load_metadata
+        If True, the complete metadata of the datasets is loaded from the database before the
+        executions are submitted.
+        This is required if the candidates were solved using a projected data catalog.
+    """
+    # Use a transaction to make sure that the models
+    # are created correctly before potentially executing out of process
+    with db.session.begin(nested=True):
+        runs = _reconcile_executions(db, candidates)
+
+    if load_metadata and runs:
+        runs = _load_full_metadata(db, runs)
+
+    for metric_execution, definition, metric_execution_result in runs:
+        executor.run_metric(
+            provider=metric_execution.provider,
+            metric=metric_execution.metric,
+            definition=definition,
+            metric_execution_result=metric_execution_result,
+        )
+
+
+def solve_and_submit(  # noqa: PLR0913
+    db: Database,
+    solver: MetricSolver,
+    config: Config,
+    executor: Executor,
+    dry_run: bool = False,
+    n_jobs: int = 1,
+    batch_size: int = 100,
+    commit_batches: bool = False,
+) -> None:
+    """
+    Solve for the candidate metric executions and submit them to an executor in batches
+
+    Once `batch_size` candidates have been identified they are written to the database
+    and submitted to the executor, while the solver continues to identify the remaining candidates.
+
+    Parameters
+    ----------
+    db
+        Database instance
+    solver
+        Solver to use
+    config
+        Configuration instance
+    executor
+        Executor used to run the metric executions
+    dry_run
+        If true, the candidate metric executions are identified, but not submitted
+    n_jobs
+        Number of processes used to solve for the candidate metric executions
+    batch_size
+        Number of candidate metric executions that are written to the database
+        and submitted to the executor at a time
+    commit_batches
+        If true, each batch is written to the database and submitted in a separate transaction,
+        so the executions that have already been submitted are kept if a later batch fails.
+        The session must not have a transaction in progress.
+    """
+    candidates: typing.Iterable[tuple[MetricExecution, MetricExecutionDefinition]] = solve_candidates(
+        solver, config, n_jobs=n_jobs
+    )
+    if n_jobs == 1:
+        # Solve in a background thread so that the executions can be submitted while solving.
+        # The parallel solver already runs ahead in its worker processes.
+        # Only the solving is moved off the main thread, as the database session isn't thread-safe.
+        candidates = _prefetch(candidates, maxsize=2 * batch_size)
+
+    for batch in _batched(candidates, batch_size):
+        if dry_run:
+            continue
+        if commit_batches:
+            with db.session.begin():
+                submit_candidates(db, executor, batch, load_metadata=solver.projected)
+        else:
+            submit_candidates(db, executor, batch, load_metadata=solver.projected)
+
+
+def solve_metrics(  # noqa: PLR0913
     db: Database,
     dry_run: bool = False,
     solver: MetricSolver | None = None,
     config: Config | None = None,
     timeout: int = 60,
+    incremental: bool = False,
+    n_jobs: int = 1,
+    batch_size: int = 100,
+    profile: SolveProfile | None = None,
+    dataset_slugs: Collection[str] | None = None,
+    provider_slugs: Collection[str] | None = None,
+    metric_slugs: Collection[str] | None = None,
+    use_cache: bool = False,
+    diagnostics: SolveDiagnostics | None = None,
 ) -> None:
     """
     Solve for metrics that require recalculation
@@ -221,72 +1471,113 @@ def solve_metrics(
     This may trigger a number of additional calculations depending on what data has been ingested
     since the last solve.
 
+    The candidate metric executions are processed as a stream.
+    Once `batch_size` candidates have been identified they are written to the database
+    and submitted to the executor, while the solver continues to identify the remaining candidates.
+
+    Parameters
+    ----------
+    db
+        Database instance
+    dry_run
+        If true, the candidate metric executions are identified, but not run
+    solver
+        Solver to use. If None, a new solver is built from the database
+    config
+        Configuration instance. If None, the default configuration is used
+    timeout
+        Maximum time to wait for the metric executions to complete in seconds
+    incremental
+        Only solve for the datasets that have been added or updated since the previous solve
+
+        The previous solve is identified using the most recent
+        [SolveWatermark][cmip_ref.models.SolveWatermark].
+        A complete solve is performed if no previous solve has been recorded,
+        or if the providers or metrics have changed since the previous solve.
+        The metrics with a constraint that may add datasets to a group,
+        e.g. a supplementary or parent dataset, are always solved for completely.
+
+        An incremental solve finds the same metric executions as a complete solve
+        for all the datasets that were committed before the previous solve started,
+        or that were added or updated by a transaction that started after it.
+        A dataset ingested by a transaction that started before the previous solve
+        but was committed after that solve read the data catalog may be missed,
+        so a complete solve should be performed after ingesting concurrently with a solve.
+        This is ignored if `solver` is provided.
+    n_jobs
+        Number of processes used to solve for the candidate metric executions
+    batch_size
+        Number of candidate metric executions that are written to the database
+        and submitted to the executor at a time
+    profile
+        If provided, the time spent solving each metric is recorded in this profile
+    dataset_slugs
+        If provided, only solve for the metric executions that include one of these datasets
+    provider_slugs
+        If provided, only solve for the metrics of these providers
+    metric_slugs
+        If provided, only solve for these metrics
+
+        A targeted solve using `dataset_slugs`, `provider_slugs` or `metric_slugs`
+        doesn't update the watermark used by incremental solves.
+        These are ignored if `solver` is provided.
+    use_cache
+        Reuse the groups of datasets found by previous solves if neither the data catalog
+        nor the data requirement have changed (see [SolveCache][cmip_ref.solve_cache.SolveCache]).
+
+        The groups found by this solve are added to the cache, unless this is a dry run.
+    diagnostics
+        If provided, the groups of datasets rejected by the constraints of each metric are recorded.
+
+        Rejections aren't recorded for requirements whose groups are reused from the cache.
+
     Raises
     ------
+    ValueError
+        A dataset, provider or metric could not be found
     TimeoutError
         If the execution isn't completed within the specified timeout
     """
     if config is None:
         config = Config.default()
-    if solver is None:
-        solver = MetricSolver.build_from_db(config, db)
 
-    logger.info("Solving for metrics that require recalculation...")
+    # The watermark is the start of the solve's transaction,
+    # so that datasets committed during the solve are included in the next incremental solve.
+    # This must be the first query of the transaction, as SQLite returns the time of the query
+    dataset_updated_at = get_transaction_timestamp(db.session)
+
+    if solver is None:
+        solver = build_solver(
+            config,
+            db,
+            incremental=incremental,
+            dataset_slugs=dataset_slugs,
+            provider_slugs=provider_slugs,
+            metric_slugs=metric_slugs,
+        )
+    if profile is not None:
+        solver.profile = profile
+    if diagnostics is not None:
+        solver.diagnostics = diagnostics
+    if use_cache:
+        solver.solve_cache = SolveCache.load(db)
+    targeted = dataset_slugs is not None or provider_slugs is not None or metric_slugs is not None
 
     executor = config.executor.build(config, db)
 
-    for metric_execution in solver.solve():
-        # The metric output is first written to the scratch directory
-        definition = metric_execution.build_metric_execution_info(output_root=config.paths.scratch)
+    solve_and_submit(db, solver, config, executor, dry_run=dry_run, n_jobs=n_jobs, batch_size=batch_size)
 
-        logger.debug(f"Identified candidate metric execution {definition.key}")
+    if not dry_run and solver.solve_cache is not None:
+        solver.solve_cache.save(db)
 
-        if dry_run:
-            continue
-
-        # Use a transaction to make sure that the models
-        # are created correctly before potentially executing out of process
-        with db.session.begin(nested=True):
-            metric_execution_model, created = db.get_or_create(
-                MetricExecutionModel,
-                key=definition.key,
-                metric_id=db.session.query(MetricModel)
-                .join(MetricModel.provider)
-                .filter(
-                    ProviderModel.slug == metric_execution.provider.slug,
-                    ProviderModel.version == metric_execution.provider.version,
-                    MetricModel.slug == metric_execution.metric.slug,
-                )
-                .one()
-                .id,
-                defaults={
-                    "dirty": True,
-                    "retracted": False,
-                },
+    if not dry_run and not targeted:
+        db.session.add(
+            SolveWatermark(
+                dataset_updated_at=dataset_updated_at,
+                provider_fingerprint=solver.provider_registry.fingerprint(),
             )
+        )
+        db.session.flush()
 
-            if created:
-                logger.info(f"Created metric execution {definition.key}")
-                db.session.flush()
-
-            if metric_execution_model.should_run(definition.metric_dataset.hash):
-                logger.info(f"Running metric {metric_execution_model.key}")
-                metric_execution_result = MetricExecutionResult(
-                    metric_execution=metric_execution_model,
-                    dataset_hash=definition.metric_dataset.hash,
-                    output_fragment=str(definition.output_fragment()),
-                )
-                db.session.add(metric_execution_result)
-                db.session.flush()
-
-                # Add links to the datasets used in the execution
-                metric_execution_result.register_datasets(db, definition.metric_dataset)
-
-                executor.run_metric(
-                    provider=metric_execution.provider,
-                    metric=metric_execution.metric,
-                    definition=definition,
-                    metric_execution_result=metric_execution_result,
-                )
     if timeout > 0:
         executor.join(timeout=timeout)
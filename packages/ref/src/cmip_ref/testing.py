@@ -6,7 +6,10 @@ import importlib.resources
 import os
 import shutil
 from pathlib import Path
+from typing import Any
 
+import numpy as np
+import pandas as pd
 import pooch
 from loguru import logger
 
@@ -102,3 +105,310 @@ def fetch_sample_data(
     # Write out the current sample data version to the copying as complete
     with open(output_dir / "version.txt", "w") as fh:
         fh.write(SAMPLE_DATA_VERSION)
+
+
+# Variables in the synthetic catalogs and the table, frequency and realm that they are in.
+# Fixed fields such as `areacella` have a single file without a time range.
+_SYNTHETIC_CMIP6_VARIABLES = {
+    "tas": ("Amon", "mon", "atmos"),
+    "pr": ("Amon", "mon", "atmos"),
+    "ts": ("Amon", "mon", "atmos"),
+    "rsut": ("Amon", "mon", "atmos"),
+    "rlut": ("Amon", "mon", "atmos"),
+    "rsdt": ("Amon", "mon", "atmos"),
+    "gpp": ("Lmon", "mon", "land"),
+    "lai": ("Lmon", "mon", "land"),
+    "tos": ("Omon", "mon", "ocean"),
+    "thetao": ("Omon", "mon", "ocean"),
+    "areacella": ("fx", "fx", "atmos"),
+    "sftlf": ("fx", "fx", "atmos"),
+}
+
+# Experiments in the synthetic CMIP6 catalog with their activity, parent experiment and years
+_SYNTHETIC_CMIP6_EXPERIMENTS = {
+    "piControl": ("CMIP", "piControl-spinup", 1850, 2249),
+    "historical": ("CMIP", "piControl", 1850, 2014),
+    "abrupt-4xCO2": ("CMIP", "piControl", 1850, 1999),
+    "1pctCO2": ("CMIP", "piControl", 1850, 1999),
+    "amip": ("CMIP", "no parent", 1979, 2014),
+    "hist-GHG": ("DAMIP", "piControl", 1850, 2020),
+    "land-hist": ("LS3MIP", "no parent", 1850, 2014),
+    "ssp126": ("ScenarioMIP", "historical", 2015, 2100),
+    "ssp245": ("ScenarioMIP", "historical", 2015, 2100),
+    "ssp585": ("ScenarioMIP", "historical", 2015, 2100),
+}
+
+# Facets with the same value for all the datasets in the synthetic CMIP6 catalog
+_SYNTHETIC_CMIP6_CONSTANT_FACETS: dict[str, Any] = {
+    "branch_method": "standard",
+    "branch_time_in_child": 0.0,
+    "branch_time_in_parent": 0.0,
+    "grid": "native atmosphere grid",
+    "nominal_resolution": "100 km",
+    "parent_time_units": "days since 1850-01-01",
+    "product": "model-output",
+    "source_type": "AOGCM",
+    "sub_experiment": "none",
+    "sub_experiment_id": "none",
+    "units": "1",
+    "vertical_levels": 1,
+    "init_year": None,
+    "version": "v20200101",
+}
+
+_SYNTHETIC_OBS4MIPS_VARIABLES = ("tas", "pr", "ts", "rsut", "rlut", "rsdt", "gpp", "tos", "psl", "hfls")
+
+
+def _count_files(
+    start_year: np.ndarray[Any, Any], end_year: np.ndarray[Any, Any], chunk_years: np.ndarray[Any, Any]
+) -> np.ndarray[Any, Any]:
+    """
+    Get the number of files in each dataset
+    """
+    has_time = ~np.isnan(start_year)
+    n_years = np.where(has_time, end_year - start_year + 1, 1)
+    return np.where(has_time, np.ceil(n_years / chunk_years), 1).astype(int)
+
+
+def _expand_files(
+    datasets: pd.DataFrame,
+    start_year: np.ndarray[Any, Any],
+    end_year: np.ndarray[Any, Any],
+    chunk_years: np.ndarray[Any, Any],
+) -> pd.DataFrame:
+    """
+    Split each dataset into files with contiguous, monthly time ranges
+
+    Datasets where the `start_year` is missing have a single file without a time range.
+    """
+    has_time = ~np.isnan(start_year)
+    n_files = _count_files(start_year, end_year, chunk_years)
+
+    dataset_index = np.repeat(np.arange(len(datasets)), n_files)
+    file_index = np.arange(len(dataset_index)) - np.repeat(np.cumsum(n_files) - n_files, n_files)
+
+    files = datasets.iloc[dataset_index].reset_index(drop=True)
+    chunk = chunk_years[dataset_index]
+    file_start = start_year[dataset_index] + file_index * chunk
+    file_end = np.minimum(file_start + chunk - 1, end_year[dataset_index])
+
+    start_time = pd.to_datetime(
+        pd.DataFrame({"year": np.nan_to_num(file_start, nan=2000).astype(int), "month": 1, "day": 16})
+    )
+    end_time = pd.to_datetime(
+        pd.DataFrame({"year": np.nan_to_num(file_end, nan=2000).astype(int), "month": 12, "day": 16})
+    )
+    files["start_time"] = start_time.where(has_time[dataset_index])
+    files["end_time"] = end_time.where(has_time[dataset_index])
+
+    file_start_label = np.nan_to_num(file_start, nan=0).astype(int).astype(str)
+    file_end_label = np.nan_to_num(file_end, nan=0).astype(int).astype(str)
+    time_suffix = np.where(
+        has_time[dataset_index],
+        np.char.add(
+            np.char.add(np.char.add("_", file_start_label), "01-"), np.char.add(file_end_label, "12")
+        ),
+        "",
+    )
+    files["path"] = np.char.add(
+        np.char.add(files["instance_id"].str.replace(".", "/", regex=False).to_numpy(dtype=str), "/data"),
+        np.char.add(time_suffix, ".nc"),
+    )
+    files.index = pd.Index(files.pop("dataset_id").to_numpy(), name=None)
+    return files
+
+
+def _truncate_files(
+    files: pd.DataFrame, n_rows: int, gap_fraction: float, rng: np.random.Generator
+) -> pd.DataFrame:
+    """
+    Limit the number of files and remove a file from a fraction of the datasets to create gaps
+    """
+    files = files.iloc[:n_rows]
+    if gap_fraction > 0:
+        # Dropping a single file from a dataset with more than two files leaves a gap in the timerange
+        dataset_ids = files.index.to_numpy()
+        position = np.arange(len(files)) - np.searchsorted(dataset_ids, dataset_ids)
+        is_middle = (position == 1) & (np.roll(dataset_ids, -1) == dataset_ids)
+        drop = is_middle & (rng.random(len(files)) < gap_fraction)
+        files = files[~drop]
+    return files
+
+
+def _sample_cmip6_members(
+    rng: np.random.Generator,
+    n_members: int,
+    sources: np.ndarray[Any, Any],
+    experiments: np.ndarray[Any, Any],
+    variables: np.ndarray[Any, Any],
+) -> pd.DataFrame:
+    """
+    Sample the datasets of randomly selected ensemble members
+
+    Each member has a subset of the variables and the low realisation numbers are the most common.
+    """
+    member_source = rng.integers(len(sources), size=n_members)
+    member_experiment = rng.integers(len(experiments), size=n_members)
+    realisation = rng.zipf(1.5, size=n_members).clip(max=100).astype(str)
+    physics = rng.choice(["1", "2"], size=n_members, p=[0.8, 0.2])
+    forcing = rng.choice(["1", "2", "3"], size=n_members, p=[0.6, 0.3, 0.1])
+    member_variant = np.char.add(
+        np.char.add(np.char.add("r", realisation), np.char.add("i1p", physics)), np.char.add("f", forcing)
+    ).astype(object)
+    member_variable = rng.random((n_members, len(variables))) < 0.3
+    member_variable[:, list(variables).index("areacella")] = rng.random(n_members) < 0.9
+
+    member, variable = np.nonzero(member_variable)
+    return pd.DataFrame(
+        {
+            "source_id": sources[member_source[member]],
+            "experiment_id": experiments[member_experiment[member]],
+            "variant_label": member_variant[member],
+            "variable_id": variables[variable],
+        }
+    )
+
+
+def generate_cmip6_catalog(n_rows: int, seed: int = 0, gap_fraction: float = 0.02) -> pd.DataFrame:
+    """
+    Generate a synthetic CMIP6 data catalog
+
+    The catalog has the same columns and index as the catalog loaded from the database
+    and is intended for benchmarking the solver without needing to ingest any data.
+
+    The facets have cardinalities that are similar to the CMIP6 archive:
+    each model has a range of experiments and ensemble members,
+    time-dependent datasets are split into multiple files with contiguous time ranges
+    and most ensemble members include `areacella` and `sftlf` fixed fields.
+
+    Parameters
+    ----------
+    n_rows
+        Number of files in the catalog
+    seed
+        Seed for the random number generator
+    gap_fraction
+        Fraction of the multi-file datasets that have a missing file and therefore a gap in the timerange
+
+    Returns
+    -------
+    :
+        Synthetic data catalog with a row per file
+    """
+    rng = np.random.default_rng(seed)
+
+    n_sources = 60
+    sources = np.array([f"MODEL-{i:02d}" for i in range(n_sources)])
+    source_institution = np.array([f"INST-{i // 3:02d}" for i in range(n_sources)])
+    source_grid = np.where(rng.random(n_sources) < 0.8, "gn", "gr")
+    source_chunk = rng.choice([10, 20, 50, 100, 500], size=n_sources)
+
+    experiments = np.array(list(_SYNTHETIC_CMIP6_EXPERIMENTS))
+    experiment_info = np.array(list(_SYNTHETIC_CMIP6_EXPERIMENTS.values()), dtype=object)
+    variables = np.array(list(_SYNTHETIC_CMIP6_VARIABLES))
+    variable_info = np.array(list(_SYNTHETIC_CMIP6_VARIABLES.values()), dtype=object)
+
+    # Sample ensemble members until there are enough files
+    datasets = pd.DataFrame(columns=["source_id", "experiment_id", "variant_label", "variable_id"])
+    while True:
+        source_index = datasets["source_id"].str.slice(6).astype(int).to_numpy()
+        experiment_index = pd.Categorical(datasets["experiment_id"], categories=experiments).codes
+        variable_index = pd.Categorical(datasets["variable_id"], categories=variables).codes
+        table_id = variable_info[variable_index, 0]
+
+        is_fixed = table_id == "fx"
+        start_year = np.where(is_fixed, np.nan, experiment_info[experiment_index, 2].astype(float))
+        end_year = np.where(is_fixed, np.nan, experiment_info[experiment_index, 3].astype(float))
+        chunk_years = source_chunk[source_index].astype(float)
+        n_files = _count_files(start_year, end_year, chunk_years).sum()
+        if n_files >= n_rows:
+            break
+
+        sampled = _sample_cmip6_members(rng, (n_rows - n_files) // 10 + 10, sources, experiments, variables)
+        datasets = pd.concat([datasets, sampled]).drop_duplicates(ignore_index=True)
+
+    datasets["activity_id"] = experiment_info[experiment_index, 0]
+    datasets["institution_id"] = source_institution[source_index]
+    datasets["grid_label"] = source_grid[source_index]
+    datasets["table_id"] = table_id
+    datasets["frequency"] = variable_info[variable_index, 1]
+    datasets["realm"] = variable_info[variable_index, 2]
+    datasets["member_id"] = datasets["variant_label"]
+    datasets["instance_id"] = "CMIP6." + datasets["activity_id"].str.cat(
+        datasets[
+            [
+                "institution_id",
+                "source_id",
+                "experiment_id",
+                "variant_label",
+                "table_id",
+                "variable_id",
+                "grid_label",
+            ]
+        ].assign(version="v20200101"),
+        sep=".",
+    )
+    datasets["experiment"] = datasets["experiment_id"]
+    datasets["parent_activity_id"] = datasets["activity_id"]
+    datasets["parent_experiment_id"] = experiment_info[experiment_index, 1]
+    datasets["parent_source_id"] = datasets["source_id"]
+    datasets["parent_variant_label"] = datasets["variant_label"]
+    datasets["standard_name"] = datasets["variable_id"]
+    datasets["long_name"] = datasets["variable_id"]
+    datasets = datasets.assign(**_SYNTHETIC_CMIP6_CONSTANT_FACETS)
+    datasets["dataset_id"] = np.arange(1, len(datasets) + 1)
+
+    files = _expand_files(datasets, start_year, end_year, chunk_years)
+    return _truncate_files(files, n_rows, gap_fraction, rng)
+
+
+def generate_obs4mips_catalog(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate a synthetic obs4MIPs data catalog
+
+    See [generate_cmip6_catalog][cmip_ref.testing.generate_cmip6_catalog] for more information.
+
+    Parameters
+    ----------
+    n_rows
+        Number of files in the catalog
+    seed
+        Seed for the random number generator
+
+    Returns
+    -------
+    :
+        Synthetic data catalog with a row per file
+    """
+    rng = np.random.default_rng(seed)
+
+    # Each observational product is split into yearly files
+    n_datasets = n_rows // 20 + 1
+    source_id = np.char.add("OBS-", rng.integers(200, size=n_datasets).astype(str))
+    variable_id = rng.choice(_SYNTHETIC_OBS4MIPS_VARIABLES, size=n_datasets)
+    datasets = pd.DataFrame({"source_id": source_id, "variable_id": variable_id}).drop_duplicates(
+        ignore_index=True
+    )
+    datasets["activity_id"] = "obs4MIPs"
+    datasets["frequency"] = "mon"
+    datasets["grid"] = "1x1 degree"
+    datasets["grid_label"] = "gn"
+    datasets["institution_id"] = "INST"
+    datasets["nominal_resolution"] = "100 km"
+    datasets["product"] = "observations"
+    datasets["realm"] = "atmos"
+    datasets["source_type"] = "satellite_retrieval"
+    datasets["variant_label"] = "REF"
+    datasets["long_name"] = datasets["variable_id"]
+    datasets["units"] = "1"
+    datasets["vertical_levels"] = 1
+    datasets["source_version_number"] = "v20200101"
+    datasets["instance_id"] = "obs4MIPs.INST." + datasets["source_id"].str.cat(
+        datasets["variable_id"] + ".gn.v20200101", sep=".mon."
+    )
+    datasets["dataset_id"] = np.arange(1, len(datasets) + 1)
+
+    start_year = rng.integers(1950, 2000, size=len(datasets)).astype(float)
+    end_year = np.full(len(datasets), 2019.0)
+    files = _expand_files(datasets, start_year, end_year, np.ones(len(datasets)))
+    return _truncate_files(files, n_rows, 0, rng)
@@ -0,0 +1,256 @@
+"""
+Continuously solve for new datasets as they are ingested
+
+The solver is kept in memory between solves,
+so the providers and the data catalogs are only loaded once.
+The database is polled for datasets that have been added or updated,
+and only those datasets are loaded and solved for.
+"""
+
+import datetime
+import time
+from collections.abc import Collection
+
+from attrs import define, evolve, field
+from loguru import logger
+
+from cmip_ref.config import Config
+from cmip_ref.database import Database
+from cmip_ref.datasets import get_dataset_adapter
+from cmip_ref.models import Dataset as DatasetModel
+from cmip_ref.models import SolveWatermark
+from cmip_ref.models.solve import get_transaction_timestamp
+from cmip_ref.solver import MetricSolver, build_solver, solve_and_submit
+from cmip_ref_core.datasets import SourceDatasetType
+from cmip_ref_core.executor import Executor
+
+
+@define
+class DatasetPoller:
+    """
+    Find the datasets that have been added or updated since the previous poll
+
+    Each poll finds the datasets whose `updated_at` is at or after the time that the previous poll
+    started according to the database (see
+    [get_transaction_timestamp][cmip_ref.models.solve.get_transaction_timestamp]).
+    `updated_at` is the time that the writing transaction started rather than when it committed,
+    so the largest `updated_at` that has been seen can't be used instead:
+    a long ingest which commits after a shorter one can have an earlier `updated_at`.
+
+    Datasets updated at or after the start of a poll are included in the next poll as well,
+    but a dataset is only reported again if it has been updated again.
+    """
+
+    watermark: datetime.datetime | None = None
+    """
+    The time that the previous poll started according to the database
+    """
+
+    _seen: dict[int, datetime.datetime] = field(factory=dict, repr=False)
+    """
+    The datasets that have been seen with an `updated_at` value at or after the watermark
+    """
+
+    def poll(self, db: Database) -> dict[SourceDatasetType, list[int]]:
+        """
+        Find the datasets that have been added or updated since the previous poll
+
+        This should be called before any other query in the transaction,
+        so the new watermark is the time that the transaction started.
+
+        Parameters
+        ----------
+        db
+            Database instance
+
+        Returns
+        -------
+        :
+            The ids of the new or updated datasets for each source type
+        """
+        poll_started_at = get_transaction_timestamp(db.session)
+        query = db.session.query(DatasetModel.id, DatasetModel.dataset_type, DatasetModel.updated_at)
+        if self.watermark is not None:
+            query = query.filter(DatasetModel.updated_at >= self.watermark)
+
+        changed: dict[SourceDatasetType, list[int]] = {}
+        updated_at: dict[int, datetime.datetime] = {}
+        for dataset_id, dataset_type, dataset_updated_at in query.order_by(DatasetModel.id):
+            updated_at[dataset_id] = dataset_updated_at
+            if self._seen.get(dataset_id) != dataset_updated_at:
+                changed.setdefault(dataset_type, []).append(dataset_id)
+
+        self.watermark = poll_started_at
+        self._seen = {
+            dataset_id: dataset_updated_at
+            for dataset_id, dataset_updated_at in updated_at.items()
+            if dataset_updated_at >= poll_started_at
+        }
+        return changed
+
+
+def apply_dataset_changes(
+    db: Database, solver: MetricSolver, changed: dict[SourceDatasetType, list[int]]
+) -> set[int]:
+    """
+    Load the new or updated datasets into the data catalogs of a solver
+
+    Only the columns that are already present in the data catalogs are loaded.
+    Datasets for source types which aren't used by the solver are ignored.
+
+    Parameters
+    ----------
+    db
+        Database instance
+    solver
+        Solver to update
+    changed
+        The ids of the new or updated datasets for each source type
+
+    Returns
+    -------
+    :
+        The ids of the datasets that were loaded
+    """
+    loaded = set()
+    for source_type, dataset_ids in changed.items():
+        data_catalog = solver.data_catalog.get(source_type)
+        if data_catalog is None:
+            continue
+
+        adapter = get_dataset_adapter(source_type.value)
+        datasets = adapter.load_catalog(
+            db, columns=set(data_catalog.columns) if solver.projected else None, dataset_ids=dataset_ids
+        )
+        solver.update_datasets(source_type, datasets)
+        loaded.update(dataset_ids)
+    return loaded
+
+
+def wait_for_executions(executor: Executor, timeout: float) -> None:
+    """
+    Wait for the submitted executions to complete for `timeout` seconds
+
+    The executor stops tracking the executions which complete while waiting,
+    so a long running watcher doesn't accumulate the results of every execution it has submitted.
+    Executions which are still running after the timeout continue to run in the background.
+
+    Parameters
+    ----------
+    executor
+        Executor which the executions were submitted to
+    timeout
+        Time to wait in seconds
+    """
+    start_time = time.monotonic()
+    try:
+        executor.join(timeout=timeout)
+    except TimeoutError:
+        return
+    # Wait for the rest of the interval if the executions completed early
+    time.sleep(max(timeout - (time.monotonic() - start_time), 0.0))
+
+
+def watch_metrics(  # noqa: PLR0913
+    db: Database,
+    config: Config | None = None,
+    poll_interval: float = 30.0,
+    n_jobs: int = 1,
+    batch_size: int = 100,
+    provider_slugs: Collection[str] | None = None,
+    metric_slugs: Collection[str] | None = None,
+    max_polls: int | None = None,
+) -> None:
+    """
+    Continuously solve for the metrics that require recalculation as datasets are ingested
+
+    The first solve covers the datasets that have been added or updated since the previous solve
+    (see [SolveWatermark][cmip_ref.models.SolveWatermark]), or all datasets if there hasn't been one.
+    Afterwards, the database is polled for new or updated datasets every `poll_interval` seconds.
+    Those datasets are loaded into the data catalogs that are held in memory,
+    and the metric executions which use them are submitted.
+
+    A watermark is recorded after each solve,
+    so a subsequent incremental solve continues from where the watcher stopped.
+    Datasets that are removed from the database aren't removed from the data catalogs.
+
+    Each batch of metric executions is committed once it has been submitted,
+    so a failure doesn't remove the executions that are already running.
+    The watcher waits for the submitted executions to complete between polls
+    (see [wait_for_executions][cmip_ref.watch.wait_for_executions]).
+
+    This runs until interrupted, e.g. using Ctrl+C.
+
+    Parameters
+    ----------
+    db
+        Database instance
+    config
+        Configuration instance. If None, the default configuration is used
+    poll_interval
+        Time to wait between polls of the database in seconds
+    n_jobs
+        Number of processes used to solve for the candidate metric executions
+    batch_size
+        Number of candidate metric executions that are written to the database
+        and submitted to the executor at a time
+    provider_slugs
+        If provided, only solve for the metrics of these providers
+    metric_slugs
+        If provided, only solve for these metrics
+    max_polls
+        Stop after polling the database this many times.
+        If None (default), the database is polled until interrupted.
+    """
+    if config is None:
+        config = Config.default()
+
+    with db.session.begin():
+        watermark = get_transaction_timestamp(db.session)
+        # Everything up to the watermark is either in the data catalogs or already solved for
+        poller = DatasetPoller(watermark=watermark)
+        poller.poll(db)
+        solver = build_solver(
+            config, db, incremental=True, provider_slugs=provider_slugs, metric_slugs=metric_slugs
+        )
+        executor = config.executor.build(config, db)
+    solve_and_submit(db, solver, config, executor, n_jobs=n_jobs, batch_size=batch_size, commit_batches=True)
+    with db.session.begin():
+        db.session.add(
+            SolveWatermark(
+                dataset_updated_at=watermark, provider_fingerprint=solver.provider_registry.fingerprint()
+            )
+        )
+
+    polls = 0
+    try:
+        while max_polls is None or polls < max_polls:
+            wait_for_executions(executor, poll_interval)
+            polls += 1
+
+            previous_poller = evolve(poller)
+            try:
+                with db.session.begin():
+                    changed = poller.poll(db)
+                    changed_datasets = apply_dataset_changes(db, solver, changed) if changed else None
+                if changed_datasets is None:
+                    continue
+
+                solver.changed_datasets = changed_datasets
+                logger.info(f"Solving for {len(changed_datasets)} new or updated datasets")
+                solve_and_submit(
+                    db, solver, config, executor, n_jobs=n_jobs, batch_size=batch_size, commit_batches=True
+                )
+                with db.session.begin():
+                    db.session.add(
+                        SolveWatermark(
+                            dataset_updated_at=poller.watermark,
+                            provider_fingerprint=solver.provider_registry.fingerprint(),
+                        )
+                    )
+            except Exception:
+                # The changes are picked up again by the next poll
+                logger.exception("Failed to solve for the new or updated datasets")
+                poller = previous_poller
+    except KeyboardInterrupt:
+        logger.info("Stopped watching for new datasets")
@@ -1,3 +1,6 @@
+from cmip_ref_core.constraints import RequireFacets
+
+
 def test_solve_help(invoke_cli):
     result = invoke_cli(["solve", "--help"])
 
@@ -8,3 +11,55 @@ class TestSolve:
     def test_solve_without_datasets(self, sample_data_dir, db, invoke_cli):
         # TODO: Implement this test
         result = invoke_cli(["solve"])  # noqa
+
+
+def test_execute_help(invoke_cli):
+    result = invoke_cli(["execute", "--help"])
+
+    assert "Execute the metric executions in a plan" in result.stdout
+
+
+def test_execute_invalid_shard(tmp_path, invoke_cli):
+    plan = tmp_path / "plan.jsonl"
+    plan.touch()
+
+    result = invoke_cli(["execute", str(plan), "--shard", "3/2"], expected_exit_code=2)
+
+    assert "Shard must be between 1 and 2" in result.stderr
+
+
+def test_solve_unknown_provider(db, invoke_cli):
+    result = invoke_cli(["solve", "--provider", "missing"], expected_exit_code=1)
+
+    assert "Unknown providers: ['missing']" in result.stderr
+
+
+def test_solve_watch_invalid_options(db, invoke_cli):
+    result = invoke_cli(["solve", "--watch", "--dry-run"], expected_exit_code=1)
+
+    assert "--watch can't be combined with" in result.stderr
+
+
+def test_solve_watch(mocker, db, invoke_cli):
+    mock_watch = mocker.patch("cmip_ref.cli.solve.watch_metrics")
+
+    invoke_cli(["solve", "--watch", "--poll-interval", "5", "--provider", "example"])
+
+    mock_watch.assert_called_once()
+    assert mock_watch.call_args.kwargs["poll_interval"] == 5
+    assert mock_watch.call_args.kwargs["provider_slugs"] == ["example"]
+
+
+def test_solve_explain(mocker, db, invoke_cli):
+    def _solve(**kwargs):
+        kwargs["diagnostics"].get("example", "global-mean-timeseries").reject(
+            "cmip6", RequireFacets("variable_id", ("tas",)), {"source_id": "ACCESS-ESM1-5"}, 2
+        )
+
+    mock_solve = mocker.patch("cmip_ref.cli.solve.solve_metrics", side_effect=_solve)
+
+    result = invoke_cli(["solve", "--explain"])
+
+    mock_solve.assert_called_once()
+    assert "RequireFacets" in result.stdout
+    assert "source_id=ACCESS-ESM1-5" in result.stdout
@@ -4,7 +4,10 @@ import numpy as np
 import pandas as pd
 import pytest
 
+from cmip_ref.datasets.base import encode_categorical
 from cmip_ref.datasets.cmip6 import CMIP6DatasetAdapter, _apply_fixes, _parse_datetime
+from cmip_ref_core.datasets import FacetFilter, SourceDatasetType
+from cmip_ref_core.metrics import DataRequirement
 
 
 @pytest.fixture
@@ -18,6 +21,27 @@ def catalog_regression(data_regression, sample_data_dir):
     return check
 
 
+def _decode_categorical(df: pd.DataFrame) -> pd.DataFrame:
+    return df.astype({column: object for column in df.select_dtypes("category").columns})
+
+
+def test_encode_categorical():
+    values = pd.Series(["b", "a", "b", "b", "a", "b"], index=list("uvwxyz"), name="source_id")
+
+    res = encode_categorical(values)
+
+    assert res.cat.categories.tolist() == ["a", "b"]
+    assert res.index.equals(values.index)
+    assert res.name == "source_id"
+    pd.testing.assert_series_equal(res.astype(object), values)
+
+
+def test_encode_categorical_high_cardinality():
+    values = pd.Series(["a", "b", "c", "a"])
+
+    assert encode_categorical(values) is values
+
+
 def test_parse_datetime():
     pd.testing.assert_series_equal(
         _parse_datetime(pd.Series(["2021-01-01 00:00:00", "1850-01-17 00:29:59.999993", None])),
@@ -60,7 +84,9 @@ class TestCMIP6Adapter:
 
         # TODO: start_time has a different dtype from the database due to pandas dt coercion
         db_data_catalog["start_time"] = db_data_catalog["start_time"].astype(object)
-        pd.testing.assert_frame_equal(local_data_catalog, db_data_catalog, check_like=True)
+        pd.testing.assert_frame_equal(
+            local_data_catalog, _decode_categorical(db_data_catalog), check_like=True
+        )
 
     def test_load_local_datasets(self, sample_data_dir, catalog_regression):
         adapter = CMIP6DatasetAdapter()
@@ -99,3 +125,89 @@ def test_apply_fixes():
         }
     )
     pd.testing.assert_frame_equal(res, exp)
+
+
+class TestCMIP6AdapterLoadCatalog:
+    def test_columns(self, db_synthetic):
+        adapter = CMIP6DatasetAdapter()
+        full = adapter.load_catalog(db_synthetic)
+
+        projected = adapter.load_catalog(db_synthetic, columns=["variable_id", "path", "source_id"])
+
+        # The slug column is always included and the columns are in the same order as the full catalog
+        assert projected.columns.tolist() == ["path", "source_id", "variable_id", "instance_id"]
+        pd.testing.assert_frame_equal(projected, full[projected.columns.tolist()])
+
+    def test_columns_datasets(self, db_synthetic):
+        adapter = CMIP6DatasetAdapter()
+
+        projected = adapter.load_catalog(db_synthetic, include_files=False, columns=["source_id"])
+
+        assert projected.columns.tolist() == ["source_id", "instance_id"]
+        assert projected.index.is_unique
+
+    def test_time_dtype(self, db_synthetic):
+        catalog = CMIP6DatasetAdapter().load_catalog(db_synthetic)
+
+        assert catalog["start_time"].dtype == "datetime64[us]"
+        assert catalog["end_time"].dtype == "datetime64[us]"
+
+    def test_unknown_columns(self, db):
+        with pytest.raises(ValueError, match=r"Unknown columns for CMIP6DatasetAdapter: \['missing'\]"):
+            CMIP6DatasetAdapter().load_catalog(db, columns=["source_id", "missing"])
+
+    def test_dataset_ids(self, db_synthetic):
+        adapter = CMIP6DatasetAdapter()
+        full = adapter.load_catalog(db_synthetic)
+        dataset_ids = full.index.unique()[[0, 5]]
+
+        subset = adapter.load_catalog(db_synthetic, dataset_ids=dataset_ids)
+
+        assert set(subset.index) == set(dataset_ids)
+        # The categories depend on which datasets were loaded
+        pd.testing.assert_frame_equal(
+            _decode_categorical(subset), _decode_categorical(full.loc[subset.index.unique()])
+        )
+
+    def test_categorical_facets(self, db_synthetic):
+        catalog = CMIP6DatasetAdapter().load_catalog(db_synthetic)
+
+        assert isinstance(catalog["source_id"].dtype, pd.CategoricalDtype)
+        assert isinstance(catalog["variable_id"].dtype, pd.CategoricalDtype)
+        assert catalog["source_id"].cat.categories.is_monotonic_increasing
+        # File specific metadata is unique per row
+        assert not isinstance(catalog["path"].dtype, pd.CategoricalDtype)
+
+    def test_categorical_apply_filters_groupby(self, db_synthetic):
+        catalog = CMIP6DatasetAdapter().load_catalog(db_synthetic)
+        variable_id = catalog["variable_id"].cat.categories[0]
+        requirement = DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(FacetFilter({"variable_id": variable_id}),),
+            group_by=("source_id", "variable_id"),
+        )
+
+        filtered = requirement.apply_filters(catalog)
+        expected = requirement.apply_filters(_decode_categorical(catalog))
+
+        # The same datasets are selected, and the filtered catalog keeps all the categories
+        pd.testing.assert_frame_equal(_decode_categorical(filtered), expected)
+        assert filtered["variable_id"].cat.categories.equals(catalog["variable_id"].cat.categories)
+
+        # Grouping without observed=True also creates an empty group for each unused category
+        group_by = list(requirement.group_by)
+        expected_groups = dict(list(expected.groupby(group_by)))
+        with pytest.warns(FutureWarning, match="observed=False"):
+            groups = dict(list(filtered.groupby(group_by)))
+        with pytest.warns(FutureWarning, match="observed=False"):
+            sizes = filtered.groupby(group_by).size()
+        assert groups.keys() == expected_groups.keys()
+        for key, group in expected_groups.items():
+            pd.testing.assert_frame_equal(_decode_categorical(groups[key]), group)
+        assert (sizes == 0).any()
+        assert sizes[sizes > 0].to_dict() == expected.groupby(group_by).size().to_dict()
+
+        # Iterating over the groups of a single categorical column includes the empty groups
+        with pytest.warns(FutureWarning, match="observed=False"):
+            assert len(list(filtered.groupby("source_id"))) == len(catalog["source_id"].cat.categories)
+        assert len(list(filtered.groupby("source_id", observed=True))) == expected["source_id"].nunique()
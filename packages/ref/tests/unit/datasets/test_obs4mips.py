@@ -114,6 +114,10 @@ class Testobs4MIPsAdapter:
         db_data_catalog["start_time"] = db_data_catalog["start_time"].astype(object)
         db_data_catalog["end_time"] = db_data_catalog["end_time"].astype(object)
         db_data_catalog["vertical_levels"] = db_data_catalog["vertical_levels"].astype(float)
+        # Facets are loaded as categorical columns
+        db_data_catalog = db_data_catalog.astype(
+            {column: object for column in db_data_catalog.select_dtypes("category").columns}
+        )
         pd.testing.assert_frame_equal(local_data_catalog, db_data_catalog, check_like=True)
 
     def test_load_local_datasets(self, sample_data_dir, catalog_regression):
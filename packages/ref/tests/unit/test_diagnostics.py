@@ -0,0 +1,78 @@
+import pytest
+
+from cmip_ref.diagnostics import MetricDiagnostics, Rejection, SolveDiagnostics
+from cmip_ref_core.constraints import RequireFacets
+
+
+class TestMetricDiagnostics:
+    def test_reject(self):
+        diagnostics = MetricDiagnostics(provider="provider", metric="metric")
+        constraint = RequireFacets("variable_id", ("tas",))
+
+        diagnostics.reject("cmip6", constraint, {"source_id": "A"}, 2, "Missing variable_id: tas")
+
+        assert diagnostics.rejections == [
+            Rejection(
+                source_type="cmip6",
+                constraint=constraint,
+                group=(("source_id", "A"),),
+                n_files=2,
+                reason="Missing variable_id: tas",
+            )
+        ]
+
+    def test_reject_default_reason(self):
+        diagnostics = MetricDiagnostics(provider="provider", metric="metric")
+
+        diagnostics.reject("cmip6", RequireFacets("variable_id", ("tas",)), {}, 2)
+
+        assert diagnostics.rejections[0].reason == (
+            "RequireFacets(dimension='variable_id', required_facets=('tas',)) not satisfied"
+        )
+
+
+class TestSolveDiagnostics:
+    @pytest.fixture
+    def diagnostics(self):
+        diagnostics = SolveDiagnostics()
+        diagnostics.get("provider", "metric").reject(
+            "cmip6",
+            RequireFacets("variable_id", ("tas",)),
+            {"source_id": "A", "member_id": "r1i1p1f1"},
+            3,
+        )
+        diagnostics.get("provider", "other")
+        return diagnostics
+
+    def test_get(self, diagnostics):
+        assert diagnostics.get("provider", "metric") is diagnostics.metrics[("provider", "metric")]
+
+    def test_add(self, diagnostics):
+        other = MetricDiagnostics(provider="provider", metric="metric")
+        other.reject("cmip6", RequireFacets("variable_id", ("pr",)), {}, 1)
+
+        diagnostics.add(other)
+
+        rejections = diagnostics.get("provider", "metric").rejections
+        assert [rejection.n_files for rejection in rejections] == [3, 1]
+
+    def test_to_frame(self, diagnostics):
+        frame = diagnostics.to_frame()
+
+        assert frame.to_dict(orient="records") == [
+            {
+                "provider": "provider",
+                "metric": "metric",
+                "source_type": "cmip6",
+                "constraint": "RequireFacets",
+                "group": "source_id=A, member_id=r1i1p1f1",
+                "n_files": 3,
+                "reason": "RequireFacets(dimension='variable_id', required_facets=('tas',)) not satisfied",
+            }
+        ]
+
+    def test_to_frame_empty(self):
+        frame = SolveDiagnostics().to_frame()
+
+        assert len(frame) == 0
+        assert "reason" in frame.columns
@@ -0,0 +1,232 @@
+import pandas as pd
+import pytest
+
+from cmip_ref.config import ExecutorConfig
+from cmip_ref.datasets.cmip6 import CMIP6DatasetAdapter
+from cmip_ref.models import MetricExecutionResult
+from cmip_ref.plan import (
+    PLAN_COLUMNS,
+    build_plan,
+    execute_plan,
+    load_plan_candidates,
+    plan_metrics,
+    read_plan,
+    select_shard,
+    write_plan,
+)
+from cmip_ref.provider_registry import ProviderRegistry, _register_provider
+from cmip_ref.solver import MetricSolver
+from cmip_ref_core.constraints import SelectTimerange
+from cmip_ref_core.datasets import FacetFilter, SourceDatasetType
+from cmip_ref_core.metrics import DataRequirement, Metric, MetricExecutionDefinition, MetricResult
+from cmip_ref_core.providers import MetricsProvider
+
+
+class SourceMetric(Metric):
+    name = "source"
+    slug = "source"
+
+    data_requirements = (
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(),
+            group_by=("source_id",),
+        ),
+    )
+
+    def run(self, definition: MetricExecutionDefinition) -> MetricResult:
+        raise NotImplementedError
+
+
+class TimerangeMetric(Metric):
+    name = "timerange"
+    slug = "timerange"
+
+    data_requirements = (
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(FacetFilter(facets={"variable_id": "tas"}),),
+            group_by=("instance_id",),
+            constraints=(SelectTimerange(start="2030-01-01", end="2050-01-01"),),
+        ),
+    )
+
+    def run(self, definition: MetricExecutionDefinition) -> MetricResult:
+        raise NotImplementedError
+
+
+@pytest.fixture
+def metrics_provider():
+    metrics_provider = MetricsProvider("mock_provider", "v0.1.0")
+    metrics_provider.register(SourceMetric())
+    return metrics_provider
+
+
+@pytest.fixture
+def data_catalog(tmp_path):
+    paths = []
+    for i, size in enumerate([10, 20, 500]):
+        path = tmp_path / f"file_{i}.nc"
+        path.write_bytes(b"0" * size)
+        paths.append(str(path))
+
+    return pd.DataFrame(
+        {
+            "source_id": ["ACCESS-ESM1-5", "CESM2", "CESM2", "MIROC6"],
+            "instance_id": ["a", "b", "b", "c"],
+            "path": [paths[0], paths[1], paths[2], str(tmp_path / "missing.nc")],
+        },
+        index=[1, 2, 2, 3],
+    )
+
+
+@pytest.fixture
+def plan(db, config, metrics_provider, data_catalog):
+    solver = MetricSolver(
+        provider_registry=ProviderRegistry(providers=[metrics_provider]),
+        data_catalog={SourceDatasetType.CMIP6: data_catalog},
+    )
+    return plan_metrics(db, config=config, solver=solver)
+
+
+def test_plan_metrics(plan, data_catalog):
+    assert tuple(plan.columns) == PLAN_COLUMNS
+    assert plan["key"].tolist() == ["dataset1_CESM2", "dataset1_ACCESS-ESM1-5", "dataset1_MIROC6"]
+    assert plan["n_files"].tolist() == [2, 1, 1]
+    # Missing files don't contribute to the size
+    assert plan["total_bytes"].tolist() == [520, 10, 0]
+    assert plan["datasets"].tolist() == [{"cmip6": [2]}, {"cmip6": [1]}, {"cmip6": [3]}]
+    assert plan["paths"].tolist() == [{"cmip6": data_catalog.loc[[2], "path"].tolist()}] + [
+        {"cmip6": [path]} for path in data_catalog.loc[[1, 3], "path"]
+    ]
+    assert (plan["provider"] == "mock_provider").all()
+    assert (plan["provider_version"] == "v0.1.0").all()
+
+
+def test_build_plan_empty():
+    plan = build_plan([])
+
+    assert tuple(plan.columns) == PLAN_COLUMNS
+    assert len(plan) == 0
+
+
+@pytest.mark.parametrize("filename", ["plan.jsonl", "plan.parquet"])
+def test_write_plan_roundtrip(tmp_path, plan, filename):
+    if filename.endswith(".parquet"):
+        pytest.importorskip("pyarrow")
+
+    write_plan(plan, tmp_path / filename)
+    loaded = read_plan(tmp_path / filename)
+
+    pd.testing.assert_frame_equal(
+        loaded.drop(columns=["datasets", "paths"]), plan.drop(columns=["datasets", "paths"])
+    )
+    for column in ["datasets", "paths"]:
+        assert [{key: list(value) for key, value in item.items()} for item in loaded[column]] == plan[
+            column
+        ].tolist()
+
+
+@pytest.mark.parametrize(
+    "shard,n_shards,expected",
+    [
+        (1, 1, [0, 1, 2, 3, 4]),
+        (1, 2, [0, 2, 4]),
+        (2, 2, [1, 3]),
+        (3, 3, [2]),
+    ],
+)
+def test_select_shard(shard, n_shards, expected):
+    plan = pd.DataFrame({"key": range(5)})
+
+    assert select_shard(plan, shard, n_shards)["key"].tolist() == expected
+
+
+@pytest.mark.parametrize("shard,n_shards", [(0, 1), (2, 1), (1, 0)])
+def test_select_shard_invalid(shard, n_shards):
+    with pytest.raises(ValueError, match="Invalid shard"):
+        select_shard(pd.DataFrame({"key": range(5)}), shard, n_shards)
+
+
+def test_load_plan_candidates(plan, config, metrics_provider, data_catalog):
+    registry = ProviderRegistry(providers=[metrics_provider])
+
+    candidates = load_plan_candidates(plan, registry, {SourceDatasetType.CMIP6: data_catalog}, config)
+
+    assert [definition.key for _, definition in candidates] == plan["key"].tolist()
+    assert [definition.metric_dataset.hash for _, definition in candidates] == plan["dataset_hash"].tolist()
+    assert candidates[0][0].metric is metrics_provider.get("source")
+
+
+def test_load_plan_candidates_changed(plan, config, metrics_provider, data_catalog):
+    registry = ProviderRegistry(providers=[metrics_provider])
+    # The CESM2 dataset has been replaced and the MIROC6 dataset has been removed
+    data_catalog = data_catalog.iloc[:3].copy()
+    data_catalog.loc[2, "instance_id"] = "b-new"
+
+    candidates = load_plan_candidates(plan, registry, {SourceDatasetType.CMIP6: data_catalog}, config)
+
+    assert [definition.key for _, definition in candidates] == ["dataset1_ACCESS-ESM1-5"]
+
+
+def test_load_plan_candidates_missing_provider(plan, config, data_catalog):
+    other_provider = MetricsProvider("other_provider", "v0.1.0")
+
+    candidates = load_plan_candidates(
+        plan,
+        ProviderRegistry(providers=[other_provider]),
+        {SourceDatasetType.CMIP6: data_catalog},
+        config,
+    )
+
+    assert candidates == []
+
+
+def test_execute_plan(mocker, db_synthetic, config, metrics_provider):
+    with db_synthetic.session.begin():
+        _register_provider(db_synthetic, metrics_provider)
+    mocker.patch.object(
+        ProviderRegistry,
+        "build_from_config",
+        return_value=ProviderRegistry(providers=[metrics_provider]),
+    )
+    mock_executor = mocker.patch.object(ExecutorConfig, "build")
+    with db_synthetic.session.begin():
+        plan = plan_metrics(db_synthetic, config=config)
+    shard = select_shard(plan, 1, 2)
+
+    # The data catalog is loaded from the database using only the columns required by the metrics
+    with db_synthetic.session.begin():
+        execute_plan(db_synthetic, shard, config=config)
+
+    assert mock_executor.return_value.run_metric.call_count == len(shard)
+    submitted = [call.kwargs["definition"] for call in mock_executor.return_value.run_metric.call_args_list]
+    assert [definition.key for definition in submitted] == shard["key"].tolist()
+    with db_synthetic.session.begin():
+        assert db_synthetic.session.query(MetricExecutionResult).count() == len(shard)
+        assert len(plan) == CMIP6DatasetAdapter().load_catalog(db_synthetic)["source_id"].nunique()
+
+
+def test_execute_plan_selected_files(mocker, db_synthetic, config):
+    metrics_provider = MetricsProvider("timerange_provider", "v0.1.0")
+    metrics_provider.register(TimerangeMetric())
+    with db_synthetic.session.begin():
+        _register_provider(db_synthetic, metrics_provider)
+    mocker.patch.object(
+        ProviderRegistry,
+        "build_from_config",
+        return_value=ProviderRegistry(providers=[metrics_provider]),
+    )
+    mock_executor = mocker.patch.object(ExecutorConfig, "build")
+    with db_synthetic.session.begin():
+        plan = plan_metrics(db_synthetic, config=config)
+
+    with db_synthetic.session.begin():
+        execute_plan(db_synthetic, plan, config=config)
+
+    # The executions are rebuilt from the files selected by the constraints rather than the whole datasets
+    submitted = [call.kwargs["definition"] for call in mock_executor.return_value.run_metric.call_args_list]
+    assert [definition.metric_dataset.hash for definition in submitted] == plan["dataset_hash"].tolist()
+    assert [
+        len(definition.metric_dataset[SourceDatasetType.CMIP6].datasets) for definition in submitted
+    ] == plan["n_files"].tolist()
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from cmip_ref.profiling import MetricProfile, SolveProfile, timer
+
+
+class TestMetricProfile:
+    def test_timer(self):
+        profile = MetricProfile(provider="provider", metric="metric")
+
+        with profile.timer("apply_filters"):
+            pass
+        with profile.timer("apply_filters"):
+            pass
+
+        assert list(profile.timings) == ["apply_filters"]
+        assert profile.timings["apply_filters"] >= 0
+
+    def test_timer_exception(self):
+        profile = MetricProfile(provider="provider", metric="metric")
+
+        with pytest.raises(ValueError):
+            with profile.timer("groupby"):
+                raise ValueError()
+
+        assert "groupby" in profile.timings
+
+    def test_timer_disabled(self):
+        with timer(None, "apply_filters"):
+            pass
+
+    def test_merge(self):
+        profile = MetricProfile(
+            provider="provider", metric="metric", timings={"groupby": 1.0}, n_groups=2, rejected={"A": 1}
+        )
+        profile.merge(
+            MetricProfile(
+                provider="provider",
+                metric="metric",
+                timings={"groupby": 2.0, "A": 1.0},
+                n_groups=3,
+                rejected={"A": 1, "B": 2},
+            )
+        )
+
+        assert profile.timings == {"groupby": 3.0, "A": 1.0}
+        assert profile.n_groups == 5
+        assert profile.rejected == {"A": 2, "B": 2}
+
+
+class TestSolveProfile:
+    @pytest.fixture
+    def solve_profile(self):
+        solve_profile = SolveProfile()
+        fast = solve_profile.get("provider", "fast")
+        fast.timings["apply_filters"] = 0.5
+        fast.n_groups = 1
+
+        slow = solve_profile.get("provider", "slow")
+        slow.timings.update({"apply_filters": 1.0, "RequireFacets": 2.0})
+        slow.n_groups = 4
+        slow.rejected["RequireFacets"] = 3
+        return solve_profile
+
+    def test_get(self, solve_profile):
+        assert solve_profile.get("provider", "fast") is solve_profile.metrics[("provider", "fast")]
+
+    def test_add(self, solve_profile):
+        solve_profile.add(MetricProfile(provider="provider", metric="fast", n_groups=2))
+        solve_profile.add(MetricProfile(provider="other", metric="fast", n_groups=2))
+
+        assert solve_profile.get("provider", "fast").n_groups == 3
+        assert solve_profile.get("other", "fast").n_groups == 2
+
+    def test_to_frame(self, solve_profile):
+        frame = solve_profile.to_frame()
+
+        assert frame["metric"].tolist() == ["slow", "fast"]
+        assert frame["total_time"].tolist() == [3.0, 0.5]
+        assert frame["n_rejected"].tolist() == [3, 0]
+        assert frame["rejected.RequireFacets"].tolist() == [3, 0]
+        assert frame["time.RequireFacets"].tolist() == [2.0, 0]
+
+    def test_to_frame_empty(self):
+        frame = SolveProfile().to_frame()
+
+        assert frame.columns.tolist() == ["provider", "metric", "total_time", "n_groups", "n_rejected"]
+        assert len(frame) == 0
+
+    def test_to_dict(self, solve_profile):
+        result = json.loads(json.dumps(solve_profile.to_dict()))
+
+        assert result[1] == {
+            "provider": "provider",
+            "metric": "slow",
+            "n_groups": 4,
+            "n_rejected": 3,
+            "timings": {"apply_filters": 1.0, "RequireFacets": 2.0},
+            "rejected": {"RequireFacets": 3},
+        }
@@ -0,0 +1,106 @@
+import pandas as pd
+import pytest
+
+from cmip_ref.requirement_index import RequirementIndex, get_kept_values
+from cmip_ref_core.datasets import FacetFilter, SourceDatasetType
+from cmip_ref_core.metrics import DataRequirement, Metric
+from cmip_ref_core.providers import MetricsProvider
+
+
+def _requirement(*filters, source_type=SourceDatasetType.CMIP6):
+    return DataRequirement(source_type=source_type, filters=filters, group_by=None)
+
+
+class MockMetric(Metric):
+    name = "mock"
+
+    def __init__(self, slug, *data_requirements):
+        super().__init__()
+        self.slug = slug
+        self.data_requirements = data_requirements
+
+    def run(self, definition):
+        raise NotImplementedError
+
+
+@pytest.fixture
+def provider():
+    provider = MetricsProvider("provider", "v0.1.0")
+    provider.register(MockMetric("tas", _requirement(FacetFilter({"variable_id": "tas"}))))
+    provider.register(
+        MockMetric(
+            "tas-historical",
+            _requirement(
+                FacetFilter({"variable_id": ("tas", "pr")}),
+                FacetFilter({"variable_id": "tas", "experiment_id": "historical"}),
+            ),
+        )
+    )
+    provider.register(
+        MockMetric(
+            "model-vs-obs",
+            _requirement(FacetFilter({"variable_id": "pr"})),
+            _requirement(FacetFilter({"variable_id": "pr"}), source_type=SourceDatasetType.obs4MIPs),
+        )
+    )
+    provider.register(MockMetric("everything", _requirement(FacetFilter({"variable_id": "tas"}, keep=False))))
+    return provider
+
+
+def test_get_kept_values():
+    requirement = _requirement(
+        FacetFilter({"variable_id": ("tas", "pr"), "table_id": "Amon"}),
+        FacetFilter({"variable_id": ("pr", "rsut")}),
+        FacetFilter({"source_id": "A"}, keep=False),
+    )
+
+    assert get_kept_values(requirement) == {
+        "variable_id": frozenset({"pr"}),
+        "table_id": frozenset({"Amon"}),
+    }
+
+
+def test_get_kept_values_patterns():
+    requirement = _requirement(
+        FacetFilter({"variable_id": "tas", "experiment_id": ("hist-*", "historical")}),
+        FacetFilter({"experiment_id": "historical"}),
+    )
+
+    # The values matched by a pattern aren't known so the facet is only constrained by the other filters
+    assert get_kept_values(requirement) == {
+        "variable_id": frozenset({"tas"}),
+        "experiment_id": frozenset({"historical"}),
+    }
+
+
+@pytest.mark.parametrize(
+    "datasets, expected",
+    [
+        ({"variable_id": ["tas"], "experiment_id": ["ssp126"]}, ["tas", "everything"]),
+        ({"variable_id": ["tas"], "experiment_id": ["historical"]}, ["tas", "tas-historical", "everything"]),
+        (
+            {"variable_id": ["rsut", "pr"], "experiment_id": ["historical", "ssp126"]},
+            ["model-vs-obs", "everything"],
+        ),
+        ({"variable_id": ["rsut"], "experiment_id": ["historical"]}, ["everything"]),
+        # A requirement can't match if a facet it filters on is missing
+        ({"variable_id": ["tas"]}, ["tas", "everything"]),
+        ({"variable_id": []}, []),
+    ],
+)
+def test_match_metrics(provider, datasets, expected):
+    index = RequirementIndex.build((provider, metric) for metric in provider.metrics())
+
+    matched = index.match_metrics({SourceDatasetType.CMIP6: pd.DataFrame(datasets)})
+
+    assert [metric.slug for _, metric in matched] == expected
+    assert all(matched_provider is provider for matched_provider, _ in matched)
+
+
+def test_match_source_type(provider):
+    index = RequirementIndex.build((provider, metric) for metric in provider.metrics())
+
+    assert index.match(SourceDatasetType.obs4MIPs, pd.DataFrame({"variable_id": ["tas"]})) == []
+    positions = index.match(SourceDatasetType.obs4MIPs, pd.DataFrame({"variable_id": ["pr"]}))
+    assert [index.entries[position][2].source_type for position in positions] == [SourceDatasetType.obs4MIPs]
+    assert index.match(SourceDatasetType.CMIP7, pd.DataFrame({"variable_id": ["pr"]})) == []
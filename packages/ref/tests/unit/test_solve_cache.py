@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cmip_ref.models import SolveCacheEntry
+from cmip_ref.solve_cache import SolveCache, catalog_fingerprint, requirement_hash
+from cmip_ref.solver import extract_covered_datasets
+from cmip_ref.testing import generate_cmip6_catalog
+from cmip_ref_core.constraints import AddSupplementaryDataset, RequireFacets
+from cmip_ref_core.datasets import FacetFilter, SourceDatasetType
+from cmip_ref_core.metrics import DataRequirement
+
+KEY = ("provider", "v0.1.0", "metric", "hash")
+
+
+@pytest.fixture(scope="module")
+def data_catalog():
+    return generate_cmip6_catalog(500)
+
+
+@pytest.fixture
+def requirement():
+    return DataRequirement(
+        source_type=SourceDatasetType.CMIP6,
+        filters=(FacetFilter(facets={"variable_id": ("tas", "pr"), "frequency": "mon"}),),
+        group_by=("source_id", "member_id", "experiment_id"),
+        constraints=(
+            RequireFacets("variable_id", ("tas", "pr")),
+            AddSupplementaryDataset.from_defaults("areacella", SourceDatasetType.CMIP6),
+        ),
+    )
+
+
+def test_requirement_hash(requirement, mock_metric):
+    assert requirement_hash(mock_metric, requirement) == requirement_hash(
+        mock_metric,
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(FacetFilter(facets={"variable_id": ("tas", "pr"), "frequency": "mon"}),),
+            group_by=("source_id", "member_id", "experiment_id"),
+            constraints=(
+                RequireFacets("variable_id", ("tas", "pr")),
+                AddSupplementaryDataset.from_defaults("areacella", SourceDatasetType.CMIP6),
+            ),
+        ),
+    )
+    assert requirement_hash(mock_metric, requirement) != requirement_hash(
+        mock_metric,
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(FacetFilter(facets={"variable_id": ("tas", "pr"), "frequency": "mon"}),),
+            group_by=("source_id", "experiment_id"),
+        ),
+    )
+
+
+def test_requirement_hash_package_version(requirement, mock_metric, mocker):
+    expected = requirement_hash(mock_metric, requirement)
+
+    mocker.patch("cmip_ref.solve_cache.get_package_version", return_value="99.0.0")
+
+    assert requirement_hash(mock_metric, requirement) != expected
+
+
+def test_catalog_fingerprint(data_catalog):
+    fingerprint = catalog_fingerprint(data_catalog)
+
+    assert catalog_fingerprint(data_catalog.copy()) == fingerprint
+    assert catalog_fingerprint(data_catalog.iloc[::-1]) != fingerprint
+    assert catalog_fingerprint(data_catalog.iloc[1:]) != fingerprint
+    assert catalog_fingerprint(data_catalog.rename(columns={"path": "file"})) != fingerprint
+
+    modified = data_catalog.copy()
+    modified.iloc[0, modified.columns.get_loc("version")] = "v0"
+    assert catalog_fingerprint(modified) != fingerprint
+
+
+def test_get_put(data_catalog, requirement):
+    groups = extract_covered_datasets(data_catalog, requirement)
+    assert groups
+    fingerprint = catalog_fingerprint(data_catalog)
+    cache = SolveCache()
+
+    assert cache.get(KEY, data_catalog, fingerprint) is None
+    cache.put(KEY, data_catalog, fingerprint, groups)
+    assert cache.updated == {KEY}
+
+    cached = cache.get(KEY, data_catalog, fingerprint)
+    assert len(cached) == len(groups)
+    for cached_group, group in zip(cached, groups):
+        pd.testing.assert_frame_equal(cached_group, group)
+
+    # The groups aren't reused for a different data catalog
+    assert cache.get(KEY, data_catalog.iloc[1:], catalog_fingerprint(data_catalog.iloc[1:])) is None
+
+
+def test_put_partial_dataset(data_catalog):
+    # Only some of the files of a dataset are included in the group
+    dataset_id = data_catalog.index[data_catalog.index.duplicated()][0]
+    group = data_catalog.loc[[dataset_id]].iloc[:1]
+    fingerprint = catalog_fingerprint(data_catalog)
+    cache = SolveCache()
+
+    cache.put(KEY, data_catalog, fingerprint, [group])
+
+    assert cache.get(KEY, data_catalog, fingerprint) is None
+    assert not cache.updated
+
+
+def test_put_empty_group(data_catalog):
+    fingerprint = catalog_fingerprint(data_catalog)
+    cache = SolveCache()
+
+    cache.put(KEY, data_catalog, fingerprint, [data_catalog.iloc[0:0]])
+
+    cached = cache.get(KEY, data_catalog, fingerprint)
+    assert len(cached) == 1
+    assert cached[0].empty
+
+
+def test_pop_updates_merge(data_catalog):
+    fingerprint = catalog_fingerprint(data_catalog)
+    worker_cache = SolveCache()
+    worker_cache.put(KEY, data_catalog, fingerprint, [data_catalog.iloc[0:0]])
+
+    updates = worker_cache.pop_updates()
+    assert not worker_cache.updated
+
+    cache = SolveCache()
+    cache.merge(updates)
+    assert cache.updated == {KEY}
+    assert cache.entries[KEY].groups == [[]]
+
+
+def test_save_load(db):
+    cache = SolveCache()
+    data_catalog = pd.DataFrame({"variable_id": ["tas", "tas", "pr"]}, index=[1, 1, 2])
+    fingerprint = catalog_fingerprint(data_catalog)
+    cache.put(KEY, data_catalog, fingerprint, [data_catalog.iloc[:2], data_catalog])
+
+    with db.session.begin():
+        cache.save(db)
+    assert not cache.updated
+
+    with db.session.begin():
+        loaded = SolveCache.load(db)
+    assert loaded.entries == cache.entries
+    assert loaded.entries[KEY].groups == [[1], [1, 2]]
+
+    # Existing entries are updated
+    cache.put(KEY, data_catalog, "other", [data_catalog.iloc[2:]])
+    with db.session.begin():
+        cache.save(db)
+
+    with db.session.begin():
+        assert db.session.query(SolveCacheEntry).count() == 1
+        loaded = SolveCache.load(db)
+    assert loaded.entries[KEY].catalog_fingerprint == "other"
+    assert loaded.entries[KEY].groups == [[2]]
+    np.testing.assert_array_equal(loaded.get(KEY, data_catalog, "other")[0].index, [2])
@@ -1,16 +1,49 @@
+import threading
 from unittest import mock
 
 import pandas as pd
 import pytest
+import sqlalchemy
 from cmip_ref_metrics_example import provider
 
+from cmip_ref import solver as solver_module
 from cmip_ref.config import ExecutorConfig
-from cmip_ref.models import MetricExecutionResult
-from cmip_ref.provider_registry import ProviderRegistry
-from cmip_ref.solver import MetricExecution, MetricSolver, extract_covered_datasets, solve_metrics
-from cmip_ref_core.constraints import RequireFacets, SelectParentExperiment
-from cmip_ref_core.datasets import SourceDatasetType
-from cmip_ref_core.metrics import DataRequirement, FacetFilter
+from cmip_ref.datasets.cmip6 import CMIP6DatasetAdapter
+from cmip_ref.diagnostics import Rejection, SolveDiagnostics
+from cmip_ref.models import MetricExecution as MetricExecutionModel
+from cmip_ref.models import MetricExecutionResult, SolveCacheEntry, SolveWatermark
+from cmip_ref.models.dataset import CMIP6Dataset
+from cmip_ref.profiling import SolveProfile
+from cmip_ref.provider_registry import ProviderRegistry, _register_provider
+from cmip_ref.solve_cache import SolveCache
+from cmip_ref.solver import (
+    MetricExecution,
+    MetricSolver,
+    build_solver,
+    extract_covered_datasets,
+    get_required_columns,
+    join_dataset_groups,
+    select_metrics,
+    solve_and_submit,
+    solve_metrics,
+)
+from cmip_ref_core.constraints import (
+    AddSupplementaryDataset,
+    RequireFacets,
+    RequireOverlappingTimerange,
+    SelectParentExperiment,
+    SelectTimerange,
+)
+from cmip_ref_core.datasets import DatasetCollection, MetricDataset, SourceDatasetType
+from cmip_ref_core.exceptions import InvalidMetricException
+from cmip_ref_core.metrics import (
+    DataRequirement,
+    FacetFilter,
+    Metric,
+    MetricExecutionDefinition,
+    MetricResult,
+)
+from cmip_ref_core.providers import MetricsProvider
 
 
 @pytest.fixture
@@ -47,6 +80,17 @@ class TestMetricSolver:
         assert len(solver.data_catalog[SourceDatasetType.CMIP6])
 
 
+_PARENT_FACETS = {
+    "source_id": "A",
+    "variant_label": "r1i1p1f1",
+    "parent_source_id": "A",
+    "parent_variant_label": "r1i1p1f1",
+    "table_id": "Amon",
+    "grid_label": "gn",
+    "version": "v20200101",
+}
+
+
 @pytest.mark.parametrize(
     "requirement,data_catalog,expected",
     [
@@ -141,19 +185,29 @@ class TestMetricSolver:
                     "variable_id": ["tas", "tas"],
                     "experiment_id": ["ssp119", "historical"],
                     "parent_experiment_id": ["historical", "none"],
+                    **_PARENT_FACETS,
                 }
             ),
             [
+                pd.DataFrame(
+                    {
+                        "variable_id": ["tas"],
+                        "experiment_id": ["historical"],
+                        "parent_experiment_id": ["none"],
+                        **_PARENT_FACETS,
+                    },
+                    index=[1],
+                ),
                 pd.DataFrame(
                     {
                         "variable_id": ["tas", "tas"],
-                        "experiment_id": ["historical", "ssp119"],
+                        "experiment_id": ["ssp119", "historical"],
+                        "parent_experiment_id": ["historical", "none"],
+                        **_PARENT_FACETS,
                     },
-                    # The order of the rows is not guaranteed
-                    index=[1, 0],
+                    index=[0, 1],
                 ),
             ],
-            marks=[pytest.mark.xfail(reason="Parent experiment not implemented")],
             id="parent",
         ),
         pytest.param(
@@ -190,12 +244,543 @@ def test_data_coverage(requirement, data_catalog, expected):
     assert len(result) == len(expected)
 
 
+@pytest.mark.parametrize(
+    "group_by,changed_datasets,expected_indices",
+    [
+        (("experiment_id",), set(), []),
+        (("experiment_id",), {3}, [[3]]),
+        (("experiment_id",), {1}, [[1, 2]]),
+        (("experiment_id",), {1, 3}, [[1, 2], [3]]),
+        (("experiment_id",), {4}, []),
+        (None, {3}, [[1, 2, 3]]),
+        (None, {4}, []),
+    ],
+)
+def test_data_coverage_changed(group_by, changed_datasets, expected_indices):
+    requirement = DataRequirement(
+        source_type=SourceDatasetType.CMIP6,
+        filters=(FacetFilter(facets={"variable_id": ("tas", "pr")}),),
+        group_by=group_by,
+    )
+    data_catalog = pd.DataFrame(
+        {
+            "variable_id": ["tas", "pr", "tas", "rsut"],
+            "experiment_id": ["ssp119", "ssp119", "ssp126", "ssp126"],
+        },
+        index=[1, 2, 3, 4],
+    )
+
+    result = extract_covered_datasets(data_catalog, requirement, changed_datasets)
+
+    assert [group.index.tolist() for group in result] == expected_indices
+
+
+class _PerGroupValidator:
+    """
+    Hides the batch validation method of a validator
+    """
+
+    def __init__(self, validator):
+        self.validator = validator
+
+    def validate(self, group: pd.DataFrame) -> bool:
+        return self.validator.validate(group)
+
+
+def test_data_coverage_batch_validation():
+    validators = (
+        RequireFacets("variable_id", ("tas", "pr")),
+        RequireOverlappingTimerange(group_by=("variable_id",)),
+    )
+    constraints = (
+        AddSupplementaryDataset.from_defaults("areacella", SourceDatasetType.CMIP6),
+        RequireFacets("variable_id", ("areacella",)),
+    )
+    data_catalog = pd.DataFrame(
+        {
+            "variable_id": ["tas", "pr", "tas", "pr", "tas", "tas", "pr", "areacella"],
+            "source_id": ["A", "A", "B", "B", "C", "D", "D", "A"],
+            "grid_label": "gn",
+            "table_id": "Amon",
+            "experiment_id": "historical",
+            "member_id": "r1i1p1f1",
+            "version": "v1",
+            "start_time": pd.to_datetime(
+                ["2000-01-01", "2001-01-01", "2000-01-01", "2005-01-01", "2000-01-01"] + ["2000-01-01"] * 3
+            ),
+            "end_time": pd.to_datetime(
+                ["2004-12-31", "2003-12-31", "2001-12-31", "2006-12-31", "2001-12-31"] + ["2000-12-31"] * 3
+            ),
+        },
+        index=[10, 11, 12, 13, 14, 15, 16, 17],
+    )
+    data_catalog.loc[17, ["start_time", "end_time"]] = pd.NaT
+
+    def _extract(requirement_validators, profile=None, diagnostics=None):
+        requirement = DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(FacetFilter(facets={"variable_id": ("tas", "pr")}),),
+            group_by=("source_id",),
+            constraints=(*requirement_validators, *constraints),
+        )
+        return extract_covered_datasets(data_catalog, requirement, profile=profile, diagnostics=diagnostics)
+
+    profile = SolveProfile().get("provider", "metric")
+    diagnostics = SolveDiagnostics().get("provider", "metric")
+    expected_diagnostics = SolveDiagnostics().get("provider", "metric")
+    result = _extract(validators, profile, diagnostics)
+    expected = _extract(
+        [_PerGroupValidator(validator) for validator in validators], diagnostics=expected_diagnostics
+    )
+
+    assert [group.index.tolist() for group in result] == [[10, 11, 17]]
+    assert len(result) == len(expected)
+    for res, exp in zip(result, expected):
+        pd.testing.assert_frame_equal(res, exp)
+    assert profile.n_groups == 4
+    # Group D is rejected by the per-group validator as it has no supplementary dataset
+    assert profile.rejected == {"RequireFacets": 2, "RequireOverlappingTimerange": 1}
+    # The same groups are rejected, although group D is rejected by a different constraint
+    rejected = sorted((rejection.group, rejection.n_files) for rejection in diagnostics.rejections)
+    assert rejected == [
+        ((("source_id", "B"),), 2),
+        ((("source_id", "C"),), 1),
+        ((("source_id", "D"),), 2),
+    ]
+    assert rejected == sorted(
+        (rejection.group, rejection.n_files) for rejection in expected_diagnostics.rejections
+    )
+    # The batch validators explain why each group was rejected
+    reasons = sorted((rejection.group, rejection.reason) for rejection in diagnostics.rejections)
+    assert reasons == [
+        (
+            (("source_id", "B"),),
+            "No overlap between the timeranges of each variable_id: "
+            "pr starts at 2005-01-01 00:00:00 after tas ends at 2001-12-31 00:00:00",
+        ),
+        ((("source_id", "C"),), "Missing variable_id: pr"),
+        ((("source_id", "D"),), "Missing variable_id: areacella"),
+    ]
+
+
+def test_data_coverage_ordered_constraints():
+    data_catalog = pd.DataFrame(
+        {
+            "variable_id": ["tas", "pr", "tas", "areacella", "areacella"],
+            "source_id": ["A", "A", "B", "A", "B"],
+            "grid_label": "gn",
+            "table_id": "Amon",
+            "experiment_id": "historical",
+            "member_id": "r1i1p1f1",
+            "version": "v1",
+        },
+        index=[1, 2, 3, 4, 5],
+    )
+    requirement = DataRequirement(
+        source_type=SourceDatasetType.CMIP6,
+        filters=(FacetFilter(facets={"variable_id": ("tas", "pr")}),),
+        group_by=("source_id",),
+        constraints=(
+            AddSupplementaryDataset.from_defaults("areacella", SourceDatasetType.CMIP6),
+            RequireFacets("variable_id", ("tas", "pr")),
+        ),
+    )
+
+    with mock.patch.object(
+        AddSupplementaryDataset,
+        "apply_groups",
+        autospec=True,
+        side_effect=AddSupplementaryDataset.apply_groups,
+    ) as mock_apply_groups:
+        result = extract_covered_datasets(data_catalog, requirement)
+
+    assert [group.index.tolist() for group in result] == [[1, 2, 4]]
+    # The validator is applied first as the supplementary dataset doesn't change its result
+    groups = mock_apply_groups.call_args.args[1]
+    assert [group.index.tolist() for group in groups] == [[1, 2]]
+
+
+def test_data_coverage_batch_validation_missing_group():
+    data_catalog = pd.DataFrame(
+        {"variable_id": ["tas", "pr", "tas", "pr"], "source_id": ["A", "A", None, None]},
+        index=[1, 2, 3, 4],
+    )
+    requirement = DataRequirement(
+        source_type=SourceDatasetType.CMIP6,
+        filters=(),
+        group_by=("source_id",),
+        constraints=(RequireFacets("variable_id", ("tas", "pr")),),
+    )
+
+    result = extract_covered_datasets(data_catalog, requirement)
+
+    # Rows without a source_id aren't part of any group
+    assert [group.index.tolist() for group in result] == [[1, 2]]
+
+
+class _BatchOperation:
+    """
+    Removes the groups that don't contain a given source_id and records the number of calls
+    """
+
+    def __init__(self, source_ids):
+        self.source_ids = source_ids
+        self.n_calls = 0
+
+    def apply(self, group: pd.DataFrame, data_catalog: pd.DataFrame) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def apply_groups(self, groups, data_catalog):
+        self.n_calls += 1
+        return [group if group["source_id"].isin(self.source_ids).any() else None for group in groups]
+
+
+def test_data_coverage_batch_operation():
+    operation = _BatchOperation(("A", "C"))
+    data_catalog = pd.DataFrame(
+        {"variable_id": ["tas", "tas", "tas", "pr"], "source_id": ["A", "B", "C", "C"]},
+        index=[1, 2, 3, 4],
+    )
+    requirement = DataRequirement(
+        source_type=SourceDatasetType.CMIP6,
+        filters=(),
+        group_by=("source_id",),
+        constraints=(RequireFacets("variable_id", ("tas",)), operation),
+    )
+    profile = SolveProfile().get("provider", "metric")
+    diagnostics = SolveDiagnostics().get("provider", "metric")
+
+    result = extract_covered_datasets(data_catalog, requirement, profile=profile, diagnostics=diagnostics)
+
+    assert [group.index.tolist() for group in result] == [[1], [3, 4]]
+    assert operation.n_calls == 1
+    assert profile.n_groups == 3
+    assert profile.rejected["_BatchOperation"] == 1
+    assert diagnostics.rejections == [
+        Rejection(
+            source_type="cmip6",
+            constraint=operation,
+            group=(("source_id", "B"),),
+            n_files=1,
+            reason=f"{operation!r} not satisfied",
+        )
+    ]
+
+
+class MultipleSourceMetric(Metric):
+    name = "multiple-source"
+    slug = "multiple-source"
+
+    data_requirements = (
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(),
+            group_by=("source_id",),
+        ),
+        DataRequirement(
+            source_type=SourceDatasetType.obs4MIPs,
+            filters=(),
+            group_by=("source_id",),
+        ),
+    )
+
+    def run(self, definition: MetricExecutionDefinition) -> MetricResult:
+        raise NotImplementedError
+
+
+@pytest.mark.parametrize(
+    "changed_datasets,expected",
+    [
+        (None, [(1, 10), (1, 20), (2, 10), (2, 20)]),
+        (set(), []),
+        ({1}, [(1, 10), (1, 20)]),
+        ({20}, [(1, 20), (2, 20)]),
+        ({2, 20}, [(1, 20), (2, 10), (2, 20)]),
+    ],
+)
+def test_solve_metric_executions_changed(changed_datasets, expected):
+    metric = MultipleSourceMetric()
+    metrics_provider = MetricsProvider("mock_provider", "v0.1.0")
+    metrics_provider.register(metric)
+
+    solver = MetricSolver(
+        provider_registry=ProviderRegistry(providers=[metrics_provider]),
+        data_catalog={
+            SourceDatasetType.CMIP6: pd.DataFrame(
+                {"source_id": ["ACCESS-ESM1-5", "CESM2"], "instance_id": ["a", "b"]}, index=[1, 2]
+            ),
+            SourceDatasetType.obs4MIPs: pd.DataFrame(
+                {"source_id": ["HadISST", "CERES"], "instance_id": ["c", "d"]}, index=[10, 20]
+            ),
+        },
+        changed_datasets=changed_datasets,
+    )
+
+    executions = list(solver.solve_metric_executions(metric, metrics_provider))
+
+    assert sorted(
+        (
+            execution.metric_dataset[SourceDatasetType.CMIP6].index[0],
+            execution.metric_dataset[SourceDatasetType.obs4MIPs].index[0],
+        )
+        for execution in executions
+    ) == sorted(expected)
+
+
+class SharedSourceTypeMetric(Metric):
+    name = "shared-source-type"
+    slug = "shared-source-type"
+
+    data_requirements = (
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(FacetFilter(facets={"variable_id": "tas"}),),
+            group_by=("source_id",),
+            join_facets=("source_id",),
+        ),
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(FacetFilter(facets={"variable_id": "pr"}),),
+            group_by=("source_id",),
+            join_facets=("source_id",),
+        ),
+    )
+
+    def run(self, definition: MetricExecutionDefinition) -> MetricResult:
+        raise NotImplementedError
+
+
+@pytest.mark.parametrize(
+    "changed_datasets,expected",
+    [
+        (None, [[1, 3], [2, 4]]),
+        ({3}, [[1, 3]]),
+    ],
+)
+def test_solve_metric_executions_shared_source_type(changed_datasets, expected):
+    metric = SharedSourceTypeMetric()
+    metrics_provider = MetricsProvider("mock_provider", "v0.1.0")
+    metrics_provider.register(metric)
+
+    solver = MetricSolver(
+        provider_registry=ProviderRegistry(providers=[metrics_provider]),
+        data_catalog={
+            SourceDatasetType.CMIP6: pd.DataFrame(
+                {
+                    "source_id": ["ACCESS-ESM1-5", "CESM2", "ACCESS-ESM1-5", "CESM2"],
+                    "variable_id": ["tas", "tas", "pr", "pr"],
+                    "instance_id": ["a", "b", "c", "d"],
+                },
+                index=[1, 2, 3, 4],
+            ),
+        },
+        changed_datasets=changed_datasets,
+    )
+
+    executions = list(solver.solve_metric_executions(metric, metrics_provider))
+
+    # The datasets selected by both requirements are included in the execution
+    assert (
+        sorted(execution.metric_dataset[SourceDatasetType.CMIP6].index.tolist() for execution in executions)
+        == expected
+    )
+
+
+def _requirement(source_type, join_facets=()):
+    return DataRequirement(source_type=source_type, filters=(), group_by=None, join_facets=join_facets)
+
+
+def _groups(**columns):
+    return [
+        pd.DataFrame({key: [value] for key, value in zip(columns, values)})
+        for values in zip(*columns.values())
+    ]
+
+
+@pytest.mark.parametrize(
+    "join_facets,expected",
+    [
+        # Without any join facets, every combination is generated
+        (((), ()), [("tas", "tas"), ("tas", "pr"), ("pr", "tas"), ("pr", "pr"), ("ts", "tas"), ("ts", "pr")]),
+        # The join facet must be declared by both requirements
+        (
+            (("variable_id",), ()),
+            [("tas", "tas"), ("tas", "pr"), ("pr", "tas"), ("pr", "pr"), ("ts", "tas"), ("ts", "pr")],
+        ),
+        ((("variable_id",), ("variable_id",)), [("tas", "tas"), ("pr", "pr")]),
+        ((("variable_id", "source_id"), ("variable_id", "source_id")), [("tas", "tas")]),
+    ],
+)
+def test_join_dataset_groups(join_facets, expected):
+    requirements = [
+        _requirement(SourceDatasetType.CMIP6, join_facets[0]),
+        _requirement(SourceDatasetType.obs4MIPs, join_facets[1]),
+    ]
+    dataset_groups = [
+        _groups(variable_id=["tas", "pr", "ts"], source_id=["A", "A", "A"]),
+        _groups(variable_id=["tas", "pr"], source_id=["A", "B"]),
+    ]
+
+    result = list(join_dataset_groups(requirements, dataset_groups))
+
+    assert [tuple(group["variable_id"].iloc[0] for group in items) for items in result] == expected
+
+
+def test_join_dataset_groups_multiple_values():
+    requirements = [
+        _requirement(SourceDatasetType.CMIP6, ("variable_id",)),
+        _requirement(SourceDatasetType.obs4MIPs, ("variable_id",)),
+    ]
+    # Groups containing multiple values only match a group with the same set of values
+    dataset_groups = [
+        [pd.DataFrame({"variable_id": ["tas", "pr"]}), pd.DataFrame({"variable_id": ["tas"]})],
+        [pd.DataFrame({"variable_id": ["pr", "tas", "tas"]})],
+    ]
+
+    result = list(join_dataset_groups(requirements, dataset_groups))
+
+    assert len(result) == 1
+    assert result[0][0] is dataset_groups[0][0]
+
+
+class ConstrainedMetric(Metric):
+    name = "constrained"
+    slug = "constrained"
+
+    data_requirements = (
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(),
+            group_by=("source_id",),
+            constraints=(RequireFacets("variable_id", ("tas", "pr")),),
+        ),
+    )
+
+    def run(self, definition: MetricExecutionDefinition) -> MetricResult:
+        raise NotImplementedError
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_solve_profile(n_jobs):
+    metrics_provider = MetricsProvider("mock_provider", "v0.1.0")
+    metrics_provider.register(ConstrainedMetric())
+    solver = MetricSolver(
+        provider_registry=ProviderRegistry(providers=[metrics_provider]),
+        data_catalog={
+            SourceDatasetType.CMIP6: pd.DataFrame(
+                {
+                    "source_id": ["A", "A", "B", "C"],
+                    "variable_id": ["tas", "pr", "tas", "pr"],
+                    "instance_id": ["a", "b", "c", "d"],
+                }
+            ),
+        },
+        profile=SolveProfile(),
+    )
+
+    assert len(list(solver.solve(n_jobs=n_jobs))) == 1
+
+    profile = solver.profile.get("mock_provider", "constrained")
+    assert profile.n_groups == 3
+    assert profile.rejected == {"RequireFacets": 2}
+    assert set(profile.timings) == {"apply_filters", "groupby", "RequireFacets"}
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_solve_diagnostics(n_jobs):
+    metrics_provider = MetricsProvider("mock_provider", "v0.1.0")
+    metrics_provider.register(ConstrainedMetric())
+    solver = MetricSolver(
+        provider_registry=ProviderRegistry(providers=[metrics_provider]),
+        data_catalog={
+            SourceDatasetType.CMIP6: pd.DataFrame(
+                {
+                    "source_id": ["A", "A", "B", "C"],
+                    "variable_id": ["tas", "pr", "tas", "pr"],
+                    "instance_id": ["a", "b", "c", "d"],
+                }
+            ),
+        },
+        diagnostics=SolveDiagnostics(),
+    )
+
+    assert len(list(solver.solve(n_jobs=n_jobs))) == 1
+
+    diagnostics = solver.diagnostics.get("mock_provider", "constrained")
+    assert [(rejection.group, rejection.n_files) for rejection in diagnostics.rejections] == [
+        ((("source_id", "B"),), 1),
+        ((("source_id", "C"),), 1),
+    ]
+    assert {type(rejection.constraint).__name__ for rejection in diagnostics.rejections} == {"RequireFacets"}
+    assert [rejection.reason for rejection in diagnostics.rejections] == [
+        "Missing variable_id: pr",
+        "Missing variable_id: tas",
+    ]
+
+
+def test_solve_shares_filter_cache():
+    metrics_provider = MetricsProvider("mock_provider", "v0.1.0")
+    metrics_provider.register(MultipleSourceMetric())
+    data_catalog = pd.DataFrame({"source_id": ["ACCESS-ESM1-5"], "instance_id": ["a"]}, index=[1])
+    solver = MetricSolver(
+        provider_registry=ProviderRegistry(providers=[metrics_provider]),
+        data_catalog={SourceDatasetType.CMIP6: data_catalog},
+    )
+
+    filter_cache = solver._get_filter_cache(SourceDatasetType.CMIP6)
+    assert solver._get_filter_cache(SourceDatasetType.CMIP6) is filter_cache
+
+    # Replacing the data catalog invalidates the cache
+    solver.data_catalog[SourceDatasetType.CMIP6] = data_catalog.copy()
+    assert solver._get_filter_cache(SourceDatasetType.CMIP6) is not filter_cache
+
+
+def test_solve_parallel():
+    metrics_provider = MetricsProvider("mock_provider", "v0.1.0")
+    metrics_provider.register(MultipleSourceMetric())
+    other_provider = MetricsProvider("other_provider", "v0.1.0")
+    other_provider.register(MultipleSourceMetric())
+
+    solver = MetricSolver(
+        provider_registry=ProviderRegistry(providers=[metrics_provider, other_provider]),
+        data_catalog={
+            SourceDatasetType.CMIP6: pd.DataFrame(
+                {"source_id": ["ACCESS-ESM1-5", "CESM2", "CESM2"], "instance_id": ["a", "b", "c"]},
+                index=[1, 2, 3],
+            ),
+            SourceDatasetType.obs4MIPs: pd.DataFrame(
+                {"source_id": ["HadISST", "CERES"], "instance_id": ["d", "e"]}, index=[10, 20]
+            ),
+        },
+    )
+
+    def _summarise(executions):
+        return [
+            (
+                execution.provider.slug,
+                execution.metric.slug,
+                {key: collection.index.tolist() for key, collection in execution.metric_dataset.items()},
+            )
+            for execution in executions
+        ]
+
+    serial = list(solver.solve())
+    parallel = list(solver.solve(n_jobs=2))
+
+    assert len(serial) == 8
+    assert _summarise(parallel) == _summarise(serial)
+    # The parent process's providers and metrics are used
+    assert parallel[0].provider is metrics_provider
+
+
 def test_solve_metrics_default_solver(mocker, mock_metric_execution, db_seeded, solver):
     mock_executor = mocker.patch.object(ExecutorConfig, "build")
+    registry = ProviderRegistry(providers=[provider])
+    mocker.patch.object(ProviderRegistry, "build_from_config", return_value=registry)
     mock_build_solver = mocker.patch.object(MetricSolver, "build_from_db")
 
     # Create a mock solver that "solves" to create a single execution
-    solver = mock.MagicMock(spec=MetricSolver)
+    solver = mock.MagicMock(spec=MetricSolver, projected=False, provider_registry=registry)
     solver.solve.return_value = [mock_metric_execution]
     mock_build_solver.return_value = solver
 
@@ -245,6 +830,545 @@ def test_solve_metrics(mocker, db_seeded, solver, data_regression):
     data_regression.check(output)
 
 
+class TasMetric(Metric):
+    name = "tas"
+    slug = "tas"
+
+    data_requirements = (
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(FacetFilter(facets={"variable_id": "tas"}),),
+            group_by=("source_id", "experiment_id"),
+        ),
+    )
+
+    def run(self, definition: MetricExecutionDefinition) -> MetricResult:
+        raise NotImplementedError
+
+
+@pytest.fixture
+def tas_provider():
+    tas_provider = MetricsProvider("tas_provider", "v0.1.0")
+    tas_provider.register(TasMetric())
+    return tas_provider
+
+
+def test_get_required_columns(tas_provider):
+    other_provider = MetricsProvider("other_provider", "v0.1.0")
+    other_provider.register(ConstrainedMetric())
+
+    required = get_required_columns(ProviderRegistry(providers=[tas_provider, other_provider]))
+
+    assert required == {SourceDatasetType.CMIP6: {"variable_id", "source_id", "experiment_id"}}
+
+
+class _UndeclaredOperation:
+    """
+    An operation that doesn't declare the columns that it uses
+    """
+
+    def apply(self, group: pd.DataFrame, data_catalog: pd.DataFrame) -> pd.DataFrame:
+        return group
+
+
+def test_get_required_columns_undeclared(tas_provider):
+    parent_metric = TasMetric()
+    parent_metric.slug = "parent"
+    parent_metric.data_requirements = (
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(),
+            group_by=None,
+            constraints=(_UndeclaredOperation(),),
+        ),
+    )
+    tas_provider.register(parent_metric)
+
+    required = get_required_columns(ProviderRegistry(providers=[tas_provider]))
+
+    assert required == {SourceDatasetType.CMIP6: None}
+
+
+def test_get_required_columns_selected(tas_provider):
+    other_provider = MetricsProvider("other_provider", "v0.1.0")
+    other_metric = TasMetric()
+    other_metric.slug = "obs"
+    other_metric.data_requirements = (
+        DataRequirement(source_type=SourceDatasetType.obs4MIPs, filters=(), group_by=("source_id",)),
+    )
+    other_provider.register(other_metric)
+    provider_registry = ProviderRegistry(providers=[tas_provider, other_provider])
+
+    assert list(get_required_columns(provider_registry, provider_slugs=["tas_provider"])) == [
+        SourceDatasetType.CMIP6
+    ]
+    assert list(get_required_columns(provider_registry, metric_slugs=["obs"])) == [SourceDatasetType.obs4MIPs]
+
+
+def test_select_metrics(tas_provider):
+    other_provider = MetricsProvider("other_provider", "v0.1.0")
+    other_provider.register(ConstrainedMetric())
+    other_provider.register(TasMetric())
+    provider_registry = ProviderRegistry(providers=[tas_provider, other_provider])
+
+    def _slugs(metrics):
+        return [(provider.slug, metric.slug) for provider, metric in metrics]
+
+    assert _slugs(select_metrics(provider_registry)) == [
+        ("tas_provider", "tas"),
+        ("other_provider", "constrained"),
+        ("other_provider", "tas"),
+    ]
+    assert _slugs(select_metrics(provider_registry, provider_slugs=["other_provider"])) == [
+        ("other_provider", "constrained"),
+        ("other_provider", "tas"),
+    ]
+    assert _slugs(select_metrics(provider_registry, metric_slugs=["tas"])) == [
+        ("tas_provider", "tas"),
+        ("other_provider", "tas"),
+    ]
+    assert _slugs(
+        select_metrics(provider_registry, provider_slugs=["other_provider"], metric_slugs=["tas"])
+    ) == [("other_provider", "tas")]
+
+    with pytest.raises(ValueError, match=r"Unknown providers: \['missing'\]"):
+        select_metrics(provider_registry, provider_slugs=["missing"])
+    with pytest.raises(ValueError, match=r"Unknown metrics: \['missing'\]"):
+        select_metrics(provider_registry, metric_slugs=["tas", "missing"])
+
+
+def test_solve_skips_unmatched_metrics(tas_provider):
+    tas_provider.register(ConstrainedMetric())
+    data_catalog = pd.DataFrame(
+        {
+            "source_id": ["A", "A", "B"],
+            "experiment_id": ["historical", "historical", "historical"],
+            "variable_id": ["tas", "pr", "pr"],
+            "instance_id": ["a", "b", "c"],
+        },
+        index=[1, 2, 3],
+    )
+    solver = MetricSolver(
+        provider_registry=ProviderRegistry(providers=[tas_provider]),
+        data_catalog={SourceDatasetType.CMIP6: data_catalog},
+        changed_datasets={2},
+        profile=SolveProfile(),
+    )
+
+    # Only the constrained metric uses pr
+    assert [metric.slug for _, metric in solver.select_metrics()] == ["constrained"]
+    assert [execution.metric.slug for execution in solver.solve()] == ["constrained"]
+    assert list(solver.profile.metrics) == [("tas_provider", "constrained")]
+
+
+class _AddCellMeasures:
+    def apply(self, group, data_catalog):
+        return pd.concat([group, data_catalog[data_catalog["variable_id"] == "areacella"]])
+
+
+class SupplementaryMetric(Metric):
+    name = "supplementary"
+    slug = "supplementary"
+
+    data_requirements = (
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(FacetFilter(facets={"variable_id": "tas"}),),
+            group_by=("source_id",),
+            constraints=(_AddCellMeasures(),),
+        ),
+    )
+
+    def run(self, definition: MetricExecutionDefinition) -> MetricResult:
+        raise NotImplementedError
+
+
+def test_solve_changed_supplementary_dataset(tas_provider):
+    tas_provider.register(SupplementaryMetric())
+    solver = MetricSolver(
+        provider_registry=ProviderRegistry(providers=[tas_provider]),
+        data_catalog={
+            SourceDatasetType.CMIP6: pd.DataFrame(
+                {
+                    "source_id": ["A", "B", "A"],
+                    "experiment_id": ["historical", "historical", "historical"],
+                    "variable_id": ["tas", "tas", "areacella"],
+                    "instance_id": ["a", "b", "c"],
+                },
+                index=[1, 2, 3],
+            )
+        },
+        changed_datasets={3},
+    )
+
+    # The changed cell measure isn't selected by the filters of the metric, but is added to each group
+    assert [metric.slug for _, metric in solver.select_metrics()] == ["supplementary"]
+    assert sorted(
+        sorted(execution.metric_dataset[SourceDatasetType.CMIP6].index.tolist())
+        for execution in solver.solve()
+    ) == [[1, 3], [2, 3]]
+
+
+def test_solve_selected_metrics(tas_provider):
+    tas_provider.register(ConstrainedMetric())
+    solver = MetricSolver(
+        provider_registry=ProviderRegistry(providers=[tas_provider]),
+        data_catalog={
+            SourceDatasetType.CMIP6: pd.DataFrame(
+                {
+                    "source_id": ["A", "A"],
+                    "experiment_id": ["historical", "historical"],
+                    "variable_id": ["tas", "pr"],
+                    "instance_id": ["a", "b"],
+                }
+            )
+        },
+        metric_slugs=["tas"],
+    )
+
+    assert [execution.metric.slug for execution in solver.solve()] == ["tas"]
+    assert [execution.metric.slug for execution in solver.solve(n_jobs=2)] == ["tas"]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_solve_cache(mocker, tas_provider, n_jobs):
+    tas_provider.register(ConstrainedMetric())
+    data_catalog = {
+        SourceDatasetType.CMIP6: pd.DataFrame(
+            {
+                "source_id": ["A", "A", "B", "B"],
+                "experiment_id": ["historical", "historical", "historical", "ssp126"],
+                "variable_id": ["tas", "pr", "tas", "tas"],
+                "instance_id": ["a", "b", "c", "d"],
+            },
+            index=[1, 2, 3, 4],
+        )
+    }
+    solve_cache = SolveCache()
+
+    def _solve():
+        solver = MetricSolver(
+            provider_registry=ProviderRegistry(providers=[tas_provider]),
+            data_catalog=data_catalog,
+            solve_cache=solve_cache,
+        )
+        return [(execution.metric.slug, execution.metric_dataset.hash) for execution in solver.solve(n_jobs)]
+
+    expected = _solve()
+    assert len(expected) == 4
+    assert len(solve_cache.entries) == 2
+    assert solve_cache.updated == set(solve_cache.entries)
+
+    # The cached groups are used if the data catalog hasn't changed
+    solve_cache.updated.clear()
+    mock_extract = mocker.patch("cmip_ref.solver.extract_covered_datasets")
+    assert _solve() == expected
+    mock_extract.assert_not_called()
+    assert not solve_cache.updated
+
+
+def test_solve_metrics_cache(mocker, config, db_synthetic, tas_provider):
+    mocker.patch.object(
+        ProviderRegistry, "build_from_config", return_value=ProviderRegistry(providers=[tas_provider])
+    )
+    mocker.patch.object(ExecutorConfig, "build")
+    with db_synthetic.session.begin():
+        _register_provider(db_synthetic, tas_provider)
+
+    with db_synthetic.session.begin():
+        solve_metrics(db_synthetic, config=config, use_cache=True)
+        assert db_synthetic.session.query(SolveCacheEntry).count() == 1
+
+    spy = mocker.spy(solver_module, "extract_covered_datasets")
+    with db_synthetic.session.begin():
+        solve_metrics(db_synthetic, config=config, use_cache=True)
+    spy.assert_not_called()
+
+    # Dry runs don't update the cache
+    with db_synthetic.session.begin():
+        db_synthetic.session.query(SolveCacheEntry).delete()
+    with db_synthetic.session.begin():
+        solve_metrics(db_synthetic, config=config, use_cache=True, dry_run=True)
+        assert db_synthetic.session.query(SolveCacheEntry).count() == 0
+
+
+def test_build_from_db_datasets(mocker, config, db_synthetic, tas_provider):
+    mocker.patch.object(
+        ProviderRegistry, "build_from_config", return_value=ProviderRegistry(providers=[tas_provider])
+    )
+    with db_synthetic.session.begin():
+        dataset_ids = dict(
+            db_synthetic.session.query(CMIP6Dataset.instance_id, CMIP6Dataset.id).limit(2).all()
+        )
+
+        solver = MetricSolver.build_from_db(
+            config, db_synthetic, dataset_slugs=list(dataset_ids), metric_slugs=["tas"]
+        )
+
+        assert solver.changed_datasets == set(dataset_ids.values())
+        assert solver.metric_slugs == ["tas"]
+
+        with pytest.raises(ValueError, match=r"Unknown datasets: \['missing'\]"):
+            MetricSolver.build_from_db(config, db_synthetic, dataset_slugs=["missing", *dataset_ids])
+
+
+def test_build_from_db_projected(mocker, config, db_synthetic, tas_provider):
+    mocker.patch.object(
+        ProviderRegistry, "build_from_config", return_value=ProviderRegistry(providers=[tas_provider])
+    )
+
+    with db_synthetic.session.begin():
+        solver = MetricSolver.build_from_db(config, db_synthetic)
+
+    assert solver.projected
+    assert list(solver.data_catalog) == [SourceDatasetType.CMIP6]
+    assert set(solver.data_catalog[SourceDatasetType.CMIP6].columns) == {
+        "source_id",
+        "experiment_id",
+        "variable_id",
+        "instance_id",
+        "start_time",
+        "end_time",
+        "path",
+    }
+
+
+def test_solve_metrics_projected(mocker, config, db_synthetic, tas_provider):
+    mocker.patch.object(
+        ProviderRegistry, "build_from_config", return_value=ProviderRegistry(providers=[tas_provider])
+    )
+    mock_executor = mocker.patch.object(ExecutorConfig, "build")
+    with db_synthetic.session.begin():
+        _register_provider(db_synthetic, tas_provider)
+        solver = MetricSolver.build_from_db(config, db_synthetic)
+    expected = {metric_execution.metric_dataset.hash for metric_execution in solver.solve()}
+
+    with db_synthetic.session.begin():
+        solve_metrics(db_synthetic, config=config, solver=solver)
+
+    definitions = [call.kwargs["definition"] for call in mock_executor.return_value.run_metric.mock_calls]
+    assert definitions
+    assert {definition.metric_dataset.hash for definition in definitions} == expected
+    for definition in definitions:
+        datasets = definition.metric_dataset[SourceDatasetType.CMIP6].datasets
+        # The metrics receive the complete metadata of the datasets
+        assert set(CMIP6DatasetAdapter.dataset_specific_metadata) <= set(datasets.columns)
+        assert (datasets["variable_id"] == "tas").all()
+
+
+class TimerangeMetric(Metric):
+    name = "timerange"
+    slug = "timerange"
+
+    data_requirements = (
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(FacetFilter(facets={"variable_id": "tas"}),),
+            group_by=("instance_id",),
+            constraints=(SelectTimerange(start="2030-01-01", end="2050-01-01"),),
+        ),
+    )
+
+    def run(self, definition: MetricExecutionDefinition) -> MetricResult:
+        raise NotImplementedError
+
+
+def test_solve_metrics_projected_timerange(mocker, config, db_synthetic):
+    timerange_provider = MetricsProvider("timerange_provider", "v0.1.0")
+    timerange_provider.register(TimerangeMetric())
+    mocker.patch.object(
+        ProviderRegistry, "build_from_config", return_value=ProviderRegistry(providers=[timerange_provider])
+    )
+    mock_executor = mocker.patch.object(ExecutorConfig, "build")
+    with db_synthetic.session.begin():
+        _register_provider(db_synthetic, timerange_provider)
+        solver = MetricSolver.build_from_db(config, db_synthetic)
+        n_files = CMIP6DatasetAdapter().load_catalog(db_synthetic, columns=["path"]).index.value_counts()
+    expected = {
+        metric_execution.metric_dataset.hash: len(
+            metric_execution.metric_dataset[SourceDatasetType.CMIP6].datasets
+        )
+        for metric_execution in solver.solve()
+    }
+
+    with db_synthetic.session.begin():
+        solve_metrics(db_synthetic, config=config, solver=solver)
+
+    definitions = [call.kwargs["definition"] for call in mock_executor.return_value.run_metric.mock_calls]
+    # The metrics only receive the files selected by the constraints, with their complete metadata
+    assert {
+        definition.metric_dataset.hash: len(definition.metric_dataset[SourceDatasetType.CMIP6].datasets)
+        for definition in definitions
+    } == expected
+    selected = [definition.metric_dataset[SourceDatasetType.CMIP6].datasets for definition in definitions]
+    assert any(len(datasets) < n_files[datasets.index[0]] for datasets in selected)
+    assert all("variable_id" in datasets.columns for datasets in selected)
+
+
+class TestSolveMetricsReconcile:
+    @pytest.fixture
+    def registered_provider(self, db, provider):
+        with db.session.begin():
+            _register_provider(db, provider)
+        return provider
+
+    def _candidates(self, provider, config, n_candidates, dataset_id_offset=0):
+        metric = provider.metrics()[0]
+        candidates = []
+        for i in range(n_candidates):
+            metric_dataset = MetricDataset(
+                {
+                    SourceDatasetType.CMIP6: DatasetCollection(
+                        pd.DataFrame({"instance_id": [f"dataset-{i + dataset_id_offset}"]}, index=[i + 1]),
+                        "instance_id",
+                    )
+                }
+            )
+            execution = mock.MagicMock(spec=MetricExecution)
+            execution.provider = provider
+            execution.metric = metric
+            execution.build_metric_execution_info.return_value = MetricExecutionDefinition(
+                key=f"key-{i}",
+                metric_dataset=metric_dataset,
+                root_directory=config.paths.scratch,
+                output_directory=config.paths.scratch / f"output-{i}",
+            )
+            candidates.append(execution)
+        return candidates
+
+    def _solve(self, db, config, candidates):
+        solver = mock.MagicMock(spec=MetricSolver, projected=False, provider_registry=ProviderRegistry())
+        solver.solve.return_value = candidates
+
+        with db.session.begin():
+            solve_metrics(db, config=config, solver=solver)
+
+    def _count(self, db, model):
+        with db.session.begin():
+            return db.session.query(model).count()
+
+    def _mark_completed(self, db):
+        # The executor is mocked so the executions need to be marked as completed manually
+        with db.session.begin():
+            db.session.query(MetricExecutionModel).update({"dirty": False})
+
+    def test_reconcile(self, mocker, db, config, registered_provider):
+        mock_executor = mocker.patch.object(ExecutorConfig, "build")
+
+        self._solve(db, config, self._candidates(registered_provider, config, 3))
+
+        assert self._count(db, MetricExecutionModel) == 3
+        assert self._count(db, MetricExecutionResult) == 3
+        assert mock_executor.return_value.run_metric.call_count == 3
+        with db.session.begin():
+            result = db.session.query(MetricExecutionResult).filter_by(output_fragment="output-1").one()
+            assert result.metric_execution.key == "key-1"
+            assert (
+                result.dataset_hash
+                == mock_executor.return_value.run_metric.call_args_list[1]
+                .kwargs["definition"]
+                .metric_dataset.hash
+            )
+
+        # Solving again with the same datasets shouldn't run anything
+        self._mark_completed(db)
+        mock_executor.reset_mock()
+        self._solve(db, config, self._candidates(registered_provider, config, 3))
+        assert self._count(db, MetricExecutionResult) == 3
+        assert mock_executor.return_value.run_metric.call_count == 0
+
+        # Changing the datasets should result in a new run for the existing executions
+        self._solve(db, config, self._candidates(registered_provider, config, 4, dataset_id_offset=10))
+        assert self._count(db, MetricExecutionModel) == 4
+        assert self._count(db, MetricExecutionResult) == 7
+        assert mock_executor.return_value.run_metric.call_count == 4
+
+    def test_reconcile_dirty(self, mocker, db, config, registered_provider):
+        mock_executor = mocker.patch.object(ExecutorConfig, "build")
+        self._solve(db, config, self._candidates(registered_provider, config, 2))
+        self._mark_completed(db)
+
+        with db.session.begin():
+            db.session.query(MetricExecutionModel).filter_by(key="key-0").one().dirty = True
+
+        mock_executor.reset_mock()
+        self._solve(db, config, self._candidates(registered_provider, config, 2))
+        assert mock_executor.return_value.run_metric.call_count == 1
+        assert mock_executor.return_value.run_metric.call_args.kwargs["definition"].key == "key-0"
+
+    def test_reconcile_query_count(self, mocker, db, config, registered_provider):
+        mocker.patch.object(ExecutorConfig, "build")
+        statements = []
+
+        def _count_statements(*args, **kwargs):
+            statements.append(args[2])
+
+        sqlalchemy.event.listen(db._engine, "before_cursor_execute", _count_statements)
+        try:
+            self._solve(db, config, self._candidates(registered_provider, config, 100))
+        finally:
+            sqlalchemy.event.remove(db._engine, "before_cursor_execute", _count_statements)
+
+        assert self._count(db, MetricExecutionResult) == 100
+        # The number of statements shouldn't scale with the number of candidates
+        assert len(statements) < 20
+
+    def test_streaming(self, mocker, db, config, registered_provider):
+        mock_executor = mocker.patch.object(ExecutorConfig, "build")
+        candidates = self._candidates(registered_provider, config, 5)
+        first_batch_submitted = threading.Event()
+        mock_executor.return_value.run_metric.side_effect = lambda **kwargs: first_batch_submitted.set()
+
+        def _solve(n_jobs):
+            yield from candidates[:2]
+            # The first batch should be submitted before the solver has finished
+            assert first_batch_submitted.wait(timeout=5)
+            yield from candidates[2:]
+
+        solver = mock.MagicMock(spec=MetricSolver, projected=False, provider_registry=ProviderRegistry())
+        solver.solve.side_effect = _solve
+        with db.session.begin():
+            solve_metrics(db, config=config, solver=solver, batch_size=2)
+
+        assert mock_executor.return_value.run_metric.call_count == 5
+        assert self._count(db, MetricExecutionResult) == 5
+
+    def test_streaming_solver_error(self, mocker, db, config, registered_provider):
+        mock_executor = mocker.patch.object(ExecutorConfig, "build")
+        candidates = self._candidates(registered_provider, config, 3)
+
+        def _solve(n_jobs):
+            yield from candidates
+            raise InvalidMetricException(candidates[0].metric, "Failed to solve")
+
+        solver = mock.MagicMock(spec=MetricSolver, projected=False, provider_registry=ProviderRegistry())
+        solver.solve.side_effect = _solve
+        with pytest.raises(InvalidMetricException, match="Failed to solve"):
+            with db.session.begin():
+                solve_metrics(db, config=config, solver=solver, batch_size=2)
+
+        # Only the first batch was submitted and the solve isn't recorded
+        assert mock_executor.return_value.run_metric.call_count == 2
+        assert self._count(db, SolveWatermark) == 0
+
+    def test_commit_batches(self, mocker, db, config, registered_provider):
+        transactions = []
+        mocker.patch(
+            "cmip_ref.solver.submit_candidates",
+            side_effect=lambda db, *args, **kwargs: transactions.append(db.session.get_transaction()),
+        )
+        solver = mock.MagicMock(spec=MetricSolver, projected=False, provider_registry=ProviderRegistry())
+        solver.solve.return_value = self._candidates(registered_provider, config, 3)
+
+        solve_and_submit(db, solver, config, mock.MagicMock(), batch_size=2, commit_batches=True)
+
+        # Each batch is submitted in a separate transaction which is committed afterwards
+        assert len(transactions) == 2
+        assert None not in transactions
+        assert transactions[0] is not transactions[1]
+        assert not db.session.in_transaction()
+
+
 def test_solve_metrics_dry_run(mocker, db_seeded, config, solver):
     mock_executor = mocker.patch.object(ExecutorConfig, "build")
 
@@ -253,3 +1377,103 @@ def test_solve_metrics_dry_run(mocker, db_seeded, config, solver):
     assert mock_executor.return_value.run_metric.call_count == 0
 
     # TODO: Check that no new metrics were added to the db
+
+
+def test_solve_metrics_watermark(mocker, db, config, tas_provider):
+    registry = ProviderRegistry(providers=[tas_provider])
+    mocker.patch.object(ProviderRegistry, "build_from_config", return_value=registry)
+    mocker.patch.object(ExecutorConfig, "build")
+    mock_build_solver = mocker.patch.object(MetricSolver, "build_from_db")
+    mock_build_solver.return_value.solve.return_value = []
+    mock_build_solver.return_value.provider_registry = registry
+
+    # No previous solve so everything should be solved for
+    with db.session.begin():
+        solve_metrics(db, config=config, incremental=True)
+        watermark = db.session.query(SolveWatermark).one()
+        # The watermark is the start of the solve rather than the most recent dataset update
+        assert watermark.dataset_updated_at is not None
+        assert watermark.provider_fingerprint == registry.fingerprint()
+    mock_build_solver.assert_called_with(
+        config,
+        db,
+        changed_since=None,
+        dataset_slugs=None,
+        provider_slugs=None,
+        metric_slugs=None,
+        provider_registry=registry,
+    )
+
+    # Subsequent solves should only consider the changes since the last solve
+    expected_watermark = pd.Timestamp("2025-01-01").to_pydatetime()
+    with db.session.begin():
+        db.session.add(
+            SolveWatermark(dataset_updated_at=expected_watermark, provider_fingerprint=registry.fingerprint())
+        )
+    with db.session.begin():
+        solve_metrics(db, config=config, incremental=True)
+        assert db.session.query(SolveWatermark).count() == 3
+    mock_build_solver.assert_called_with(
+        config,
+        db,
+        changed_since=expected_watermark,
+        dataset_slugs=None,
+        provider_slugs=None,
+        metric_slugs=None,
+        provider_registry=registry,
+    )
+
+    # Dry runs don't record a watermark
+    with db.session.begin():
+        solve_metrics(db, config=config, incremental=True, dry_run=True)
+        assert db.session.query(SolveWatermark).count() == 3
+
+    # Neither do targeted solves
+    with db.session.begin():
+        solve_metrics(db, config=config, dataset_slugs=["dataset"])
+        assert db.session.query(SolveWatermark).count() == 3
+    mock_build_solver.assert_called_with(
+        config,
+        db,
+        changed_since=None,
+        dataset_slugs=["dataset"],
+        provider_slugs=None,
+        metric_slugs=None,
+        provider_registry=registry,
+    )
+
+
+def test_solve_metrics_watermark_providers_changed(mocker, db, config, tas_provider):
+    registry = ProviderRegistry(providers=[tas_provider])
+    mocker.patch.object(ProviderRegistry, "build_from_config", return_value=registry)
+    mock_build_solver = mocker.patch.object(MetricSolver, "build_from_db")
+
+    with db.session.begin():
+        db.session.add(
+            SolveWatermark(
+                dataset_updated_at=pd.Timestamp("2025-01-01").to_pydatetime(),
+                provider_fingerprint=registry.fingerprint(),
+            )
+        )
+
+    with db.session.begin():
+        build_solver(config, db, incremental=True)
+    assert mock_build_solver.call_args.kwargs["changed_since"] is not None
+
+    # A new metric may use any of the existing datasets
+    tas_provider.register(ConstrainedMetric())
+    with db.session.begin():
+        build_solver(config, db, incremental=True)
+    assert mock_build_solver.call_args.kwargs["changed_since"] is None
+
+
+def test_provider_registry_fingerprint(tas_provider):
+    fingerprint = ProviderRegistry(providers=[tas_provider]).fingerprint()
+    assert ProviderRegistry(providers=[tas_provider]).fingerprint() == fingerprint
+
+    upgraded_provider = MetricsProvider("tas_provider", "v0.2.0")
+    upgraded_provider.register(TasMetric())
+    assert ProviderRegistry(providers=[upgraded_provider]).fingerprint() != fingerprint
+
+    tas_provider.register(ConstrainedMetric())
+    assert ProviderRegistry(providers=[tas_provider]).fingerprint() != fingerprint
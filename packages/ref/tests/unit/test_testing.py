@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+from cmip_ref.datasets.cmip6 import CMIP6DatasetAdapter
+from cmip_ref.datasets.obs4mips import Obs4MIPsDatasetAdapter
+from cmip_ref.testing import generate_cmip6_catalog, generate_obs4mips_catalog
+from cmip_ref_core.constraints import RequireContiguousTimerange
+
+
+@pytest.mark.parametrize(
+    "generate,adapter",
+    [(generate_cmip6_catalog, CMIP6DatasetAdapter()), (generate_obs4mips_catalog, Obs4MIPsDatasetAdapter())],
+)
+def test_generate_catalog(generate, adapter):
+    catalog = generate(2000)
+
+    assert 1900 <= len(catalog) <= 2000
+    assert set(catalog.columns) == {*adapter.dataset_specific_metadata, *adapter.file_specific_metadata}
+    # Each dataset has a single id and the files of a dataset are adjacent
+    assert catalog.index.is_monotonic_increasing
+    assert (catalog.groupby(level=0)["instance_id"].nunique() == 1).all()
+    assert catalog.groupby("instance_id").apply(lambda dataset: dataset.index.nunique()).eq(1).all()
+    assert catalog["path"].is_unique
+
+    pd.testing.assert_frame_equal(catalog, generate(2000))
+
+
+def test_generate_cmip6_catalog():
+    catalog = generate_cmip6_catalog(5000)
+
+    fixed = catalog[catalog["table_id"] == "fx"]
+    assert set(fixed["variable_id"]) == {"areacella", "sftlf"}
+    assert fixed["start_time"].isna().all()
+    assert fixed.index.is_unique
+
+    timeseries = catalog[catalog["table_id"] != "fx"]
+    n_files = timeseries.groupby(level=0).size()
+    assert n_files.max() > 1
+
+    constraint = RequireContiguousTimerange(group_by=("instance_id",))
+    contiguous = timeseries.groupby(level=0).apply(constraint.validate)
+    assert contiguous.any()
+    assert not contiguous.all()
+
+
+def test_generate_cmip6_catalog_no_gaps():
+    catalog = generate_cmip6_catalog(2000, gap_fraction=0)
+
+    constraint = RequireContiguousTimerange(group_by=("instance_id",))
+    assert catalog.groupby(level=0).apply(constraint.validate).all()
@@ -0,0 +1,229 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from cmip_ref.config import ExecutorConfig
+from cmip_ref.datasets.cmip6 import CMIP6DatasetAdapter
+from cmip_ref.models import SolveWatermark
+from cmip_ref.models.dataset import CMIP6Dataset, CMIP6File
+from cmip_ref.models.solve import get_transaction_timestamp
+from cmip_ref.provider_registry import ProviderRegistry, _register_provider
+from cmip_ref.solver import MetricSolver
+from cmip_ref.watch import DatasetPoller, apply_dataset_changes, wait_for_executions, watch_metrics
+from cmip_ref_core.datasets import SourceDatasetType
+from cmip_ref_core.metrics import (
+    DataRequirement,
+    FacetFilter,
+    Metric,
+    MetricExecutionDefinition,
+    MetricResult,
+)
+from cmip_ref_core.providers import MetricsProvider
+
+
+class TasMetric(Metric):
+    name = "tas"
+    slug = "tas"
+    data_requirements = (
+        DataRequirement(
+            source_type=SourceDatasetType.CMIP6,
+            filters=(FacetFilter(facets={"variable_id": "tas"}),),
+            group_by=("source_id", "experiment_id"),
+        ),
+    )
+
+    def run(self, definition: MetricExecutionDefinition) -> MetricResult:
+        raise NotImplementedError
+
+
+@pytest.fixture
+def tas_provider(mocker):
+    tas_provider = MetricsProvider("tas_provider", "v0.1.0")
+    tas_provider.register(TasMetric())
+    mocker.patch.object(
+        ProviderRegistry, "build_from_config", return_value=ProviderRegistry(providers=[tas_provider])
+    )
+    return tas_provider
+
+
+def _add_dataset(db, source_id: str) -> int:
+    template = db.session.query(CMIP6Dataset).filter_by(variable_id="tas").first()
+    metadata = {column: getattr(template, column) for column in CMIP6DatasetAdapter.dataset_specific_metadata}
+    instance_id = f"{template.instance_id}.{source_id}"
+    dataset = CMIP6Dataset(
+        **{**metadata, "slug": instance_id, "instance_id": instance_id, "source_id": source_id}
+    )
+    db.session.add(dataset)
+    db.session.flush()
+    db.session.add(CMIP6File(dataset_id=dataset.id, path=f"{source_id}.nc"))
+    return dataset.id
+
+
+def _touch(db, dataset_id: int) -> None:
+    dataset = db.session.get(CMIP6Dataset, dataset_id)
+    dataset.updated_at = dataset.updated_at + datetime.timedelta(seconds=1)
+
+
+class TestDatasetPoller:
+    def test_poll(self, db_synthetic):
+        poller = DatasetPoller()
+
+        with db_synthetic.session.begin():
+            n_datasets = db_synthetic.session.query(CMIP6Dataset).count()
+            assert len(poller.poll(db_synthetic)[SourceDatasetType.CMIP6]) == n_datasets
+            assert poller.watermark is not None
+
+            # The same datasets aren't reported again
+            assert poller.poll(db_synthetic) == {}
+
+            dataset_id = _add_dataset(db_synthetic, "NEW")
+            _touch(db_synthetic, dataset_id)
+            assert poller.poll(db_synthetic) == {SourceDatasetType.CMIP6: [dataset_id]}
+            assert poller.poll(db_synthetic) == {}
+
+            _touch(db_synthetic, dataset_id)
+            assert poller.poll(db_synthetic) == {SourceDatasetType.CMIP6: [dataset_id]}
+
+    def test_poll_late_commit(self, db_synthetic):
+        poller = DatasetPoller()
+        with db_synthetic.session.begin():
+            poller.poll(db_synthetic)
+
+        # A short ingest which started after the poll commits first
+        with db_synthetic.session.begin():
+            now = get_transaction_timestamp(db_synthetic.session)
+            short_id = _add_dataset(db_synthetic, "SHORT")
+            db_synthetic.session.get(CMIP6Dataset, short_id).updated_at = now + datetime.timedelta(hours=2)
+        with db_synthetic.session.begin():
+            assert poller.poll(db_synthetic) == {SourceDatasetType.CMIP6: [short_id]}
+            watermark = poller.watermark
+
+        # A longer ingest commits later, with an updated_at earlier than the short ingest
+        with db_synthetic.session.begin():
+            long_id = _add_dataset(db_synthetic, "LONG")
+            db_synthetic.session.get(CMIP6Dataset, long_id).updated_at = now + datetime.timedelta(hours=1)
+        with db_synthetic.session.begin():
+            assert poller.poll(db_synthetic) == {SourceDatasetType.CMIP6: [long_id]}
+
+        # The threshold is the time that the poll started rather than the latest updated_at
+        assert watermark < now + datetime.timedelta(hours=1)
+
+
+def test_apply_dataset_changes(config, db_synthetic, tas_provider):
+    with db_synthetic.session.begin():
+        solver = MetricSolver.build_from_db(config, db_synthetic)
+        data_catalog = solver.data_catalog[SourceDatasetType.CMIP6]
+        dataset_id = _add_dataset(db_synthetic, "NEW")
+
+        changed = {SourceDatasetType.CMIP6: [dataset_id], SourceDatasetType.obs4MIPs: [dataset_id + 1]}
+        assert apply_dataset_changes(db_synthetic, solver, changed) == {dataset_id}
+
+    updated = solver.data_catalog[SourceDatasetType.CMIP6]
+    assert list(solver.data_catalog) == [SourceDatasetType.CMIP6]
+    assert list(updated.columns) == list(data_catalog.columns)
+    assert len(updated) == len(data_catalog) + 1
+    assert updated.loc[dataset_id, "source_id"] == "NEW"
+
+
+def test_update_datasets():
+    solver = MetricSolver(
+        provider_registry=ProviderRegistry(providers=[]),
+        data_catalog={
+            SourceDatasetType.CMIP6: pd.DataFrame(
+                {"instance_id": ["a", "b", "b"], "path": ["a.nc", "b1.nc", "b2.nc"]}, index=[1, 2, 2]
+            )
+        },
+    )
+
+    solver.update_datasets(
+        SourceDatasetType.CMIP6,
+        pd.DataFrame(
+            {"instance_id": ["b", "c"], "path": ["b.nc", "c.nc"], "extra": [1, 2]},
+            index=[2, 3],
+        ),
+    )
+
+    updated = solver.data_catalog[SourceDatasetType.CMIP6]
+    assert updated.index.tolist() == [1, 2, 3]
+    assert updated["path"].tolist() == ["a.nc", "b.nc", "c.nc"]
+    assert list(updated.columns) == ["instance_id", "path"]
+
+
+def test_watch_metrics(mocker, config, db_synthetic, tas_provider):
+    mock_executor = mocker.patch.object(ExecutorConfig, "build")
+    with db_synthetic.session.begin():
+        _register_provider(db_synthetic, tas_provider)
+
+    def _ingest(poll_interval):
+        with db_synthetic.session.begin():
+            dataset_id = _add_dataset(db_synthetic, "NEW")
+            _touch(db_synthetic, dataset_id)
+
+    mock_sleep = mocker.patch("cmip_ref.watch.time.sleep", side_effect=_ingest)
+
+    watch_metrics(db_synthetic, config=config, poll_interval=5, max_polls=1)
+
+    mock_sleep.assert_called_once()
+    # The completed executions are collected while waiting for the next poll
+    mock_executor.return_value.join.assert_called_once_with(timeout=5)
+    # The executor is only built once
+    mock_executor.assert_called_once()
+    definitions = [call.kwargs["definition"] for call in mock_executor.return_value.run_metric.mock_calls]
+    source_ids = [
+        definition.metric_dataset[SourceDatasetType.CMIP6].datasets["source_id"].unique().tolist()
+        for definition in definitions
+    ]
+    assert len(source_ids) > 1
+    # The new dataset is solved for after the initial solve
+    assert source_ids[-1] == ["NEW"]
+    assert ["NEW"] not in source_ids[:-1]
+
+    with db_synthetic.session.begin():
+        watermarks = db_synthetic.session.query(SolveWatermark).order_by(SolveWatermark.id).all()
+        assert len(watermarks) == 2
+        # The watermarks are the times that the solves started
+        assert watermarks[1].dataset_updated_at >= watermarks[0].dataset_updated_at
+
+
+def test_watch_metrics_error(mocker, config, db_synthetic, tas_provider):
+    mocker.patch.object(ExecutorConfig, "build")
+    with db_synthetic.session.begin():
+        _register_provider(db_synthetic, tas_provider)
+    dataset_ids = []
+
+    def _ingest(poll_interval):
+        if not dataset_ids:
+            with db_synthetic.session.begin():
+                dataset_ids.append(_add_dataset(db_synthetic, "NEW"))
+                _touch(db_synthetic, dataset_ids[0])
+
+    mocker.patch("cmip_ref.watch.time.sleep", side_effect=_ingest)
+    mock_apply = mocker.patch(
+        "cmip_ref.watch.apply_dataset_changes", side_effect=[RuntimeError("failed"), set()]
+    )
+
+    watch_metrics(db_synthetic, config=config, poll_interval=0, max_polls=3)
+
+    # The changes are picked up again after a failure
+    expected = {SourceDatasetType.CMIP6: dataset_ids}
+    assert [call.args[2] for call in mock_apply.mock_calls] == [expected, expected]
+    with db_synthetic.session.begin():
+        assert db_synthetic.session.query(SolveWatermark).count() == 2
+
+
+def test_wait_for_executions(mocker):
+    mock_sleep = mocker.patch("cmip_ref.watch.time.sleep")
+    executor = mocker.Mock()
+
+    # The rest of the interval is waited for if the executions complete early
+    wait_for_executions(executor, 5)
+    executor.join.assert_called_once_with(timeout=5)
+    mock_sleep.assert_called_once()
+    assert 0 < mock_sleep.call_args.args[0] <= 5
+
+    # Executions which are still running are left running in the background
+    mock_sleep.reset_mock()
+    executor.join.side_effect = TimeoutError
+    wait_for_executions(executor, 5)
+    mock_sleep.assert_not_called()
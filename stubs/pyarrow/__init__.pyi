@@ -0,0 +1,26 @@
+from typing import Any
+
+import pandas as pd
+from pyarrow import ipc as ipc
+
+class ArrowException(Exception): ...
+class Schema: ...
+
+class Buffer:
+    def to_pybytes(self) -> bytes: ...
+
+class BufferOutputStream:
+    def getvalue(self) -> Buffer: ...
+
+class Table:
+    schema: Schema
+    num_rows: int
+
+    @classmethod
+    def from_pandas(
+        cls, df: pd.DataFrame, schema: Schema | None = None, preserve_index: bool | None = None
+    ) -> Table: ...
+    def to_pandas(self, **kwargs: Any) -> pd.DataFrame: ...
+    def equals(self, other: Table, check_metadata: bool = False) -> bool: ...
+
+def py_buffer(obj: bytes) -> Buffer: ...
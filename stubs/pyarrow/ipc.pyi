@@ -0,0 +1,19 @@
+from types import TracebackType
+
+from pyarrow import Buffer, BufferOutputStream, Schema, Table
+
+class RecordBatchStreamWriter:
+    def write_table(self, table: Table) -> None: ...
+    def __enter__(self) -> RecordBatchStreamWriter: ...
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None: ...
+
+class RecordBatchStreamReader:
+    def read_all(self) -> Table: ...
+
+def new_stream(sink: BufferOutputStream, schema: Schema) -> RecordBatchStreamWriter: ...
+def open_stream(source: Buffer | bytes) -> RecordBatchStreamReader: ...
@@ -0,0 +1,163 @@
+"""
+Benchmarks of the solver using synthetic data catalogs
+
+The timings are compared against the baselines stored in `solver_benchmark_baseline.json`.
+A benchmark fails if it is more than `REF_BENCHMARK_TOLERANCE` (default 2) times slower than its baseline.
+
+The benchmarks are only run if the catalog sizes are specified, e.g.
+
+    REF_BENCHMARK_SIZES=10000,100000,1000000 pytest tests/regression
+
+Set `REF_BENCHMARK_UPDATE=1` to replace the stored baselines with the new timings.
+"""
+
+import json
+import os
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import pytest
+from cmip_ref_metrics_esmvaltool import provider as esmvaltool_provider
+from cmip_ref_metrics_example import provider as example_provider
+from cmip_ref_metrics_ilamb import provider as ilamb_provider
+from cmip_ref_metrics_pmp import provider as pmp_provider
+
+from cmip_ref.profiling import SolveProfile
+from cmip_ref.provider_registry import ProviderRegistry
+from cmip_ref.solver import MetricSolver, extract_covered_datasets
+from cmip_ref.testing import generate_cmip6_catalog, generate_obs4mips_catalog
+from cmip_ref_core.datasets import FacetFilterCache, SourceDatasetType
+
+BASELINE_FILE = Path(__file__).parent / "solver_benchmark_baseline.json"
+SIZES = [int(size) for size in os.environ.get("REF_BENCHMARK_SIZES", "").split(",") if size]
+UPDATE = os.environ.get("REF_BENCHMARK_UPDATE", "0") == "1"
+TOLERANCE = float(os.environ.get("REF_BENCHMARK_TOLERANCE", "2"))
+# Timings shorter than this are dominated by noise
+MIN_DURATION = 0.05
+
+PROVIDERS = [example_provider, esmvaltool_provider, ilamb_provider, pmp_provider]
+METRICS = [(provider, metric) for provider in PROVIDERS for metric in provider.metrics()]
+
+pytestmark = pytest.mark.skipif(not SIZES, reason="REF_BENCHMARK_SIZES is not set")
+
+
+class Baseline:
+    """
+    Timings of the benchmarks for each catalog size
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.expected: dict[str, dict[str, float]] = json.loads(path.read_text()) if path.exists() else {}
+        self.results: dict[str, dict[str, float]] = {}
+
+    def check(self, size: int, name: str, duration: float) -> None:
+        self.results.setdefault(str(size), {})[name] = round(duration, 4)
+
+        expected = self.expected.get(str(size), {}).get(name)
+        if expected is None or UPDATE:
+            return
+        assert (
+            duration <= max(expected, MIN_DURATION) * TOLERANCE
+        ), f"{name} took {duration:.3f}s with {size} rows (baseline {expected:.3f}s)"
+
+    def save(self) -> None:
+        merged = {
+            size: {**self.expected.get(size, {}), **self.results.get(size, {})} for size in self.results
+        }
+        expected = {**self.expected, **merged}
+        self.path.write_text(
+            json.dumps(dict(sorted(expected.items(), key=lambda item: int(item[0]))), indent=2) + "\n"
+        )
+
+
+def _measure(func: Callable[[], Any], size: int) -> float:
+    """
+    Get the shortest time taken to call a function
+
+    Smaller catalogs are repeated to reduce the noise.
+    """
+    repeat = 3 if size <= 10_000 else 1
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    baseline = Baseline(BASELINE_FILE)
+    yield baseline
+    if UPDATE:
+        baseline.save()
+
+
+@pytest.fixture(scope="module", params=SIZES, ids=lambda size: f"{size}rows")
+def data_catalog(request):
+    size = request.param
+    return size, {
+        SourceDatasetType.CMIP6: generate_cmip6_catalog(size),
+        SourceDatasetType.obs4MIPs: generate_obs4mips_catalog(size // 10),
+    }
+
+
+@pytest.fixture(scope="module")
+def filter_cache(data_catalog):
+    _, catalog = data_catalog
+    return {source_type: FacetFilterCache(df) for source_type, df in catalog.items()}
+
+
+def _build_solver(data_catalog, profile: SolveProfile | None = None) -> MetricSolver:
+    return MetricSolver(
+        provider_registry=ProviderRegistry(providers=PROVIDERS),
+        data_catalog=data_catalog,
+        profile=profile,
+    )
+
+
+def test_solve(baseline, data_catalog):
+    size, catalog = data_catalog
+
+    duration = _measure(lambda: list(_build_solver(catalog).solve()), size)
+
+    baseline.check(size, "solve", duration)
+
+
+@pytest.mark.parametrize(
+    "provider,metric", METRICS, ids=[f"{provider.slug}/{metric.slug}" for provider, metric in METRICS]
+)
+def test_extract_covered_datasets(baseline, data_catalog, filter_cache, provider, metric):
+    size, catalog = data_catalog
+
+    def _extract():
+        for requirement in metric.data_requirements:
+            extract_covered_datasets(
+                catalog[requirement.source_type],
+                requirement,
+                filter_cache=filter_cache[requirement.source_type],
+            )
+
+    duration = _measure(_extract, size)
+
+    baseline.check(size, f"extract_covered_datasets/{provider.slug}/{metric.slug}", duration)
+
+
+def test_stages(baseline, data_catalog):
+    size, catalog = data_catalog
+    profile = SolveProfile()
+
+    list(_build_solver(catalog, profile).solve())
+
+    # The time spent in each stage, including each class of constraint, across all the metrics
+    durations: dict[str, float] = {}
+    for metric_profile in profile.metrics.values():
+        for stage, duration in metric_profile.timings.items():
+            durations[stage] = durations.get(stage, 0.0) + duration
+    assert durations
+
+    for stage, duration in durations.items():
+        baseline.check(size, f"stage/{stage}", duration)